@@ -349,3 +349,53 @@ CELERY_ACCEPT_CONTENT = ["application/json"]
 CELERY_TASK_SERIALIZER = "json"
 CELERY_RESULT_SERIALIZER = "json"
 CELERY_INCLUDE = ["uobtheatre.utils.tasks"]
+CELERY_BEAT_SCHEDULE = {
+    "release-expired-bookings": {
+        "task": "uobtheatre.bookings.tasks.release_expired_bookings",
+        "schedule": 60.0,
+    },
+    "sync-provider-fees": {
+        "task": "uobtheatre.payments.tasks.sync_provider_fees",
+        "schedule": 15 * 60.0,
+    },
+    "process-pending-square-webhook-events": {
+        "task": "uobtheatre.payments.tasks.process_pending_square_webhook_events",
+        "schedule": 15 * 60.0,
+    },
+}
+
+# Caches
+# Defaults to a local memory cache. Set CACHE_URL (e.g. redis://redis:6379/1)
+# to use a shared cache.
+CACHES = {"default": env.cache("CACHE_URL", default="locmemcache://")}
+# How long (in seconds) the computed fields of productions and performances
+# are cached for, in case they are not invalidated by a change
+COMPUTED_FIELD_CACHE_TIMEOUT = int(env("COMPUTED_FIELD_CACHE_TIMEOUT", default=300))
+
+# Transaction syncing
+# The number of concurrent requests, and the number of requests per second,
+# made to payment providers when syncing transactions
+TRANSACTION_SYNC_MAX_WORKERS = int(env("TRANSACTION_SYNC_MAX_WORKERS", default=8))
+TRANSACTION_SYNC_REQUESTS_PER_SECOND = float(
+    env("TRANSACTION_SYNC_REQUESTS_PER_SECOND", default=10)
+)
+# How many times a failed request is retried, and the delay (in seconds) before
+# the first retry. The delay doubles for each subsequent retry.
+TRANSACTION_SYNC_MAX_RETRIES = int(env("TRANSACTION_SYNC_MAX_RETRIES", default=3))
+TRANSACTION_SYNC_BACKOFF = float(env("TRANSACTION_SYNC_BACKOFF", default=0.5))
+
+# Bookings
+EXPIRED_BOOKINGS_BATCH_SIZE = int(env("EXPIRED_BOOKINGS_BATCH_SIZE", default=500))
+# How long (in seconds) after a booking expires before it is released. This
+# leaves time for a payment started just before it expired to be recorded.
+EXPIRED_BOOKINGS_GRACE_PERIOD = int(env("EXPIRED_BOOKINGS_GRACE_PERIOD", default=300))
+
+# Performance refunds
+# The number of bookings refunded by each task, and the maximum number of
+# these tasks for a performance (chunks are made larger to stay within it)
+BULK_REFUND_CHUNK_SIZE = int(env("BULK_REFUND_CHUNK_SIZE", default=50))
+BULK_REFUND_MAX_CHUNKS = int(env("BULK_REFUND_MAX_CHUNKS", default=4))
+# The number of bookings refunded per second, across all of the chunks
+BULK_REFUND_REQUESTS_PER_SECOND = float(
+    env("BULK_REFUND_REQUESTS_PER_SECOND", default=5)
+)
@@ -6,6 +6,7 @@ from unittest.mock import patch
 import pytest
 from django.conf import settings
 from django.contrib.auth.models import AnonymousUser
+from django.core.cache import cache
 from django.test import RequestFactory
 from graphene.test import Client as GQLClient
 from rest_framework.test import APIClient
@@ -114,3 +115,9 @@ def mock_square():
 @pytest.fixture
 def info():
     return SimpleNamespace(context=SimpleNamespace(user=UserFactory()))
+
+
+@pytest.fixture(autouse=True)
+def clear_cache():
+    """Start each test with an empty cache"""
+    cache.clear()
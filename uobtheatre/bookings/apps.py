@@ -0,0 +1,12 @@
+from django.apps import AppConfig
+
+
+class BookingsConfig(AppConfig):
+    """Configuration for the bookings app"""
+
+    name = "uobtheatre.bookings"
+    verbose_name = "Bookings"
+
+    def ready(self):
+        """Perform initialization tasks for this app (namely, register it's signals)"""
+        import uobtheatre.bookings.signals  # pylint: disable=unused-import
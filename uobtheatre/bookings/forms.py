@@ -145,12 +145,16 @@ class BookingForm(MutationForm):
     def _save_m2m(self):
         """Save the many-to-many relations"""
         super()._save_m2m()
-        for ticket in self.cleaned_data.get("add_tickets", []):
-            ticket.booking = self.instance
-            ticket.save()
 
-        for ticket in self.cleaned_data.get("delete_tickets", []):
-            ticket.delete()
+        # The tickets are checked again while saving, as another booking may
+        # have taken the capacity since the form was cleaned
+        try:
+            self.instance.reserve_tickets(
+                self.cleaned_data.get("add_tickets", []),
+                self.cleaned_data.get("delete_tickets", []),
+            )
+        except GQLException as err:
+            raise GQLException(message=err.message, field="tickets") from err
 
     class Meta:
         model = Booking
@@ -0,0 +1,42 @@
+"""
+Batching loaders for the bookings schema
+"""
+
+from typing import Dict, List
+
+from uobtheatre.bookings.models import Booking, Ticket
+from uobtheatre.utils.loaders import Loader
+
+
+class BookingTicketsLoader(Loader):
+    """Loads the Tickets of Bookings, keyed by booking id"""
+
+    def load_batch(self, keys):
+        tickets: Dict[int, List[Ticket]] = {key: [] for key in keys}
+        for ticket in Ticket.objects.filter(booking_id__in=keys).order_by("pk"):
+            tickets[ticket.booking_id].append(ticket)
+        return tickets
+
+
+class BookingSalesBreakdownLoader(Loader):
+    """Loads the sales breakdowns of Bookings, keyed by booking id"""
+
+    def load_batch(self, keys):
+        return {
+            booking.pk: booking.sales_breakdown
+            for booking in Booking.objects.filter(
+                pk__in=keys
+            ).annotate_sales_breakdown()
+        }
+
+
+class BookingCanBeRefundedLoader(Loader):
+    """Loads whether Bookings can be refunded, keyed by booking id"""
+
+    def load_batch(self, keys):
+        return {
+            booking.pk: booking.can_be_refunded
+            for booking in Booking.objects.filter(
+                pk__in=keys
+            ).annotate_refund_eligibility()
+        }
@@ -1,11 +1,13 @@
 import datetime
+import itertools
 import math
+from collections import Counter
 from typing import TYPE_CHECKING, Dict, Iterable, List, Optional, Tuple, Union
 from urllib.parse import urlencode
 
 from django.contrib.postgres.aggregates import BoolAnd
 from django.core.validators import MaxValueValidator, MinValueValidator
-from django.db import models
+from django.db import models, transaction
 from django.db.models import Case, F, FloatField, Q, Value, When
 from django.db.models.functions import Cast
 from django.db.models.query import QuerySet
@@ -14,13 +16,14 @@ from django.utils.functional import cached_property
 from graphql_relay.node.node import to_global_id
 
 import uobtheatre.bookings.emails as booking_emails
-from uobtheatre.discounts.models import ConcessionType, DiscountCombination
+from uobtheatre.discounts.models import ConcessionType, Discount, DiscountCombination
 from uobtheatre.payments.exceptions import (
     CantBePaidForException,
     CantBeRefundedException,
 )
 from uobtheatre.payments.models import Transaction
 from uobtheatre.payments.payables import Payable, PayableQuerySet
+from uobtheatre.productions.cache import invalidate_performances
 from uobtheatre.productions.models import Performance, Production
 from uobtheatre.users.models import User
 from uobtheatre.utils.exceptions import GQLException
@@ -122,6 +125,18 @@ class MiscCost(models.Model):
 class BookingQuerySet(PayableQuerySet):
     """QuerySet for bookings"""
 
+    def annotate_refund_eligibility(self) -> QuerySet:
+        """Annotate what decides whether each booking can be refunded.
+
+        The production of each booking is also loaded, as its status decides
+        whether the booking can be refunded too.
+        """
+        return (
+            super()
+            .annotate_refund_eligibility()
+            .select_related("performance__production")
+        )
+
     def annotate_checked_in(self) -> QuerySet:
         return self.annotate(
             checked_in=BoolAnd(Q(tickets__checked_in_at__isnull=False))
@@ -251,6 +266,8 @@ class Booking(TimeStampedMixin, Payable):
 
     expires_at = models.DateTimeField(default=generate_expires_at)
 
+    _pricing_context: Optional["BookingPricingContext"] = None
+
     @property
     def payment_reference_id(self):
         return self.reference
@@ -266,7 +283,7 @@ class Booking(TimeStampedMixin, Payable):
                 in this Booking.
         """
         booking_concessions: Dict = {}
-        for ticket in self.tickets.all():
+        for ticket in self.pricing.tickets:
             if (
                 not ticket.concession_type
                 in booking_concessions.keys()  # pylint: disable=consider-iterating-dictionary
@@ -309,11 +326,36 @@ class Booking(TimeStampedMixin, Payable):
             DiscountCombination(discounts)
             for discounts in combinations(
                 list(self.performance.discounts.all()),
-                self.tickets.count(),
+                len(self.pricing.tickets),
             )
             if self.is_valid_discount_combination(DiscountCombination(discounts))
         ]
 
+    @property
+    def pricing(self) -> "BookingPricingContext":
+        """The data used to price the booking.
+
+        If a pricing context has been loaded with `load_pricing_context` it is
+        shared by all of the pricing methods. Otherwise a new context is
+        created, so that changes to the booking's tickets are picked up.
+
+        Returns:
+            BookingPricingContext: The pricing context of the booking.
+        """
+        return self._pricing_context or BookingPricingContext(self)
+
+    def load_pricing_context(self) -> "Booking":
+        """Load a pricing context to be shared when pricing the booking.
+
+        This should be used when the booking is priced several times (e.g. for
+        a price breakdown) and its tickets will not change in the meantime.
+
+        Returns:
+            Booking: The booking, for chaining.
+        """
+        self._pricing_context = BookingPricingContext(self)
+        return self
+
     def get_price(self) -> int:
         """Price of the booking with no discounts applied
 
@@ -323,7 +365,8 @@ class Booking(TimeStampedMixin, Payable):
         Returns:
             int: Price of all the Booking's seats in penies.
         """
-        return sum(ticket.seat_price() for ticket in self.tickets.all())
+        pricing = self.pricing
+        return sum(pricing.seat_price(ticket) for ticket in pricing.tickets)
 
     def tickets_price(self) -> int:
         """Price of booking with single discounts applied.
@@ -334,10 +377,8 @@ class Booking(TimeStampedMixin, Payable):
         Returns:
             int: Price of the Booking with single discounts.
         """
-        return sum(
-            ticket.discounted_price(single_discounts_map=self.single_discounts_map)
-            for ticket in self.tickets.all()
-        )
+        pricing = self.pricing
+        return sum(pricing.discounted_price(ticket) for ticket in pricing.tickets)
 
     @cached_property
     def single_discounts_map(self) -> Dict["ConcessionType", float]:
@@ -367,8 +408,9 @@ class Booking(TimeStampedMixin, Payable):
         """
         assert self.is_valid_discount_combination(discounts)
 
+        pricing = self.pricing
         discount_total: int = 0
-        tickets_available_to_discount = list(self.tickets.all())
+        tickets_available_to_discount = list(pricing.tickets)
         for discount_from_comb in discounts.discount_combination:
             discount = DiscountCombination((discount_from_comb,))
             concession_map = discount.get_concession_map()
@@ -383,10 +425,7 @@ class Booking(TimeStampedMixin, Payable):
                         if ticket.concession_type == concession_type
                     )
                     discount_total += math.floor(
-                        self.performance.performance_seat_groups.get(
-                            seat_group=ticket.seat_group
-                        ).price
-                        * discount_from_comb.percentage
+                        pricing.seat_price(ticket) * discount_from_comb.percentage
                     )
                     tickets_available_to_discount.remove(ticket)
         # For each type of concession
@@ -422,7 +461,54 @@ class Booking(TimeStampedMixin, Payable):
             discounted_price = self.tickets_price()
         return math.ceil(discounted_price * (1 - self.admin_discount_percentage))
 
-    def get_best_discount_combination_with_price(
+    def _get_concession_ticket_prices(self) -> Dict[int, List[int]]:
+        """Get the seat prices of the Booking's tickets for each concession type
+
+        Returns:
+            dict of int: list of int: The seat prices, in ticket order, of the
+                tickets of each ConcessionType (by id) in this Booking.
+        """
+        pricing = self.pricing
+        concession_ticket_prices: Dict[int, List[int]] = {}
+        for ticket in pricing.tickets:
+            concession_ticket_prices.setdefault(ticket.concession_type_id, []).append(
+                pricing.seat_price(ticket)
+            )
+        return concession_ticket_prices
+
+    def _get_discount_requirements(
+        self, concession_type_ids: List[int]
+    ) -> List[Tuple[Discount, Dict[int, int]]]:
+        """Get the number of tickets required of each concession type for each discount
+
+        Discounts which can never be applied to the booking, as they require a
+        ConcessionType not in the booking, are excluded.
+
+        Args:
+            concession_type_ids (list of int): The ids of the ConcessionTypes
+                in the booking.
+
+        Returns:
+            list of (Discount, dict of int: int): The Performance's Discounts,
+                with the number of tickets they require of each ConcessionType
+                (by index in concession_type_ids).
+        """
+        discount_requirements = []
+        for discount in self.performance.discounts.prefetch_related("requirements"):
+            requirements: Dict[int, int] = {}
+            for requirement in discount.requirements.all():
+                if not requirement.number:
+                    continue
+                if requirement.concession_type_id not in concession_type_ids:
+                    break
+                index = concession_type_ids.index(requirement.concession_type_id)
+                requirements[index] = requirements.get(index, 0) + requirement.number
+            else:
+                if requirements:
+                    discount_requirements.append((discount, requirements))
+        return discount_requirements
+
+    def get_best_discount_combination_with_price(  # pylint: disable=too-many-locals
         self,
     ) -> Tuple[Optional[DiscountCombination], int]:
         """DiscountCombination and its price which minimises price of Booking
@@ -430,23 +516,68 @@ class Booking(TimeStampedMixin, Payable):
         Returns the discount combination, and the price of the booking with it
         applied, which when applied to the booking gives the largest discount.
 
+        Discounts are applied to tickets of each concession type in order, so
+        the value of adding a discount to a combination only depends on how
+        many tickets of each concession type have already been used. The best
+        combination is found with dynamic programming over these ticket
+        counts, using discounts, requirements and seat prices loaded up front.
+
         Returns:
             (DiscountCombination): The valid DiscountCombination which
                 minimises the price of the Booking.
             (int): The price of the Booking with the best DiscountCombination
                 applied.
         """
-        best_price = self.get_price()
-        best_discount: Optional[DiscountCombination] = None
-        for discount_combo in self.get_valid_discounts():
-            discount_combo_price = self.get_price_with_discount_combination(
-                discount_combo
-            )
-            if discount_combo_price < best_price:
-                best_price = discount_combo_price
-                best_discount = discount_combo
+        concession_ticket_prices = self._get_concession_ticket_prices()
+        concession_type_ids = list(concession_ticket_prices.keys())
+        ticket_prices = list(concession_ticket_prices.values())
+        discount_requirements = self._get_discount_requirements(concession_type_ids)
+
+        # Map of the number of tickets used of each concession type to the
+        # best (discount value, discounts) using those tickets. Every discount
+        # uses at least one ticket, so iterating in lexicographic order visits
+        # a state only after all of the states which lead to it.
+        best_combinations: Dict[Tuple[int, ...], Tuple[int, Tuple[Discount, ...]]] = {
+            (0,) * len(ticket_prices): (0, ())
+        }
+        best_value, best_discounts = 0, ()  # type: Tuple[int, Tuple[Discount, ...]]
+        for state in itertools.product(
+            *(range(len(prices) + 1) for prices in ticket_prices)
+        ):
+            if state not in best_combinations:
+                continue
+            value, discounts = best_combinations[state]
+            if value > best_value:
+                best_value, best_discounts = value, discounts
+
+            for discount, requirements in discount_requirements:
+                next_state = list(state)
+                discount_value = value
+                for index, number in requirements.items():
+                    next_state[index] += number
+                    discount_value += sum(
+                        math.floor(ticket_price * discount.percentage)
+                        for ticket_price in ticket_prices[index][
+                            state[index] : next_state[index]
+                        ]
+                    )
+                if (
+                    all(
+                        used <= len(prices)
+                        for used, prices in zip(next_state, ticket_prices)
+                    )
+                    and discount_value
+                    > best_combinations.get(tuple(next_state), (-1,))[0]
+                ):
+                    best_combinations[tuple(next_state)] = (
+                        discount_value,
+                        discounts + (discount,),
+                    )
 
-        return best_discount, best_price
+        price = sum(map(sum, ticket_prices))
+        if not best_value:
+            return None, price
+        return DiscountCombination(best_discounts), price - best_value
 
     def discount_value(self) -> int:
         """The value of group discounts on the booking.
@@ -472,7 +603,59 @@ class Booking(TimeStampedMixin, Payable):
         Returns:
             (int): The value in penies of MiscCosts applied to the Booking
         """
-        return MiscCost.objects.all().value(self)
+        return sum(misc_cost.get_value(self) for misc_cost in self.pricing.misc_costs)
+
+    def reserve_tickets(
+        self, tickets: List["Ticket"], deleted_tickets: Optional[List["Ticket"]] = None
+    ) -> None:
+        """Add and remove tickets from the Booking, if there is capacity for them.
+
+        The capacity check and the ticket changes are made in a single
+        transaction, with the Performance's seat groups locked. This means
+        concurrent bookings for the same Performance cannot both pass the check
+        and oversell it.
+
+        Args:
+            tickets (list of Ticket): The unsaved tickets to add to the Booking.
+            deleted_tickets (list of Ticket): The tickets to remove from the
+                Booking.
+                (default: [])
+
+        Raises:
+            InvalidSeatGroupException: A supplied ticket has a seat group that
+                is not compatiable with the performance
+            NotEnoughCapacityException: The supplied tickets would cause a
+                breach of available capacity
+        """
+        from uobtheatre.bookings.signals import skip_ticket_count_refresh
+
+        if deleted_tickets is None:
+            deleted_tickets = []
+
+        with transaction.atomic():
+            self.performance.lock_seat_groups()
+            self.performance.validate_tickets(tickets, deleted_tickets)
+
+            with skip_ticket_count_refresh():
+                Ticket.objects.filter(
+                    pk__in=[ticket.pk for ticket in deleted_tickets]
+                ).delete()
+            for ticket in tickets:
+                ticket.booking = self
+            Ticket.objects.bulk_create(tickets)
+
+            # Tickets created in bulk do not send signals, so the counts are
+            # updated here for all of the changed tickets at once
+            seat_group_counts = Counter(ticket.seat_group_id for ticket in tickets)
+            seat_group_counts.subtract(
+                ticket.seat_group_id for ticket in deleted_tickets
+            )
+            self.performance.performance_seat_groups.adjust_ticket_counts(
+                seat_group_counts, self.status, self.expires_at
+            )
+            # Neither of these send signals, so the performance's cached
+            # fields (such as whether it is bookable) are invalidated here
+            invalidate_performances([self.performance_id])
 
     def get_ticket_diff(
         self, tickets: Union[List["Ticket"], Iterable["Ticket"]]
@@ -610,6 +793,13 @@ class TicketQuerySet(QuerySet):
     def sold(self) -> QuerySet:
         return self.filter(Q(booking__status="PAID"))
 
+    def reserved(self) -> QuerySet:
+        """Tickets in in progress bookings which haven't expired"""
+        return self.filter(
+            booking__status=Payable.Status.IN_PROGRESS,
+            booking__expires_at__gt=timezone.now(),
+        )
+
 
 TicketManager = models.Manager.from_queryset(TicketQuerySet)
 
@@ -657,16 +847,8 @@ class Ticket(BaseModel):
         Returns:
             (int): Price of the Ticket in penies with single discounts applied.
         """
-        if single_discounts_map is None:
-            single_discounts_map = self.booking.single_discounts_map
-
-        performance_seat_group = self.booking.performance.performance_seat_groups.get(
-            seat_group=self.seat_group
-        )
-        price = performance_seat_group.price if performance_seat_group else 0
-
-        return math.ceil(
-            (1 - single_discounts_map.get(self.concession_type, 0)) * price
+        return self.booking.pricing.discounted_price(
+            self, single_discounts_map=single_discounts_map
         )
 
     def seat_price(self) -> int:
@@ -677,9 +859,7 @@ class Ticket(BaseModel):
         Returns:
             (int): Price of the seat in penies without any discounts.
         """
-        return self.booking.performance.performance_seat_groups.get(
-            seat_group=self.seat_group
-        ).price
+        return self.booking.pricing.seat_price(self)
 
     @property
     def checked_in(self) -> bool:
@@ -718,3 +898,68 @@ class Ticket(BaseModel):
 
     def __str__(self):
         return "%s | %s" % (self.seat_group.name, self.concession_type.name)
+
+
+class BookingPricingContext:
+    """The data used to price a Booking.
+
+    The tickets, seat group prices, single discounts and misc costs of the
+    booking are each loaded once, when first used. This means a booking can
+    be priced with a fixed number of queries, regardless of how many tickets
+    it has.
+    """
+
+    def __init__(self, booking: Booking):
+        self.booking = booking
+
+    @cached_property
+    def tickets(self) -> List[Ticket]:
+        return list(
+            self.booking.tickets.select_related("seat_group", "concession_type")
+            .order_by("pk")
+            .all()
+        )
+
+    @cached_property
+    def seat_group_prices(self) -> Dict[int, int]:
+        """The price of each seat group in the booking's performance, by id"""
+        return dict(
+            self.booking.performance.performance_seat_groups.values_list(
+                "seat_group_id", "price"
+            )
+        )
+
+    @cached_property
+    def single_discounts_map(self) -> Dict[ConcessionType, float]:
+        return self.booking.single_discounts_map
+
+    @cached_property
+    def misc_costs(self) -> List[MiscCost]:
+        return list(MiscCost.objects.all())
+
+    def seat_price(self, ticket: Ticket) -> int:
+        """Price of a ticket's seat without discounts, in pennies"""
+        return self.seat_group_prices[ticket.seat_group_id]
+
+    def discounted_price(
+        self,
+        ticket: Ticket,
+        single_discounts_map: Optional[Dict[ConcessionType, float]] = None,
+    ) -> int:
+        """Price of a ticket with single discounts applied.
+
+        Args:
+            ticket (Ticket): The ticket to price.
+            single_discounts_map (dict, optional): Map of concession types to
+                their single discount percentage. Defaults to the booking's.
+
+        Returns:
+            int: Price of the ticket in pennies with single discounts applied.
+        """
+        if single_discounts_map is None:
+            single_discounts_map = self.single_discounts_map
+
+        return math.ceil(
+            (1 - single_discounts_map.get(ticket.concession_type, 0))
+            * self.seat_price(ticket)
+        )
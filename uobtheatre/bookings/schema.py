@@ -9,9 +9,16 @@ from graphene_django import DjangoListField, DjangoObjectType
 from graphene_django.filter import DjangoFilterConnectionField
 from graphql_relay.node.node import from_global_id
 
+from uobtheatre.bookings.loaders import (
+    BookingCanBeRefundedLoader,
+    BookingSalesBreakdownLoader,
+    BookingTicketsLoader,
+)
 from uobtheatre.bookings.models import Booking, MiscCost, Ticket
+from uobtheatre.productions.loaders import PerformanceLoader
 from uobtheatre.productions.models import Performance
 from uobtheatre.productions.schema import SalesBreakdownNode
+from uobtheatre.users.loaders import UserLoader
 from uobtheatre.users.schema import ExtendedUserNode
 from uobtheatre.utils.filters import FilterSet
 
@@ -108,24 +115,22 @@ class PriceBreakdownNode(DjangoObjectType):
         # The first element of the tuple is itself a tuple which contains the
         # seat_group and concession_type, the second element of the typle
         # contains a list of all the elements in that group.
+        pricing = self.pricing
         groups = itertools.groupby(
-            self.tickets.order_by("pk"),
+            pricing.tickets,
             lambda ticket: (ticket.seat_group, ticket.concession_type),
         )
 
         return [
             PriceBreakdownTicketNode(
-                ticket_price=self.performance.price_with_concession(
-                    ticket_group[1],
-                    self.performance.performance_seat_groups.get(
-                        seat_group=ticket_group[0]
-                    ),
-                ),
-                number=len(list(group)),
+                ticket_price=pricing.discounted_price(tickets[0]),
+                number=len(tickets),
                 seat_group=ticket_group[0],
                 concession_type=ticket_group[1],
             )
-            for ticket_group, group in groups
+            for ticket_group, tickets in (
+                (ticket_group, list(group)) for ticket_group, group in groups
+            )
         ]
 
     def resolve_misc_costs(self, _):
@@ -139,7 +144,7 @@ class PriceBreakdownNode(DjangoObjectType):
                 value=misc_cost.get_value(self),
                 percentage=misc_cost.percentage,
             )
-            for misc_cost in MiscCost.objects.all()
+            for misc_cost in self.pricing.misc_costs
         ]
 
     class Meta:
@@ -336,13 +341,31 @@ class BookingNode(DjangoObjectType):
     )
     expired = graphene.Boolean(required=True)
     sales_breakdown = graphene.Field(SalesBreakdownNode)
+    can_be_refunded = graphene.Boolean(required=True)
 
     def resolve_price_breakdown(self, _):
-        return self
+        return self.load_pricing_context()
+
+    def resolve_performance(self, info):
+        return PerformanceLoader.for_info(info).load(self.performance_id)
+
+    def resolve_user(self, info):
+        return UserLoader.for_info(info).load(self.user_id)
+
+    def resolve_tickets(self, info):
+        # The tickets of a booking are visible to anyone who can see the
+        # booking, so TicketNode's queryset filtering is not needed here.
+        return BookingTicketsLoader.for_info(info).load(self.pk)
 
     def resolve_expired(self, _):
         return self.is_reservation_expired
 
+    def resolve_sales_breakdown(self, info):
+        return BookingSalesBreakdownLoader.for_info(info).load(self.pk)
+
+    def resolve_can_be_refunded(self, info):
+        return BookingCanBeRefundedLoader.for_info(info).load(self.pk)
+
     @classmethod
     def get_queryset(cls, queryset, info):
         """Get the queryset for a group of booking nodes"""
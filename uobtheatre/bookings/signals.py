@@ -0,0 +1,176 @@
+import datetime
+from contextlib import contextmanager
+from contextvars import ContextVar
+from copy import copy
+from typing import Dict, FrozenSet, Optional
+
+from django.db.models import Count
+from django.db.models.signals import post_delete, post_save, pre_delete
+from django.dispatch import receiver
+
+from uobtheatre.bookings.models import Booking, Ticket
+from uobtheatre.payments.models import DailySales
+from uobtheatre.productions.cache import invalidate_performances
+from uobtheatre.productions.models import PerformanceSeatGroup
+
+refresh_ticket_counts = ContextVar("refresh_ticket_counts", default=True)
+
+# The bookings being deleted. Their tickets are removed from the ticket counts,
+# and their transactions from the daily sales, all at once rather than as each
+# is deleted.
+deleting_bookings: ContextVar[FrozenSet[int]] = ContextVar(
+    "deleting_bookings", default=frozenset()
+)
+
+
+@contextmanager
+def skip_ticket_count_refresh():
+    """Stop ticket and booking changes updating the ticket counts
+
+    Used for bulk changes, where updating the counts for every ticket would
+    be slow. The caller must update the counts of the affected performances
+    itself, in the same transaction.
+    """
+    token = refresh_ticket_counts.set(False)
+    try:
+        yield
+    finally:
+        refresh_ticket_counts.reset(token)
+
+
+def booking_ticket_counts(booking_id: int) -> Dict[int, int]:
+    """The number of tickets in the booking for each seat group"""
+    return dict(
+        Ticket.objects.filter(booking_id=booking_id)
+        .order_by()
+        .values("seat_group_id")
+        .annotate(count=Count("pk"))
+        .values_list("seat_group_id", "count")
+    )
+
+
+def adjust_ticket_counts(
+    performance_id: int,
+    seat_group_counts: Dict[int, int],
+    booking_status: str,
+    expires_at: Optional[datetime.datetime] = None,
+) -> None:
+    """Add tickets to, or remove them from, the ticket counts of a
+    performance, and clear the cached fields computed from them"""
+    PerformanceSeatGroup.objects.filter(
+        performance_id=performance_id
+    ).adjust_ticket_counts(seat_group_counts, booking_status, expires_at)
+    invalidate_performances([performance_id])
+
+
+def adjust_booking_ticket_counts(
+    booking: Booking, seat_group_counts: Dict[int, int]
+) -> None:
+    """Add tickets to, or remove them from, the ticket counts of the booking's
+    performance"""
+    adjust_ticket_counts(
+        booking.performance_id, seat_group_counts, booking.status, booking.expires_at
+    )
+
+
+@receiver(post_save, sender=Ticket)
+def post_ticket_save(instance: Ticket, **_):
+    """Update the ticket counts when a ticket is added to a booking, or is
+    moved to another booking or seat group"""
+    if not refresh_ticket_counts.get() or not instance.has_changed(
+        "booking", "seat_group"
+    ):
+        return
+
+    if old_values := instance.get_loaded_values("booking", "seat_group"):
+        old_booking = (
+            instance.booking
+            if old_values["booking"] == instance.booking_id
+            else Booking.objects.get(pk=old_values["booking"])
+        )
+        adjust_booking_ticket_counts(old_booking, {old_values["seat_group"]: -1})
+    adjust_booking_ticket_counts(instance.booking, {instance.seat_group_id: 1})
+
+
+@receiver(post_delete, sender=Ticket)
+def post_ticket_delete(instance: Ticket, **_):
+    """Remove the ticket from the ticket counts"""
+    if (
+        not refresh_ticket_counts.get()
+        or instance.booking_id in deleting_bookings.get()
+    ):
+        return
+
+    adjust_booking_ticket_counts(instance.booking, {instance.seat_group_id: -1})
+
+
+@receiver(post_save, sender=Booking)
+def post_booking_save(instance: Booking, created: bool, **_):
+    """Move the booking's tickets in the ticket counts when its status (or
+    performance) changes"""
+    if created or not refresh_ticket_counts.get():
+        return
+
+    changed_fields = instance.changed_fields("performance", "status", "expires_at")
+    if not changed_fields or not (
+        seat_group_counts := booking_ticket_counts(instance.pk)
+    ):
+        return
+
+    if {"performance", "status"} & set(changed_fields):
+        old_values = instance.get_loaded_values("performance", "status")
+        adjust_ticket_counts(
+            old_values["performance"],
+            {
+                seat_group_id: -count
+                for seat_group_id, count in seat_group_counts.items()
+            },
+            old_values["status"],
+        )
+        adjust_booking_ticket_counts(instance, seat_group_counts)
+    else:
+        # Only the expiry has changed, so the counts stay the same
+        adjust_booking_ticket_counts(instance, dict.fromkeys(seat_group_counts, 0))
+
+
+@receiver(post_save, sender=Booking)
+def post_booking_save_daily_sales(instance: Booking, created: bool, **_):
+    """Move the booking's transactions in the daily sales when it's moved to
+    another performance"""
+    if created or not instance.has_changed("performance"):
+        return
+
+    old_performance_id = instance.get_loaded_values("performance")["performance"]
+    rows = DailySales.objects.roll_up(instance.transactions.all())
+    old_rows = [copy(row) for row in rows]
+    for row in old_rows:
+        row.performance_id = old_performance_id
+    DailySales.objects.add_rows(old_rows, sign=-1)
+    DailySales.objects.add_rows(rows)
+
+
+@receiver(pre_delete, sender=Booking)
+def pre_booking_delete(instance: Booking, **_):
+    """Remove the booking's tickets from the ticket counts, and its
+    transactions from the daily sales, as they are deleted with it"""
+    deleting_bookings.set(deleting_bookings.get() | {instance.pk})
+    DailySales.objects.add_rows(
+        DailySales.objects.roll_up(instance.transactions.all()), sign=-1
+    )
+    if not refresh_ticket_counts.get():
+        return
+
+    old_values = instance.get_loaded_values("performance", "status")
+    adjust_ticket_counts(
+        old_values.get("performance", instance.performance_id),
+        {
+            seat_group_id: -count
+            for seat_group_id, count in booking_ticket_counts(instance.pk).items()
+        },
+        old_values.get("status", instance.status),
+    )
+
+
+@receiver(post_delete, sender=Booking)
+def post_booking_delete(instance: Booking, **_):
+    deleting_bookings.set(deleting_bookings.get() - {instance.pk})
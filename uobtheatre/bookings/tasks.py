@@ -0,0 +1,102 @@
+import datetime
+from typing import Dict, Optional
+
+from celery.utils.log import get_task_logger
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from config.celery import app
+from uobtheatre.utils.tasks import BaseTask
+
+logger = get_task_logger(__name__)
+
+
+@app.task(base=BaseTask)
+def release_expired_bookings(batch_size: Optional[int] = None) -> Dict[str, int]:
+    """Release the tickets of expired in progress bookings, in batches
+
+    Bookings are released once they have been expired for the
+    EXPIRED_BOOKINGS_GRACE_PERIOD. Bookings with a pending or completed
+    transaction are left alone. Those without any transactions are deleted,
+    with their tickets. Those whose payments have only failed are cancelled
+    and their tickets deleted instead, so that the failed transactions are
+    kept as a record of the attempts. Each batch is released in its own
+    transaction, after which the ticket counts of the affected performances
+    are refreshed once.
+
+    Args:
+        batch_size (int, optional): The maximum number of bookings to delete
+            in each batch. Defaults to the EXPIRED_BOOKINGS_BATCH_SIZE setting.
+
+    Returns:
+        dict: The number of batches run, the number of bookings released and
+            the number of tickets deleted.
+    """
+    from uobtheatre.bookings.models import Booking, Ticket
+    from uobtheatre.bookings.signals import skip_ticket_count_refresh
+    from uobtheatre.payments.models import Transaction
+    from uobtheatre.payments.payables import Payable
+    from uobtheatre.productions.models import PerformanceSeatGroup
+
+    batch_size = batch_size or settings.EXPIRED_BOOKINGS_BATCH_SIZE
+    # Booking.pay doesn't lock the booking, so one being paid for as it expires
+    # is given time for its payment to be recorded
+    expired_before = timezone.now() - datetime.timedelta(
+        seconds=settings.EXPIRED_BOOKINGS_GRACE_PERIOD
+    )
+    reclaimed = {"batches": 0, "bookings": 0, "tickets": 0}
+
+    while True:
+        with transaction.atomic():
+            # Skip bookings locked by a concurrent sweep (or update)
+            batch = list(
+                Booking.objects.expired()
+                .filter(expires_at__lt=expired_before)
+                .exclude(
+                    transactions__status__in=[
+                        Transaction.Status.PENDING,
+                        Transaction.Status.COMPLETED,
+                    ]
+                )
+                .select_for_update(skip_locked=True, of=("self",))
+                .order_by("pk")
+                .values_list("pk", "performance_id")[:batch_size]
+            )
+            if not batch:
+                break
+
+            booking_ids = {booking_id for booking_id, _ in batch}
+            # Deleting a booking deletes its transactions too
+            failed_booking_ids = set(
+                Transaction.objects.filter(booking__in=booking_ids).values_list(
+                    "pay_object_id", flat=True
+                )
+            )
+            with skip_ticket_count_refresh():
+                _, deleted = Booking.objects.filter(
+                    pk__in=booking_ids - failed_booking_ids
+                ).delete()
+                deleted_tickets, _ = Ticket.objects.filter(
+                    booking_id__in=failed_booking_ids
+                ).delete()
+                Booking.objects.filter(pk__in=failed_booking_ids).update(
+                    status=Payable.Status.CANCELLED, updated_at=timezone.now()
+                )
+            PerformanceSeatGroup.objects.filter(
+                performance_id__in={performance_id for _, performance_id in batch}
+            ).refresh_ticket_counts()
+
+        reclaimed["batches"] += 1
+        reclaimed["bookings"] += len(batch)
+        reclaimed["tickets"] += deleted.get("bookings.Ticket", 0) + deleted_tickets
+        if len(batch) < batch_size:
+            break
+
+    logger.info(
+        "Released %s expired bookings and deleted %s tickets in %s batches",
+        reclaimed["bookings"],
+        reclaimed["tickets"],
+        reclaimed["batches"],
+    )
+    return reclaimed
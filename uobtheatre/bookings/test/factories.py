@@ -3,7 +3,11 @@ from django.utils import timezone
 
 from uobtheatre.bookings.models import Booking, MiscCost, Ticket
 from uobtheatre.discounts.models import DiscountRequirement
-from uobtheatre.discounts.test.factories import DiscountFactory
+from uobtheatre.discounts.test.factories import (
+    ConcessionTypeFactory,
+    DiscountFactory,
+    DiscountRequirementFactory,
+)
 from uobtheatre.payments.payables import Payable
 from uobtheatre.productions.models import PerformanceSeatGroup
 from uobtheatre.productions.test.factories import PerformanceFactory
@@ -82,3 +86,48 @@ def add_ticket_to_booking(booking, *, ticket_price=100, checked_in=False):
     DiscountRequirement(
         number=1, concession_type=ticket.concession_type, discount=discount
     )
+
+
+def create_booked_performance(
+    performance=None, *, number_of_bookings=10, tickets_per_booking=4
+):
+    """Create a performance with seat groups, discounts and paid bookings
+
+    Args:
+        performance (Performance): The performance to add the seat groups,
+            discounts and bookings to. If None then a new one is created.
+            (default None)
+        number_of_bookings (int): The number of bookings to create.
+            (default 10)
+        tickets_per_booking (int): The number of tickets in each booking.
+            (default 4)
+
+    Returns:
+        Performance: The booked performance.
+    """
+    if performance is None:
+        performance = PerformanceFactory(capacity=1000)
+
+    seatings = [
+        PerformanceSeatingFactory(performance=performance, price=price, capacity=300)
+        for price in (1000, 1200, 1500)
+    ]
+    concession_types = [
+        ConcessionTypeFactory(name=name) for name in ("Adult", "Student")
+    ]
+    for percentage, concession_type in zip((0, 0.2), concession_types):
+        discount = DiscountFactory(percentage=percentage)
+        discount.performances.set([performance])
+        DiscountRequirementFactory(
+            discount=discount, concession_type=concession_type, number=1
+        )
+
+    for _ in range(number_of_bookings):
+        booking = BookingFactory(performance=performance)
+        for i in range(tickets_per_booking):
+            TicketFactory(
+                booking=booking,
+                seat_group=seatings[i % len(seatings)].seat_group,
+                concession_type=concession_types[i % len(concession_types)],
+            )
+    return performance
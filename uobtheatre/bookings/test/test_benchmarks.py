@@ -0,0 +1,245 @@
+"""
+Benchmarks for booking pricing and the booking mutations. Run with
+`pytest -m benchmark -s` to see the query counts and timings.
+"""
+
+import time
+
+import pytest
+from graphql_relay.node.node import to_global_id
+from guardian.shortcuts import assign_perm
+
+from uobtheatre.bookings.test.factories import (
+    BookingFactory,
+    PerformanceSeatingFactory,
+    TicketFactory,
+    create_booked_performance,
+)
+from uobtheatre.discounts.test.factories import (
+    ConcessionTypeFactory,
+    DiscountFactory,
+    DiscountRequirementFactory,
+)
+from uobtheatre.payments.payables import Payable
+from uobtheatre.productions.test.factories import PerformanceFactory
+from uobtheatre.utils.test_utils import run_benchmark
+
+
+def get_best_discount_combination_with_price_by_enumeration(booking):
+    """The original implementation, which prices every valid combination"""
+    best_price = booking.get_price()
+    best_discount = None
+    for discount_combo in booking.get_valid_discounts():
+        discount_combo_price = booking.get_price_with_discount_combination(
+            discount_combo
+        )
+        if discount_combo_price < best_price:
+            best_price = discount_combo_price
+            best_discount = discount_combo
+    return best_discount, best_price
+
+
+def create_box_office_booking(number_of_tickets):
+    """Create a booking for a performance with single and group discounts"""
+    performance = PerformanceFactory()
+    booking = BookingFactory(performance=performance)
+
+    concession_type_adult = ConcessionTypeFactory(name="Adult")
+    concession_type_student = ConcessionTypeFactory(name="Student")
+    seatings = [
+        PerformanceSeatingFactory(performance=performance, price=price)
+        for price in (1000, 1400)
+    ]
+
+    for percentage, requirements in [
+        (0.1, {concession_type_student: 1}),
+        (0.15, {concession_type_adult: 2}),
+        (0.25, {concession_type_adult: 2, concession_type_student: 2}),
+    ]:
+        discount = DiscountFactory(percentage=percentage)
+        discount.performances.set([performance])
+        for concession_type, number in requirements.items():
+            DiscountRequirementFactory(
+                discount=discount, concession_type=concession_type, number=number
+            )
+
+    for i in range(number_of_tickets):
+        TicketFactory(
+            booking=booking,
+            concession_type=(concession_type_adult, concession_type_student)[i % 2],
+            seat_group=seatings[i % 3 % 2].seat_group,
+        )
+    return booking
+
+
+def timed(function, *args):
+    start = time.perf_counter()
+    result = function(*args)
+    return result, time.perf_counter() - start
+
+
+@pytest.mark.benchmark
+@pytest.mark.django_db
+@pytest.mark.parametrize("number_of_tickets", [1, 2, 3, 4, 5])
+def test_benchmark_best_discount_combination(number_of_tickets):
+    booking = create_box_office_booking(number_of_tickets)
+
+    (_, enumerated_price), enumerated_time = timed(
+        get_best_discount_combination_with_price_by_enumeration, booking
+    )
+    (discount_combination, price), solver_time = timed(
+        booking.get_best_discount_combination_with_price
+    )
+
+    print(
+        f"\n{number_of_tickets} tickets: enumeration {enumerated_time * 1000:.1f}ms, "
+        f"solver {solver_time * 1000:.1f}ms"
+    )
+    assert price == enumerated_price
+    if discount_combination:
+        assert (
+            booking.get_price_with_discount_combination(discount_combination) == price
+        )
+
+
+@pytest.mark.benchmark
+@pytest.mark.django_db
+@pytest.mark.parametrize("number_of_tickets", [10, 20, 40])
+def test_benchmark_best_discount_combination_large_bookings(
+    number_of_tickets, django_assert_max_num_queries
+):
+    booking = create_box_office_booking(number_of_tickets)
+
+    with django_assert_max_num_queries(5):
+        (_, price), solver_time = timed(
+            booking.get_best_discount_combination_with_price
+        )
+
+    print(f"\n{number_of_tickets} tickets: solver {solver_time * 1000:.1f}ms")
+    assert price < booking.get_price()
+
+
+def create_benchmark_booking(gql_client, number_of_tickets, **kwargs):
+    """Create a booking on a booked performance, with box office permission"""
+    performance = create_booked_performance()
+    booking = BookingFactory(performance=performance, **kwargs)
+    seat_groups = performance.performance_seat_groups.all()
+    for i in range(number_of_tickets):
+        TicketFactory(
+            booking=booking,
+            seat_group=seat_groups[i % len(seat_groups)].seat_group,
+            concession_type=booking.performance.concessions()[0],
+        )
+    gql_client.login()
+    assign_perm("productions.boxoffice", gql_client.user, performance.production)
+    return booking
+
+
+@pytest.mark.benchmark
+@pytest.mark.django_db
+@pytest.mark.parametrize("number_of_tickets, max_queries", [(2, 42), (20, 78)])
+def test_benchmark_create_booking(gql_client, number_of_tickets, max_queries):
+    performance = create_booked_performance()
+    seat_groups = performance.performance_seat_groups.all()
+    concession_types = performance.concessions()
+    tickets = "".join(
+        '{seatGroupId: "%s", concessionTypeId: "%s"}'
+        % (
+            to_global_id(
+                "SeatGroupNode", seat_groups[i % len(seat_groups)].seat_group_id
+            ),
+            to_global_id(
+                "ConcessionTypeNode", concession_types[i % len(concession_types)].id
+            ),
+        )
+        for i in range(number_of_tickets)
+    )
+    request = """
+        mutation {
+          booking(input: {performance: "%s", tickets: [%s]}) {
+            success
+            booking {
+              reference
+              priceBreakdown {
+                totalPrice
+              }
+            }
+          }
+        }
+    """ % (
+        to_global_id("PerformanceNode", performance.id),
+        tickets,
+    )
+    gql_client.login()
+    # Box office users may book more than the public ticket limit
+    assign_perm("productions.boxoffice", gql_client.user, performance.production)
+
+    response = run_benchmark(
+        f"Create booking ({number_of_tickets} tickets)",
+        lambda: gql_client.execute(request),
+        max_queries=max_queries,
+    )
+
+    assert response["data"]["booking"]["success"]
+
+
+@pytest.mark.benchmark
+@pytest.mark.django_db
+@pytest.mark.parametrize("number_of_tickets, max_queries", [(2, 45), (20, 45)])
+def test_benchmark_pay_booking(gql_client, number_of_tickets, max_queries):
+    booking = create_benchmark_booking(
+        gql_client, number_of_tickets, status=Payable.Status.IN_PROGRESS
+    )
+    request = """
+        mutation {
+          payBooking(id: "%s", price: %s, paymentProvider: CASH) {
+            success
+            booking {
+              status
+            }
+          }
+        }
+    """ % (
+        to_global_id("BookingNode", booking.id),
+        booking.total,
+    )
+
+    response = run_benchmark(
+        f"Pay booking ({number_of_tickets} tickets)",
+        lambda: gql_client.execute(request),
+        max_queries=max_queries,
+    )
+
+    assert response["data"]["payBooking"]["booking"]["status"] == "PAID"
+
+
+@pytest.mark.benchmark
+@pytest.mark.django_db
+@pytest.mark.parametrize("number_of_tickets, max_queries", [(2, 26), (20, 152)])
+def test_benchmark_check_in_booking(gql_client, number_of_tickets, max_queries):
+    booking = create_benchmark_booking(gql_client, number_of_tickets)
+    request = """
+        mutation {
+          checkInBooking(bookingReference: "%s", performance: "%s", tickets: [%s]) {
+            success
+            booking {
+              id
+            }
+          }
+        }
+    """ % (
+        booking.reference,
+        to_global_id("PerformanceNode", booking.performance_id),
+        "".join(
+            '{ticketId: "%s"}' % to_global_id("TicketNode", ticket.id)
+            for ticket in booking.tickets.all()
+        ),
+    )
+
+    response = run_benchmark(
+        f"Check in booking ({number_of_tickets} tickets)",
+        lambda: gql_client.execute(request),
+        max_queries=max_queries,
+    )
+
+    assert response["data"]["checkInBooking"]["success"]
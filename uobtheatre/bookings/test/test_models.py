@@ -1,11 +1,13 @@
 # pylint: disable=too-many-lines
 import datetime
 import math
+import threading
 from unittest.mock import PropertyMock, patch
 from urllib.parse import quote_plus
 
 import pytest
 import pytz
+from django.db import connection
 from django.db.utils import IntegrityError
 from django.utils import timezone
 from graphql_relay.node.node import to_global_id
@@ -30,6 +32,7 @@ from uobtheatre.payments.exceptions import (
 )
 from uobtheatre.payments.payables import Payable
 from uobtheatre.payments.test.factories import TransactionFactory, mock_payment_method
+from uobtheatre.productions.exceptions import NotEnoughCapacityException
 from uobtheatre.productions.models import Production
 from uobtheatre.productions.test.factories import PerformanceFactory, ProductionFactory
 from uobtheatre.users.test.factories import UserFactory
@@ -180,6 +183,51 @@ def test_get_price():
     assert booking.get_price() == 1100
 
 
+@pytest.mark.django_db
+@pytest.mark.parametrize("number_of_tickets", [1, 10])
+def test_booking_pricing_query_count(number_of_tickets, django_assert_num_queries):
+    performance = PerformanceFactory()
+    seat_groups = [
+        PerformanceSeatingFactory(performance=performance, price=price).seat_group
+        for price in [1000, 800]
+    ]
+    concession_types = [ConcessionTypeFactory(), ConcessionTypeFactory()]
+    discount = DiscountFactory(percentage=0.2)
+    DiscountRequirementFactory(
+        discount=discount, concession_type=concession_types[0], number=1
+    )
+    discount.performances.set([performance])
+    ValueMiscCostFactory(value=50)
+    booking = BookingFactory(performance=performance)
+    for i in range(number_of_tickets):
+        TicketFactory(
+            booking=booking,
+            seat_group=seat_groups[i % 2],
+            concession_type=concession_types[i % 2],
+        )
+    booking = Booking.objects.get(pk=booking.pk).load_pricing_context()
+
+    # Performance, tickets, seat group prices, single discounts (with their
+    # requirements and concession types), group discount check and misc costs
+    with django_assert_num_queries(8):
+        booking.get_price()
+        booking.tickets_price()
+        booking.total  # pylint: disable=pointless-statement
+        for ticket in booking.pricing.tickets:
+            ticket.discounted_price()
+
+
+@pytest.mark.django_db
+def test_booking_pricing_context_is_shared():
+    booking = BookingFactory()
+    pricing = booking.pricing
+
+    assert booking.pricing is not pricing
+    assert booking.load_pricing_context() is booking
+    pricing = booking.pricing
+    assert booking.pricing is pricing
+
+
 @pytest.mark.django_db
 def test_ticket_price():
     performance = PerformanceFactory()
@@ -432,6 +480,95 @@ def test_get_best_discount_combination():
     )
 
 
+@pytest.mark.django_db
+def test_get_best_discount_combination_matches_all_valid_discounts():
+    performance = PerformanceFactory()
+    booking = BookingFactory(performance=performance)
+
+    concession_type_student = ConcessionTypeFactory(name="Student")
+    concession_type_adult = ConcessionTypeFactory(name="Adult")
+
+    # Tickets are in seat groups with different prices, so the tickets which
+    # each discount is applied to matters
+    cheap_seating = PerformanceSeatingFactory(performance=performance, price=1000)
+    expensive_seating = PerformanceSeatingFactory(performance=performance, price=1500)
+
+    discount_family = DiscountFactory(name="Family", percentage=0.3)
+    discount_family.performances.set([performance])
+    DiscountRequirementFactory(
+        concession_type=concession_type_student, number=1, discount=discount_family
+    )
+    DiscountRequirementFactory(
+        concession_type=concession_type_adult, number=2, discount=discount_family
+    )
+
+    discount_adults = DiscountFactory(name="Adults", percentage=0.15)
+    discount_adults.performances.set([performance])
+    DiscountRequirementFactory(
+        concession_type=concession_type_adult, number=2, discount=discount_adults
+    )
+
+    discount_student = DiscountFactory(name="Student", percentage=0.1)
+    discount_student.performances.set([performance])
+    DiscountRequirementFactory(
+        concession_type=concession_type_student, number=1, discount=discount_student
+    )
+
+    for concession_type, seating in [
+        (concession_type_adult, expensive_seating),
+        (concession_type_student, cheap_seating),
+        (concession_type_adult, cheap_seating),
+        (concession_type_adult, expensive_seating),
+        (concession_type_student, expensive_seating),
+    ]:
+        TicketFactory(
+            booking=booking,
+            concession_type=concession_type,
+            seat_group=seating.seat_group,
+        )
+
+    expected_price = min(
+        booking.get_price_with_discount_combination(discount_combination)
+        for discount_combination in booking.get_valid_discounts()
+    )
+    discount_combination, price = booking.get_best_discount_combination_with_price()
+
+    assert price == expected_price
+    assert booking.get_price_with_discount_combination(discount_combination) == price
+
+
+@pytest.mark.django_db
+def test_get_best_discount_combination_with_price_no_discounts():
+    booking = BookingFactory()
+    psg = PerformanceSeatingFactory(performance=booking.performance, price=1200)
+    TicketFactory(booking=booking, seat_group=psg.seat_group)
+    TicketFactory(booking=booking, seat_group=psg.seat_group)
+
+    assert booking.get_best_discount_combination_with_price() == (None, 2400)
+
+
+@pytest.mark.django_db
+def test_get_best_discount_combination_with_price_inapplicable_discounts():
+    booking = BookingFactory()
+    psg = PerformanceSeatingFactory(performance=booking.performance, price=1200)
+    adult = ConcessionTypeFactory()
+    TicketFactory(booking=booking, seat_group=psg.seat_group, concession_type=adult)
+
+    # A discount requiring a concession type which isn't in the booking
+    family_discount = DiscountFactory(percentage=0.5)
+    family_discount.performances.set([booking.performance])
+    DiscountRequirementFactory(discount=family_discount, concession_type=adult)
+    DiscountRequirementFactory(discount=family_discount)
+
+    # A discount which doesn't require any tickets
+    empty_discount = DiscountFactory(percentage=0.5)
+    empty_discount.performances.set([booking.performance])
+    DiscountRequirementFactory(discount=empty_discount, concession_type=adult, number=0)
+
+    assert booking.get_best_discount_combination_with_price() == (None, 1200)
+    assert booking.subtotal == 1200
+
+
 @pytest.mark.django_db
 @pytest.mark.parametrize(
     "students, adults, is_single",
@@ -493,6 +630,18 @@ def test_misc_costs_value():
     assert booking.misc_costs_value == 320
 
 
+@pytest.mark.django_db
+def test_misc_cost_queryset_value():
+    ValueMiscCostFactory(value=200)
+    PercentageMiscCostFactory(percentage=0.1)
+    booking = BookingFactory()
+    psg = PerformanceSeatingFactory(performance=booking.performance, price=1200)
+    TicketFactory(booking=booking, seat_group=psg.seat_group)
+
+    assert MiscCost.objects.value(booking) == 320
+    assert MiscCost.objects.value(booking) == booking.misc_costs_value
+
+
 @pytest.mark.django_db
 def test_subtotal_with_group_discounts():
     performance = PerformanceFactory()
@@ -825,6 +974,86 @@ def test_booking_ticket_diff(
     assert total_number_of_tickets == expected_total_number_of_tickets
 
 
+@pytest.mark.django_db
+def test_booking_reserve_tickets():
+    booking = BookingFactory()
+    psg = PerformanceSeatingFactory(performance=booking.performance, capacity=2)
+    discount = DiscountFactory()
+    discount.performances.set([booking.performance])
+    requirement = DiscountRequirementFactory(discount=discount)
+    existing_ticket = TicketFactory(booking=booking, seat_group=psg.seat_group)
+    other_ticket = TicketFactory(booking=booking, seat_group=psg.seat_group)
+
+    new_tickets = [
+        Ticket(seat_group=psg.seat_group, concession_type=requirement.concession_type)
+    ]
+    booking.reserve_tickets(new_tickets, [existing_ticket])
+
+    assert set(booking.tickets.all()) == {other_ticket, new_tickets[0]}
+
+
+@pytest.mark.django_db
+def test_booking_reserve_tickets_not_enough_capacity():
+    booking = BookingFactory()
+    psg = PerformanceSeatingFactory(performance=booking.performance, capacity=1)
+    TicketFactory(booking=booking, seat_group=psg.seat_group)
+
+    with pytest.raises(NotEnoughCapacityException):
+        booking.reserve_tickets(
+            [Ticket(seat_group=psg.seat_group, concession_type=ConcessionTypeFactory())]
+        )
+
+    assert booking.tickets.count() == 1
+
+
+@pytest.mark.django_db(transaction=True)
+def test_booking_reserve_tickets_concurrently_does_not_oversell():
+    """
+    Reserve tickets for many bookings at once from different threads (and
+    therefore database connections), and check the performance is not
+    oversold.
+    """
+    performance = PerformanceFactory(venue=VenueFactory(internal_capacity=100))
+    psg = PerformanceSeatingFactory(performance=performance, capacity=5)
+    discount = DiscountFactory()
+    discount.performances.set([performance])
+    concession_type = DiscountRequirementFactory(discount=discount).concession_type
+    bookings = [
+        BookingFactory(performance=performance, status=Payable.Status.IN_PROGRESS)
+        for _ in range(12)
+    ]
+    start_barrier = threading.Barrier(len(bookings))
+    results = []
+
+    def reserve(booking):
+        try:
+            start_barrier.wait()
+            booking.reserve_tickets(
+                [
+                    Ticket(seat_group=psg.seat_group, concession_type=concession_type)
+                    for _ in range(2)
+                ]
+            )
+            results.append(True)
+        except NotEnoughCapacityException:
+            results.append(False)
+        finally:
+            connection.close()
+
+    threads = [
+        threading.Thread(target=reserve, args=(booking,)) for booking in bookings
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert results.count(True) == 2
+    assert results.count(False) == 10
+    assert Ticket.objects.filter(booking__performance=performance).count() == 4
+    assert performance.capacity_remaining == 1
+
+
 @pytest.mark.django_db
 def test_booking_pay_with_payment():
     """
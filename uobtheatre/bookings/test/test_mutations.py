@@ -26,6 +26,7 @@ from uobtheatre.payments.models import Transaction
 from uobtheatre.payments.payables import Payable
 from uobtheatre.payments.test.factories import TransactionFactory
 from uobtheatre.payments.transaction_providers import SquareOnline, SquarePOS
+from uobtheatre.productions.exceptions import NotEnoughCapacityException
 from uobtheatre.productions.test.factories import PerformanceFactory
 from uobtheatre.users.models import User
 from uobtheatre.users.test.factories import UserFactory
@@ -1355,6 +1356,70 @@ def test_update_booking_capacity_error(gql_client):
     }
 
 
+@pytest.mark.django_db
+def test_update_booking_capacity_taken_before_save(gql_client):
+    seat_group = SeatGroupFactory()
+    concession_type = ConcessionTypeFactory()
+    booking = BookingFactory(
+        user=gql_client.login().user, status=Payable.Status.IN_PROGRESS
+    )
+    request_query = """
+        mutation {
+            booking (
+                input: {
+                    id: "%s"
+                    tickets: [
+                    {
+                        seatGroupId: "%s"
+                        concessionTypeId: "%s"
+                    }
+                    ]
+                }
+            ){
+                success
+                errors {
+                  __typename
+                  ... on FieldError {
+                    message
+                    field
+                  }
+                }
+            }
+        }
+        """ % (
+        to_global_id("BookingNode", booking.id),
+        to_global_id("SeatGroupNode", seat_group.id),
+        to_global_id("ConcessionTypeNode", concession_type.id),
+    )
+
+    # The tickets are valid when the form is cleaned, but another booking has
+    # taken the capacity by the time they are reserved
+    with patch(
+        "uobtheatre.productions.abilities.BookForPerformance.user_has_for",
+        return_value=True,
+    ), patch(
+        "uobtheatre.productions.models.Performance.validate_tickets",
+        side_effect=[None, NotEnoughCapacityException()],
+    ):
+        response = gql_client.execute(request_query)
+
+    assert response == {
+        "data": {
+            "booking": {
+                "success": False,
+                "errors": [
+                    {
+                        "__typename": "FieldError",
+                        "message": "There is not enough capacity available",
+                        "field": "tickets",
+                    }
+                ],
+            }
+        }
+    }
+    assert booking.tickets.count() == 0
+
+
 @pytest.mark.django_db
 def test_update_paid_booking_fails(gql_client):
     seat_group = SeatGroupFactory()
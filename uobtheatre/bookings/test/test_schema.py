@@ -3,6 +3,8 @@ import datetime
 
 import pytest
 from django.contrib.auth.models import AnonymousUser, Permission
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
 from django.utils import timezone
 from graphql_relay.node.node import to_global_id
 from guardian.shortcuts import assign_perm
@@ -21,7 +23,9 @@ from uobtheatre.discounts.test.factories import (
     DiscountFactory,
     DiscountRequirementFactory,
 )
+from uobtheatre.payments.models import Transaction
 from uobtheatre.payments.payables import Payable
+from uobtheatre.payments.test.factories import TransactionFactory
 from uobtheatre.productions.test.factories import PerformanceFactory, ProductionFactory
 from uobtheatre.users.test.factories import UserFactory
 from uobtheatre.venues.test.factories import SeatGroupFactory
@@ -1016,6 +1020,195 @@ def test_bookings_qs(gql_client):
     }
 
 
+@pytest.mark.django_db
+def test_bookings_relations_are_batched(gql_client):
+    gql_client.login_as_super_user()
+
+    def create_bookings(number):
+        for _ in range(number):
+            booking = BookingFactory()
+            TicketFactory(booking=booking)
+            TicketFactory(booking=booking)
+
+    request = """
+        {
+          bookings {
+            edges {
+              node {
+                user {
+                  email
+                }
+                tickets {
+                  id
+                }
+                performance {
+                  capacityRemaining
+                  production {
+                    name
+                  }
+                }
+              }
+            }
+          }
+        }
+    """
+
+    def count_queries():
+        with CaptureQueriesContext(connection) as context:
+            response = gql_client.execute(request)
+        assert "errors" not in response
+        return len(context.captured_queries)
+
+    create_bookings(1)
+    count_queries()  # Populate Django's content type cache
+    queries_for_one_booking = count_queries()
+    create_bookings(4)
+
+    assert count_queries() == queries_for_one_booking
+
+    response = gql_client.execute(request)
+    assert [
+        len(edge["node"]["tickets"]) for edge in response["data"]["bookings"]["edges"]
+    ] == [2] * 5
+
+
+@pytest.mark.django_db
+def test_bookings_can_be_refunded_is_batched(gql_client):
+    gql_client.login_as_super_user()
+
+    def create_bookings(number):
+        for _ in range(number):
+            TransactionFactory(pay_object=BookingFactory(status=Payable.Status.PAID))
+            # A booking without any payments
+            BookingFactory(status=Payable.Status.PAID)
+
+    request = """
+        {
+          bookings {
+            edges {
+              node {
+                canBeRefunded
+              }
+            }
+          }
+        }
+    """
+
+    def count_queries():
+        with CaptureQueriesContext(connection) as context:
+            response = gql_client.execute(request)
+        assert "errors" not in response
+        return len(context.captured_queries)
+
+    create_bookings(1)
+    count_queries()  # Populate Django's content type cache
+    queries_for_one_booking = count_queries()
+    create_bookings(4)
+
+    assert count_queries() == queries_for_one_booking
+
+    response = gql_client.execute(request)
+    assert [
+        edge["node"]["canBeRefunded"] for edge in response["data"]["bookings"]["edges"]
+    ] == [True, False] * 5
+
+
+@pytest.mark.django_db
+def test_nested_booking_can_be_refunded(gql_client):
+    gql_client.login_as_super_user()
+    TransactionFactory(pay_object=BookingFactory(status=Payable.Status.PAID))
+    TransactionFactory(pay_object=BookingFactory(status=Payable.Status.IN_PROGRESS))
+
+    response = gql_client.execute(
+        """
+        {
+          bookings {
+            edges {
+              node {
+                transactions {
+                  edges {
+                    node {
+                      payObject {
+                        ... on BookingNode {
+                          canBeRefunded
+                        }
+                      }
+                    }
+                  }
+                }
+              }
+            }
+          }
+        }
+        """
+    )
+
+    assert [
+        edge["node"]["transactions"]["edges"][0]["node"]["payObject"]["canBeRefunded"]
+        for edge in response["data"]["bookings"]["edges"]
+    ] == [True, False]
+
+
+@pytest.mark.django_db
+def test_bookings_sales_breakdowns_are_batched(gql_client):
+    gql_client.login_as_super_user()
+
+    def create_bookings(number):
+        for _ in range(number):
+            booking = BookingFactory()
+            TransactionFactory(pay_object=booking, value=1000, app_fee=100)
+            TransactionFactory(
+                pay_object=booking,
+                value=-200,
+                app_fee=None,
+                type=Transaction.Type.REFUND,
+            )
+
+    request = """
+        {
+          bookings {
+            edges {
+              node {
+                salesBreakdown {
+                  totalPayments
+                  totalCardRefunds
+                  netTransactions
+                  appFee
+                  societyTransferValue
+                }
+              }
+            }
+          }
+        }
+    """
+
+    def count_queries():
+        with CaptureQueriesContext(connection) as context:
+            response = gql_client.execute(request)
+        assert "errors" not in response
+        return len(context.captured_queries)
+
+    create_bookings(1)
+    count_queries()  # Populate Django's content type cache
+    queries_for_one_booking = count_queries()
+    create_bookings(4)
+
+    assert count_queries() == queries_for_one_booking
+
+    response = gql_client.execute(request)
+    assert [
+        edge["node"]["salesBreakdown"] for edge in response["data"]["bookings"]["edges"]
+    ] == [
+        {
+            "totalPayments": 1000,
+            "totalCardRefunds": -200,
+            "netTransactions": 800,
+            "appFee": 100,
+            "societyTransferValue": 700,
+        }
+    ] * 5
+
+
 @pytest.mark.django_db
 def test_booking_filter_checked_in(gql_client):
     # No tickets booking
@@ -0,0 +1,107 @@
+from datetime import timedelta
+
+import pytest
+from django.utils import timezone
+
+from uobtheatre.bookings.models import Booking
+from uobtheatre.bookings.test.factories import (
+    BookingFactory,
+    PerformanceSeatingFactory,
+    TicketFactory,
+)
+from uobtheatre.payments.payables import Payable
+
+
+def ticket_counts(performance_seat_group):
+    performance_seat_group.refresh_from_db()
+    return performance_seat_group.tickets_sold, performance_seat_group.tickets_reserved
+
+
+@pytest.mark.django_db
+def test_ticket_changes_update_ticket_counts():
+    booking = BookingFactory(status=Payable.Status.IN_PROGRESS)
+    psg = PerformanceSeatingFactory(performance=booking.performance)
+    other_psg = PerformanceSeatingFactory(performance=booking.performance)
+
+    ticket = TicketFactory(booking=booking, seat_group=psg.seat_group)
+    TicketFactory(booking=booking, seat_group=psg.seat_group)
+    assert ticket_counts(psg) == (0, 2)
+
+    ticket.seat_group = other_psg.seat_group
+    ticket.save()
+    assert ticket_counts(psg) == (0, 1)
+    assert ticket_counts(other_psg) == (0, 1)
+
+    ticket.delete()
+    assert ticket_counts(other_psg) == (0, 0)
+
+
+@pytest.mark.django_db
+def test_booking_changes_update_ticket_counts():
+    booking = BookingFactory(status=Payable.Status.IN_PROGRESS)
+    psg = PerformanceSeatingFactory(performance=booking.performance)
+    TicketFactory(booking=booking, seat_group=psg.seat_group)
+    TicketFactory(booking=booking, seat_group=psg.seat_group)
+    assert ticket_counts(psg) == (0, 2)
+
+    booking.status = Payable.Status.PAID
+    booking.save()
+    assert ticket_counts(psg) == (2, 0)
+
+    booking.status = Payable.Status.CANCELLED
+    booking.save()
+    assert ticket_counts(psg) == (0, 0)
+
+    booking.status = Payable.Status.PAID
+    booking.save()
+    booking.delete()
+    assert ticket_counts(psg) == (0, 0)
+
+
+@pytest.mark.django_db
+def test_checking_in_ticket_doesnt_change_ticket_counts(django_assert_num_queries):
+    booking = BookingFactory(status=Payable.Status.PAID)
+    psg = PerformanceSeatingFactory(performance=booking.performance)
+    ticket = TicketFactory(booking=booking, seat_group=psg.seat_group)
+
+    # Only the ticket is updated
+    with django_assert_num_queries(1):
+        ticket.check_in(booking.user)
+    assert ticket_counts(psg) == (1, 0)
+
+
+@pytest.mark.django_db
+def test_booking_expiry_changes_reservations_expire_at():
+    booking = BookingFactory(status=Payable.Status.IN_PROGRESS)
+    psg = PerformanceSeatingFactory(performance=booking.performance)
+    TicketFactory(booking=booking, seat_group=psg.seat_group)
+    psg.refresh_from_db()
+    assert psg.reservations_expire_at == booking.expires_at
+
+    booking.expires_at = timezone.now() - timedelta(minutes=1)
+    booking.save()
+    assert ticket_counts(psg) == (0, 1)
+    assert psg.reservations_expire_at == booking.expires_at
+
+
+@pytest.mark.django_db
+def test_deleting_bookings_removes_their_tickets_from_ticket_counts():
+    psg = PerformanceSeatingFactory()
+    bookings = [
+        BookingFactory(performance=psg.performance, status=status)
+        for status in [Payable.Status.IN_PROGRESS, Payable.Status.PAID]
+    ]
+    for booking in bookings:
+        TicketFactory(booking=booking, seat_group=psg.seat_group)
+        TicketFactory(booking=booking, seat_group=psg.seat_group)
+    kept_booking = BookingFactory(
+        performance=psg.performance, status=Payable.Status.IN_PROGRESS
+    )
+    TicketFactory(booking=kept_booking, seat_group=psg.seat_group)
+    assert ticket_counts(psg) == (2, 3)
+
+    Booking.objects.filter(pk__in=[booking.pk for booking in bookings]).delete()
+
+    assert ticket_counts(psg) == (0, 1)
+    # The deleted reservation may have expired first, so it is still the bound
+    assert psg.reservations_expire_at <= kept_booking.expires_at
@@ -0,0 +1,88 @@
+import datetime
+
+import pytest
+from django.utils import timezone
+
+from uobtheatre.bookings.models import Booking, Ticket
+from uobtheatre.bookings.tasks import release_expired_bookings
+from uobtheatre.bookings.test.factories import (
+    BookingFactory,
+    PerformanceSeatingFactory,
+    TicketFactory,
+)
+from uobtheatre.payments.models import Transaction
+from uobtheatre.payments.payables import Payable
+from uobtheatre.payments.test.factories import TransactionFactory
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize("batch_size, expected_batches", [(1, 3), (2, 2), (10, 1)])
+def test_release_expired_bookings(settings, batch_size, expected_batches):
+    settings.EXPIRED_BOOKINGS_GRACE_PERIOD = 60
+    psg = PerformanceSeatingFactory()
+    expired_at = timezone.now() - datetime.timedelta(minutes=2)
+
+    def expired_booking(transaction_status=None, **kwargs):
+        booking = BookingFactory(
+            **{
+                "performance": psg.performance,
+                "status": Payable.Status.IN_PROGRESS,
+                "expires_at": expired_at,
+                **kwargs,
+            }
+        )
+        if transaction_status:
+            TransactionFactory(pay_object=booking, status=transaction_status)
+        return booking
+
+    expired_bookings = [
+        expired_booking(),
+        expired_booking(),
+    ]
+    failed_booking = expired_booking(transaction_status=Transaction.Status.FAILED)
+    kept_bookings = [
+        BookingFactory(performance=psg.performance, status=Payable.Status.IN_PROGRESS),
+        expired_booking(status=Payable.Status.PAID),
+        expired_booking(transaction_status=Transaction.Status.PENDING),
+        expired_booking(transaction_status=Transaction.Status.COMPLETED),
+        # Still within the grace period
+        expired_booking(expires_at=timezone.now() - datetime.timedelta(seconds=30)),
+    ]
+    for booking in expired_bookings + [failed_booking] + kept_bookings:
+        TicketFactory(booking=booking, seat_group=psg.seat_group)
+    TicketFactory(booking=expired_bookings[0], seat_group=psg.seat_group)
+
+    psg.refresh_from_db()
+    assert (psg.tickets_sold, psg.tickets_reserved) == (1, 8)
+
+    assert release_expired_bookings(batch_size) == {
+        "batches": expected_batches,
+        "bookings": 3,
+        "tickets": 4,
+    }
+
+    # The booking whose payment failed is cancelled rather than deleted, so
+    # its failed transaction is kept
+    assert set(Booking.objects.all()) == set(kept_bookings + [failed_booking])
+    failed_booking.refresh_from_db()
+    assert failed_booking.status == Payable.Status.CANCELLED
+    assert not failed_booking.tickets.exists()
+    assert list(failed_booking.transactions.values_list("status", flat=True)) == [
+        Transaction.Status.FAILED
+    ]
+    assert Ticket.objects.count() == 5
+    psg.refresh_from_db()
+    assert (psg.tickets_sold, psg.tickets_reserved) == (1, 4)
+
+
+@pytest.mark.django_db
+def test_release_expired_bookings_default_batch_size(settings):
+    settings.EXPIRED_BOOKINGS_BATCH_SIZE = 1
+    for _ in range(2):
+        BookingFactory(
+            status=Payable.Status.IN_PROGRESS,
+            expires_at=timezone.now()
+            - datetime.timedelta(seconds=settings.EXPIRED_BOOKINGS_GRACE_PERIOD + 60),
+        )
+
+    assert release_expired_bookings() == {"batches": 2, "bookings": 2, "tickets": 0}
@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand
+
+from uobtheatre.payments.models import DailySales
+
+
+class Command(BaseCommand):
+    """Rebuild the daily sales rollup from the transactions"""
+
+    help = "Recompute the daily sales rollup of every performance from the transactions"
+
+    def handle(self, *args, **options):  # pylint: disable=unused-argument
+        number_of_rows = DailySales.objects.rebuild()
+        self.stdout.write(
+            str(
+                self.style.SUCCESS(
+                    f"The daily sales have been rebuilt ({number_of_rows} rows)"
+                )
+            )
+        )
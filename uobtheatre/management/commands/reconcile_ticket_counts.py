@@ -0,0 +1,59 @@
+from django.core.management.base import BaseCommand
+from django.db.models import F, Q
+
+from uobtheatre.productions.models import PerformanceSeatGroup
+
+
+class Command(BaseCommand):
+    """Reconcile the stored ticket counts of PerformanceSeatGroups"""
+
+    help = "Recompute the ticket counts of each performance seat group from the tickets, reporting any drift"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--dry-run",
+            action="store_true",
+            help="Report drift without updating the stored counts",
+        )
+
+    def handle(self, *args, **options):  # pylint: disable=unused-argument
+        drifted = (
+            PerformanceSeatGroup.objects.annotate_ticket_counts()
+            .annotate_unexpired_tickets_reserved()
+            .filter(
+                ~Q(tickets_sold=F("counted_tickets_sold"))
+                | ~Q(tickets_reserved=F("counted_tickets_reserved"))
+                # The reservations counted by capacity snapshots, which
+                # depend on reservations_expire_at too
+                | ~Q(unexpired_tickets_reserved=F("counted_unexpired_tickets_reserved"))
+            )
+            .order_by("pk")
+        )
+
+        drifted_ids = []
+        for performance_seat_group in drifted:
+            drifted_ids.append(performance_seat_group.pk)
+            self.stdout.write(
+                f"Performance {performance_seat_group.performance_id} seat group {performance_seat_group.seat_group_id}: "
+                f"sold {performance_seat_group.tickets_sold} (counted {performance_seat_group.counted_tickets_sold}), "
+                f"reserved {performance_seat_group.tickets_reserved} (counted {performance_seat_group.counted_tickets_reserved}), "
+                f"unexpired reserved {performance_seat_group.unexpired_tickets_reserved} (counted {performance_seat_group.counted_unexpired_tickets_reserved})"
+            )
+
+        if not options["dry_run"]:
+            PerformanceSeatGroup.objects.filter(
+                pk__in=drifted_ids
+            ).refresh_ticket_counts()
+
+        self.stdout.write(
+            str(
+                self.style.SUCCESS(
+                    f"{len(drifted_ids)} performance seat groups had drifted"
+                    + (
+                        " (not updated)"
+                        if options["dry_run"]
+                        else " and have been updated"
+                    )
+                )
+            )
+        )
@@ -0,0 +1,29 @@
+from io import StringIO
+
+import pytest
+from django.core.management import call_command
+
+from uobtheatre.bookings.test.factories import BookingFactory
+from uobtheatre.payments.models import DailySales
+from uobtheatre.payments.test.factories import TransactionFactory
+from uobtheatre.payments.transaction_providers import Cash
+
+
+@pytest.mark.django_db
+def test_rebuild_daily_sales():
+    booking = BookingFactory()
+    TransactionFactory(pay_object=booking, value=1000, app_fee=100)
+    TransactionFactory(pay_object=booking, value=500, provider_name=Cash.name)
+    expected = booking.performance.qs.transactions().annotate_sales_breakdown()
+
+    DailySales.objects.all().delete()
+    DailySales.objects.create(
+        date="2020-01-01", performance=BookingFactory().performance
+    )
+
+    out = StringIO()
+    call_command("rebuild_daily_sales", stdout=out)
+
+    assert "The daily sales have been rebuilt (2 rows)" in out.getvalue()
+    assert DailySales.objects.count() == 2
+    assert DailySales.objects.sales_breakdown() == expected
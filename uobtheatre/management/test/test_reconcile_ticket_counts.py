@@ -0,0 +1,71 @@
+from datetime import timedelta
+from io import StringIO
+
+import pytest
+from django.core.management import call_command
+from django.utils import timezone
+
+from uobtheatre.bookings.models import Booking
+from uobtheatre.bookings.test.factories import (
+    BookingFactory,
+    PerformanceSeatingFactory,
+    TicketFactory,
+)
+from uobtheatre.payments.payables import Payable
+from uobtheatre.productions.models import PerformanceSeatGroup
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize("dry_run", [False, True])
+def test_reconcile_ticket_counts(dry_run):
+    psg = PerformanceSeatingFactory()
+    correct_psg = PerformanceSeatingFactory()
+    TicketFactory(
+        booking=BookingFactory(performance=psg.performance),
+        seat_group=psg.seat_group,
+    )
+    PerformanceSeatGroup.objects.filter(pk=psg.pk).update(
+        tickets_sold=3, tickets_reserved=2
+    )
+
+    out = StringIO()
+    call_command(
+        "reconcile_ticket_counts", *(["--dry-run"] if dry_run else []), stdout=out
+    )
+
+    assert (
+        f"Performance {psg.performance_id} seat group {psg.seat_group_id}: sold 3 (counted 1), reserved 2 (counted 0), unexpired reserved 2 (counted 0)"
+        in out.getvalue()
+    )
+    assert f"seat group {correct_psg.seat_group_id}:" not in out.getvalue()
+    assert "1 performance seat groups had drifted" in out.getvalue()
+
+    psg.refresh_from_db()
+    assert (psg.tickets_sold, psg.tickets_reserved) == ((3, 2) if dry_run else (1, 0))
+
+
+@pytest.mark.django_db
+def test_reconcile_ticket_counts_with_stale_reservations_expire_at():
+    psg = PerformanceSeatingFactory()
+    booking = BookingFactory(
+        performance=psg.performance, status=Payable.Status.IN_PROGRESS
+    )
+    TicketFactory(booking=booking, seat_group=psg.seat_group)
+    # The reservation has expired, but the stored counts say none have
+    Booking.objects.filter(pk=booking.pk).update(
+        expires_at=timezone.now() - timedelta(minutes=1)
+    )
+    PerformanceSeatGroup.objects.filter(pk=psg.pk).update(
+        reservations_expire_at=timezone.now() + timedelta(minutes=10)
+    )
+
+    out = StringIO()
+    call_command("reconcile_ticket_counts", stdout=out)
+
+    assert (
+        f"Performance {psg.performance_id} seat group {psg.seat_group_id}: sold 0 (counted 0), reserved 1 (counted 1), unexpired reserved 1 (counted 0)"
+        in out.getvalue()
+    )
+    booking.refresh_from_db()
+    psg.refresh_from_db()
+    assert psg.reservations_expire_at == booking.expires_at
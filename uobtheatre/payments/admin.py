@@ -1,6 +1,6 @@
 from django.contrib import admin, messages
 
-from uobtheatre.payments.models import Transaction
+from uobtheatre.payments.models import SquareWebhookEvent, Transaction
 from uobtheatre.utils.exceptions import SquareException
 
 
@@ -33,3 +33,12 @@ class TransactionAdmin(admin.ModelAdmin):
 
 
 admin.site.register(Transaction, TransactionAdmin)
+
+
+class SquareWebhookEventAdmin(admin.ModelAdmin):
+    list_display = ("event_id", "type", "provider_transaction_id", "processed_at")
+    list_filter = ("type", ("processed_at", admin.EmptyFieldListFilter))  # type: ignore
+    search_fields = ("event_id", "provider_transaction_id")
+
+
+admin.site.register(SquareWebhookEvent, SquareWebhookEventAdmin)
@@ -0,0 +1,139 @@
+# Generated by Django 3.2.25 on 2026-10-18 20:45
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Q, Subquery, Sum
+from django.db.models.functions import Coalesce, TruncDate
+
+
+def roll_up_transactions(apps, _):  # pragma: no cover
+    content_type_model = apps.get_model("contenttypes", "contenttype")
+    transaction_model = apps.get_model("payments", "transaction")
+    booking_model = apps.get_model("bookings", "booking")
+    daily_sales_model = apps.get_model("payments", "dailysales")
+
+    booking_type = content_type_model.objects.filter(
+        app_label="bookings", model="booking"
+    ).first()
+    if booking_type is None:
+        return
+
+    rows = (
+        transaction_model.objects.filter(pay_object_type=booking_type)
+        .annotate(
+            rollup_performance_id=Subquery(
+                booking_model.objects.filter(pk=OuterRef("pay_object_id")).values(
+                    "performance_id"
+                )
+            )
+        )
+        .filter(rollup_performance_id__isnull=False)
+        .order_by()
+        .values(
+            "provider_name",
+            "status",
+            "rollup_performance_id",
+            rollup_date=TruncDate("created_at"),
+        )
+        .annotate(
+            rollup_total_payments=Coalesce(Sum("value", filter=Q(type="PAYMENT")), 0),
+            rollup_total_refunds=Coalesce(Sum("value", filter=Q(type="REFUND")), 0),
+            rollup_app_fee=Coalesce(Sum("app_fee"), 0),
+            rollup_provider_fee=Coalesce(Sum("provider_fee"), 0),
+            rollup_number_of_transactions=Count("pk"),
+        )
+    )
+    daily_sales_model.objects.bulk_create(
+        [
+            daily_sales_model(
+                date=row["rollup_date"],
+                performance_id=row["rollup_performance_id"],
+                provider_name=row["provider_name"],
+                status=row["status"],
+                total_payments=row["rollup_total_payments"],
+                total_refunds=row["rollup_total_refunds"],
+                app_fee=row["rollup_app_fee"],
+                provider_fee=row["rollup_provider_fee"],
+                number_of_transactions=row["rollup_number_of_transactions"],
+            )
+            for row in rows
+        ],
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("contenttypes", "0002_remove_content_type_name"),
+        ("bookings", "0007_booking_accessibility_info"),
+        ("productions", "0028_performanceseatgroup_ticket_counts"),
+        ("payments", "0015_delete_financialtransfer"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="DailySales",
+            fields=[
+                (
+                    "id",
+                    models.AutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("date", models.DateField()),
+                (
+                    "provider_name",
+                    models.CharField(
+                        choices=[
+                            ("CASH", "CASH"),
+                            ("CARD", "CARD"),
+                            ("SQUARE_POS", "SQUARE_POS"),
+                            ("SQUARE_ONLINE", "SQUARE_ONLINE"),
+                            ("MANUAL_CARD_REFUND", "MANUAL_CARD_REFUND"),
+                            ("SQUARE_REFUND", "SQUARE_REFUND"),
+                        ],
+                        max_length=20,
+                    ),
+                ),
+                (
+                    "status",
+                    models.CharField(
+                        choices=[
+                            ("PENDING", "In progress"),
+                            ("COMPLETED", "Completed"),
+                            ("FAILED", "Failed"),
+                        ],
+                        max_length=20,
+                    ),
+                ),
+                ("total_payments", models.IntegerField(default=0)),
+                ("total_refunds", models.IntegerField(default=0)),
+                ("app_fee", models.IntegerField(default=0)),
+                ("provider_fee", models.IntegerField(default=0)),
+                ("number_of_transactions", models.PositiveIntegerField(default=0)),
+                (
+                    "performance",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="daily_sales",
+                        to="productions.performance",
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name_plural": "daily sales",
+            },
+        ),
+        migrations.AddConstraint(
+            model_name="dailysales",
+            constraint=models.UniqueConstraint(
+                fields=("date", "performance", "provider_name", "status"),
+                name="unique_daily_sales",
+            ),
+        ),
+        migrations.RunPython(roll_up_transactions, migrations.RunPython.noop),
+    ]
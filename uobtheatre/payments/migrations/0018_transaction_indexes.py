@@ -0,0 +1,50 @@
+# Generated by Django 3.2.25 on 2026-10-18 21:11
+
+from django.contrib.postgres.operations import AddIndexConcurrently
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    # The indexes are created concurrently, so that transactions can still be
+    # written while they are built
+    atomic = False
+
+    dependencies = [
+        ("payments", "0017_square_webhook_event"),
+    ]
+
+    operations = [
+        AddIndexConcurrently(
+            model_name="transaction",
+            index=models.Index(
+                fields=["pay_object_type", "pay_object_id", "status"],
+                name="transaction_pay_object_idx",
+            ),
+        ),
+        AddIndexConcurrently(
+            model_name="transaction",
+            index=models.Index(
+                condition=models.Q(("status", "PENDING")),
+                fields=["pay_object_type", "pay_object_id"],
+                name="transaction_pending_idx",
+            ),
+        ),
+        AddIndexConcurrently(
+            model_name="transaction",
+            index=models.Index(
+                condition=models.Q(("provider_transaction_id__isnull", False)),
+                fields=["provider_transaction_id", "provider_name", "type"],
+                name="transaction_provider_id_idx",
+            ),
+        ),
+        AddIndexConcurrently(
+            model_name="transaction",
+            index=models.Index(
+                condition=models.Q(
+                    ("provider_fee__isnull", True), ("status", "COMPLETED")
+                ),
+                fields=["provider_name"],
+                name="transaction_pending_fee_idx",
+            ),
+        ),
+    ]
@@ -1,13 +1,19 @@
+# pylint: disable=too-many-lines
+from collections import Counter, defaultdict
 from enum import Enum
-from typing import TYPE_CHECKING, Optional
+from functools import reduce
+from operator import or_
+from typing import TYPE_CHECKING, Any, Iterable, Optional
 
 from django.contrib.contenttypes.fields import GenericForeignKey
 from django.contrib.contenttypes.models import ContentType
-from django.db import models
-from django.db.models import Q, Sum
+from django.db import models, transaction
+from django.db.models import Count, F, Q, Sum
 from django.db.models.enums import TextChoices
-from django.db.models.functions import Coalesce
+from django.db.models.functions import Coalesce, Greatest, TruncDate
 from django.db.models.query import QuerySet
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
 from django_celery_results.models import TaskResult
 
 from uobtheatre.mail.composer import MailComposer
@@ -16,11 +22,13 @@ from uobtheatre.payments.exceptions import (
     CantBeCanceledException,
     CantBeRefundedException,
 )
+from uobtheatre.payments.sync import TransactionSyncer
 from uobtheatre.payments.tasks import refund_payment
 from uobtheatre.payments.transaction_providers import (
     Cash,
     PaymentProvider,
     RefundProvider,
+    SquareAPIMixin,
     TransactionProvider,
 )
 from uobtheatre.utils.models import BaseModel, TimeStampedMixin
@@ -29,6 +37,85 @@ if TYPE_CHECKING:
     from uobtheatre.payments.payables import Payable
 
 
+def relative_expression(expression: Any, relation: str) -> Any:
+    """Copy an expression, making its field references relative to a relation.
+
+    For example, Sum("value", filter=Q(type="PAYMENT")) relative to
+    "transactions" becomes Sum("transactions__value",
+    filter=Q(transactions__type="PAYMENT")).
+
+    Args:
+        expression (Expression or Q): The expression to copy.
+        relation (str): The relation that the fields are accessed through.
+
+    Returns:
+        Expression or Q: The relative expression.
+    """
+    if isinstance(expression, F):
+        return F(f"{relation}__{expression.name}")  # type: ignore[attr-defined]
+    if isinstance(expression, Q):
+        relative_q = Q()
+        relative_q.connector = expression.connector
+        relative_q.negated = expression.negated
+        for child in expression.children:
+            if isinstance(child, Q):
+                relative_q.children.append(relative_expression(child, relation))
+            else:
+                lookup, value = child  # type: ignore[misc]
+                relative_q.children.append((f"{relation}__{lookup}", value))
+        return relative_q
+    relative = expression.copy()
+    relative.set_source_expressions(
+        [
+            relative_expression(source, relation)
+            for source in expression.get_source_expressions()
+        ]
+    )
+    return relative
+
+
+def group_sales_breakdowns(
+    queryset: QuerySet, field: str, expressions: dict["SalesBreakdown.Enums", Any]
+) -> dict:
+    """Compute sales breakdowns for each group of a queryset in a single query.
+
+    Args:
+        queryset (QuerySet): The rows to group.
+        field (str): The field (or lookup) to group the rows by.
+        expressions (dict): The expression for each breakdown to compute.
+
+    Returns:
+        dict: The sales breakdown of each group, keyed by the value of the
+            field.
+    """
+    # The breakdowns are aliased as some (e.g. app_fee) share their key with a
+    # field, which annotate doesn't allow
+    aliases = {f"breakdown_{breakdown.key}": breakdown for breakdown in expressions}
+    rows = (
+        queryset.order_by()
+        .values(field)
+        .annotate(
+            **{
+                alias: Coalesce(expressions[breakdown], 0)
+                for alias, breakdown in aliases.items()
+            }
+        )
+    )
+    return {
+        row[field]: {breakdown.key: row[alias] for alias, breakdown in aliases.items()}
+        for row in rows
+    }
+
+
+def fee_charging_provider_names() -> list[str]:
+    """The names of the providers which charge a fee for their transactions"""
+    return [
+        provider.name
+        for provider in list(TransactionProvider.__all__)  # type: ignore[call-overload]
+        if issubclass(provider, SquareAPIMixin)
+    ]
+
+
 class TransactionQuerySet(QuerySet):
     """The query set for payments"""
 
@@ -43,6 +130,33 @@ class TransactionQuerySet(QuerySet):
         }
         return self.aggregate(**annotations)
 
+    def sales_breakdowns_by(
+        self, field: str, breakdowns: Optional[list["SalesBreakdown.Enums"]] = None
+    ) -> dict:
+        """Sales breakdown of the payments grouped by the value of a field.
+
+        All of the groups are computed with a single grouped query. Groups
+        without any payments are not included.
+
+        Args:
+            field (str): The field (or lookup) to group the payments by.
+            breakdowns (list of SalesBreakdown.Enums, optional): The
+                breakdowns to compute. Defaults to all of them.
+
+        Returns:
+            dict: The sales breakdown of each group, keyed by the value of the
+                field.
+        """
+        return group_sales_breakdowns(
+            self,
+            field,
+            {
+                breakdown: breakdown.value
+                for breakdown in SalesBreakdown.Enums
+                if breakdowns is None or breakdown in breakdowns
+            },
+        )
+
     def get_sales_breakdown(self, breakdown: "SalesBreakdown.Enums"):
         # NOTE: Calling aggregate on an empty queryset gives None so the
         # Coalesce is not applied this fix works here but still an
@@ -58,13 +172,29 @@ class TransactionQuerySet(QuerySet):
     def missing_provider_fee(self):
         return self.filter(provider_fee=None)
 
-    def sync(self):
+    def pending_provider_fee(self):
+        """
+        Completed transactions which are missing their provider fee, where the
+        provider charges one (i.e. not manual payments). The fee is filled in
+        by syncing the transaction with its provider.
+        """
+        return self.missing_provider_fee().filter(
+            status=Transaction.Status.COMPLETED,
+            provider_name__in=fee_charging_provider_names(),
+        )
+
+    def sync(self, **kwargs):
         """
         Sync all (non manual) payments with their providers. Currently the only
         syncing we do is for the processing fee.
+
+        The payments are synced concurrently by a TransactionSyncer, which is
+        created with the supplied kwargs.
+
+        Returns:
+            dict: The number of payments synced, and the number which failed.
         """
-        for payment in self:
-            payment.sync_transaction_with_provider()
+        return TransactionSyncer(**kwargs).sync(self)
 
     def associated_tasks(self):
         """
@@ -163,6 +293,34 @@ class Transaction(TimeStampedMixin, BaseModel):
     # Amount charged by us to process payment
     app_fee = models.IntegerField(null=True, blank=True)
 
+    class Meta:
+        indexes = [
+            # The transactions of pay objects (e.g. a booking's transactions,
+            # or the transactions joined to bookings)
+            models.Index(
+                fields=["pay_object_type", "pay_object_id", "status"],
+                name="transaction_pay_object_idx",
+            ),
+            # The pending transactions which lock their pay objects
+            models.Index(
+                fields=["pay_object_type", "pay_object_id"],
+                condition=Q(status="PENDING"),
+                name="transaction_pending_idx",
+            ),
+            # Looking up the transaction a provider (e.g. a webhook) refers to
+            models.Index(
+                fields=["provider_transaction_id", "provider_name", "type"],
+                condition=Q(provider_transaction_id__isnull=False),
+                name="transaction_provider_id_idx",
+            ),
+            # The completed transactions whose provider fee is to be synced
+            models.Index(
+                fields=["provider_name"],
+                condition=Q(provider_fee__isnull=True, status="COMPLETED"),
+                name="transaction_pending_fee_idx",
+            ),
+        ]
+
     @property
     def is_refunded(self) -> bool:
         """
@@ -172,6 +330,18 @@ class Transaction(TimeStampedMixin, BaseModel):
         """
         return self.pay_object.is_refunded
 
+    @property
+    def is_provider_fee_pending(self) -> bool:
+        """
+        Whether the transaction is completed but is missing a provider fee
+        which can be synced from its provider.
+        """
+        return (
+            self.status == Transaction.Status.COMPLETED
+            and self.provider_fee is None
+            and self.provider_name in fee_charging_provider_names()
+        )
+
     @property
     def provider(self):
         return next(
@@ -334,9 +504,91 @@ class SalesBreakdown:
         def key(self):
             return self.name.lower()
 
-    def __init__(self, transaction_qs: TransactionQuerySet) -> None:
+        def through(self, relation: str):
+            """The expression for the breakdown of the transactions of a
+            relation, for annotating onto the related model"""
+            return relative_expression(self.value, relation)
+
+    def __init__(
+        self, transaction_qs: TransactionQuerySet, values: Optional[dict] = None
+    ) -> None:
+        """
+        Args:
+            transaction_qs (TransactionQuerySet): The transactions to break
+                down.
+            values (dict, optional): Breakdown values which have already been
+                computed, keyed by the breakdown's key. These are used rather
+                than querying the transactions.
+        """
         super().__init__()
         self.transaction_qs = transaction_qs
+        self.values = values or {}
+
+    @classmethod
+    def compute(cls, transactions: Iterable[Transaction]) -> dict:
+        """Compute the breakdown of transactions which have already been loaded.
+
+        This gives the same values as the breakdown's expressions, including
+        their treatment of missing values, without querying the database.
+
+        Args:
+            transactions (iterable of Transaction): The transactions to break
+                down.
+
+        Returns:
+            dict: The value of each breakdown, keyed by the breakdown's key.
+        """
+        transactions = list(transactions)
+
+        def is_card(transaction_instance):
+            return transaction_instance.provider_name != Cash.name
+
+        def is_type(transaction_type):
+            return (
+                lambda transaction_instance: transaction_instance.type
+                == transaction_type
+            )
+
+        def total(field, *conditions):
+            # Like Sum, this is None if there are no values to total
+            values = [
+                getattr(transaction_instance, field)
+                for transaction_instance in transactions
+                if all(condition(transaction_instance) for condition in conditions)
+                and getattr(transaction_instance, field) is not None
+            ]
+            return sum(values) if values else None
+
+        def minus(value, other):
+            return None if value is None or other is None else value - other
+
+        payment = is_type(Transaction.Type.PAYMENT)
+        refund = is_type(Transaction.Type.REFUND)
+        provider_payment_value = total("provider_fee") or 0
+        app_fee = total("app_fee") or 0
+        net_transactions = total("value")
+        net_card_transactions = total("value", is_card)
+
+        values = {
+            cls.Enums.PROVIDER_PAYMENT_VALUE: provider_payment_value,
+            cls.Enums.NET_TRANSACTIONS: net_transactions,
+            cls.Enums.NET_CARD_TRANSACTIONS: net_card_transactions,
+            cls.Enums.TOTAL_PAYMENTS: total("value", payment),
+            cls.Enums.TOTAL_CARD_PAYMENTS: total("value", is_card, payment),
+            cls.Enums.TOTAL_REFUNDS: total("value", refund),
+            cls.Enums.TOTAL_CARD_REFUNDS: total("value", is_card, refund),
+            cls.Enums.APP_FEE: app_fee,
+            cls.Enums.APP_PAYMENT_VALUE: app_fee - provider_payment_value,
+            cls.Enums.SOCIETY_TRANSFER_VALUE: minus(net_card_transactions, app_fee),
+            cls.Enums.SOCIETY_REVENUE: minus(net_transactions, app_fee),
+        }
+        return {breakdown.key: value or 0 for breakdown, value in values.items()}
+
+    def get(self, breakdown: "SalesBreakdown.Enums") -> int:
+        """The value of a breakdown, querying for it if it isn't known"""
+        if breakdown.key in self.values:
+            return self.values[breakdown.key]
+        return self.transaction_qs.get_sales_breakdown(breakdown)
 
     @property
     def total_payments(self) -> int:
@@ -345,40 +597,549 @@ class SalesBreakdown:
         - This does not include refunds.
         - This does include the square fee.
         """
-        return self.transaction_qs.get_sales_breakdown(self.Enums.TOTAL_PAYMENTS)
+        return self.get(self.Enums.TOTAL_PAYMENTS)
 
     @property
     def net_transactions(self) -> int:
         """The net amount paid by the user for this object. (This includes refunds)"""
-        return self.transaction_qs.get_sales_breakdown(self.Enums.NET_TRANSACTIONS)
+        return self.get(self.Enums.NET_TRANSACTIONS)
 
     @property
     def total_refunds(self) -> int:
         """The negative amounts paid by the user for this object. (i.e. money
         paid back to the user in the form of a refund)
         """
-        return self.transaction_qs.get_sales_breakdown(self.Enums.TOTAL_REFUNDS)
+        return self.get(self.Enums.TOTAL_REFUNDS)
+
+    @property
+    def total_card_payments(self) -> int:
+        """The positive amounts paid by the user by card for this object."""
+        return self.get(self.Enums.TOTAL_CARD_PAYMENTS)
+
+    @property
+    def total_card_refunds(self) -> int:
+        """The negative amounts paid back to the user by card for this object."""
+        return self.get(self.Enums.TOTAL_CARD_REFUNDS)
+
+    @property
+    def net_card_transactions(self) -> int:
+        """The net amount paid by the user by card for this object."""
+        return self.get(self.Enums.NET_CARD_TRANSACTIONS)
+
+    @property
+    def app_fee(self) -> int:
+        """The fee charged by us for this object."""
+        return self.get(self.Enums.APP_FEE)
 
     @property
     def provider_payment_value(self) -> int:
         """The amount taken by the payment provider in paying for this object."""
-        return self.transaction_qs.get_sales_breakdown(
-            self.Enums.PROVIDER_PAYMENT_VALUE
-        )
+        return self.get(self.Enums.PROVIDER_PAYMENT_VALUE)
 
     @property
     def app_payment_value(self) -> int:
         """The amount taken by us in paying for this object."""
-        return self.transaction_qs.get_sales_breakdown(self.Enums.APP_PAYMENT_VALUE)
+        return self.get(self.Enums.APP_PAYMENT_VALUE)
 
     @property
     def society_revenue(self) -> int:
         """The revenue for the society for selling this object."""
-        return self.transaction_qs.get_sales_breakdown(self.Enums.SOCIETY_REVENUE)
+        return self.get(self.Enums.SOCIETY_REVENUE)
 
     @property
     def society_transfer_value(self) -> int:
         """The amount of money to transfer to the society for object."""
-        return self.transaction_qs.get_sales_breakdown(
-            self.Enums.SOCIETY_TRANSFER_VALUE
+        return self.get(self.Enums.SOCIETY_TRANSFER_VALUE)
+
+
+# The fields of a transaction which affect the daily sales it's rolled up into
+DAILY_SALES_FIELDS = [
+    "pay_object_type_id",
+    "pay_object_id",
+    "created_at",
+    "provider_name",
+    "status",
+    "type",
+    "value",
+    "app_fee",
+    "provider_fee",
+]
+
+# The fields which identify a daily sales row, and the totals it holds
+DAILY_SALES_KEY = ["date", "performance_id", "provider_name", "status"]
+DAILY_SALES_TOTALS = [
+    "total_payments",
+    "total_refunds",
+    "app_fee",
+    "provider_fee",
+    "number_of_transactions",
+]
+
+
+class DailySalesQuerySet(QuerySet):
+    """Queryset for DailySales, also used as manager."""
+
+    @staticmethod
+    def breakdown_expressions() -> dict:
+        """The expression for each sales breakdown, in terms of the rollup.
+
+        These give the same values as the breakdowns' expressions over the
+        transactions that were rolled up.
+        """
+        card = ~Q(provider_name=Cash.name)
+        net = F("total_payments") + F("total_refunds")
+        provider_payment_value = Coalesce(Sum("provider_fee"), 0)
+        app_fee = Coalesce(Sum("app_fee"), 0)
+        net_transactions = Sum(net)
+        net_card_transactions = Sum(net, filter=card)
+        return {
+            SalesBreakdown.Enums.PROVIDER_PAYMENT_VALUE: provider_payment_value,
+            SalesBreakdown.Enums.NET_TRANSACTIONS: net_transactions,
+            SalesBreakdown.Enums.NET_CARD_TRANSACTIONS: net_card_transactions,
+            SalesBreakdown.Enums.TOTAL_PAYMENTS: Sum("total_payments"),
+            SalesBreakdown.Enums.TOTAL_CARD_PAYMENTS: Sum(
+                "total_payments", filter=card
+            ),
+            SalesBreakdown.Enums.TOTAL_REFUNDS: Sum("total_refunds"),
+            SalesBreakdown.Enums.TOTAL_CARD_REFUNDS: Sum("total_refunds", filter=card),
+            SalesBreakdown.Enums.APP_FEE: app_fee,
+            SalesBreakdown.Enums.APP_PAYMENT_VALUE: app_fee - provider_payment_value,
+            SalesBreakdown.Enums.SOCIETY_TRANSFER_VALUE: net_card_transactions
+            - app_fee,
+            SalesBreakdown.Enums.SOCIETY_REVENUE: net_transactions - app_fee,
+        }
+
+    def sales_breakdown(
+        self, breakdowns: Optional[list["SalesBreakdown.Enums"]] = None
+    ) -> dict:
+        """Sales breakdown of the transactions rolled up into these rows
+
+        Returns:
+            dict: The value of each breakdown, keyed by the breakdown's key.
+        """
+        totals = self.aggregate(
+            **{
+                breakdown.key: Coalesce(expression, 0)
+                for breakdown, expression in self.breakdown_expressions().items()
+                if breakdowns is None or breakdown in breakdowns
+            }
+        )
+        return {key: value or 0 for key, value in totals.items()}
+
+    def sales_breakdowns_by(
+        self, field: str, breakdowns: Optional[list["SalesBreakdown.Enums"]] = None
+    ) -> dict:
+        """Sales breakdown of the rows grouped by the value of a field.
+
+        Args:
+            field (str): The field (or lookup) to group the rows by.
+            breakdowns (list of SalesBreakdown.Enums, optional): The
+                breakdowns to compute. Defaults to all of them.
+
+        Returns:
+            dict: The sales breakdown of each group, keyed by the value of the
+                field.
+        """
+        return group_sales_breakdowns(
+            self,
+            field,
+            {
+                breakdown: expression
+                for breakdown, expression in self.breakdown_expressions().items()
+                if breakdowns is None or breakdown in breakdowns
+            },
         )
+
+    def roll_up(self, transactions: QuerySet) -> list["DailySales"]:
+        """Roll up transactions into (unsaved) DailySales rows.
+
+        Only transactions for bookings are rolled up.
+
+        Args:
+            transactions (QuerySet): The transactions to roll up.
+
+        Returns:
+            list of DailySales: A row for each day, performance, provider and
+                status of the transactions.
+        """
+        rows = (
+            transactions.filter(booking__isnull=False)
+            .order_by()
+            .values(
+                "provider_name",
+                "status",
+                rollup_date=TruncDate("created_at"),
+                rollup_performance_id=F("booking__performance_id"),
+            )
+            .annotate(
+                rollup_total_payments=Coalesce(
+                    Sum("value", filter=Q(type=Transaction.Type.PAYMENT)), 0
+                ),
+                rollup_total_refunds=Coalesce(
+                    Sum("value", filter=Q(type=Transaction.Type.REFUND)), 0
+                ),
+                rollup_app_fee=Coalesce(Sum("app_fee"), 0),
+                rollup_provider_fee=Coalesce(Sum("provider_fee"), 0),
+                rollup_number_of_transactions=Count("pk"),
+            )
+        )
+        return [
+            DailySales(
+                date=row["rollup_date"],
+                performance_id=row["rollup_performance_id"],
+                provider_name=row["provider_name"],
+                status=row["status"],
+                total_payments=row["rollup_total_payments"],
+                total_refunds=row["rollup_total_refunds"],
+                app_fee=row["rollup_app_fee"],
+                provider_fee=row["rollup_provider_fee"],
+                number_of_transactions=row["rollup_number_of_transactions"],
+            )
+            for row in rows
+        ]
+
+    def add_rows(self, rows: Iterable["DailySales"], sign: int = 1) -> None:
+        """Add the totals of (unsaved) rows onto the rollup.
+
+        The totals are added to the row with the same day, performance,
+        provider and status, which is created if there isn't one yet. Rows
+        left without any transactions are deleted.
+
+        Args:
+            rows (iterable of DailySales): The rows to add, e.g. from roll_up.
+            sign (int): 1 to add the rows, or -1 to subtract them.
+        """
+        deltas: dict = defaultdict(Counter)
+        for row in rows:
+            deltas[tuple(getattr(row, field) for field in DAILY_SALES_KEY)].update(
+                {total: sign * getattr(row, total) for total in DAILY_SALES_TOTALS}
+            )
+        deltas = {key: delta for key, delta in deltas.items() if any(delta.values())}
+        if not deltas:
+            return
+
+        def update_row(key: tuple) -> int:
+            return DailySales.objects.filter(**dict(zip(DAILY_SALES_KEY, key))).update(
+                **{
+                    total: F(total) + deltas[key][total]
+                    for total in DAILY_SALES_TOTALS
+                    if total != "number_of_transactions"
+                },
+                number_of_transactions=Greatest(
+                    F("number_of_transactions") + deltas[key]["number_of_transactions"],
+                    0,
+                ),
+            )
+
+        with transaction.atomic(savepoint=False):
+            # Rows are updated in the same order everywhere, so that
+            # concurrent updates can't deadlock
+            if missing_keys := [key for key in sorted(deltas) if not update_row(key)]:
+                # Create the rows as empty, in case another transaction
+                # creates them first, and then add to them
+                DailySales.objects.bulk_create(
+                    [
+                        DailySales(**dict(zip(DAILY_SALES_KEY, key)))
+                        for key in missing_keys
+                    ],
+                    ignore_conflicts=True,
+                )
+                for key in missing_keys:
+                    update_row(key)
+
+            if emptied_keys := [
+                key
+                for key, delta in deltas.items()
+                if delta["number_of_transactions"] < 0
+            ]:
+                DailySales.objects.filter(
+                    reduce(
+                        or_,
+                        (Q(**dict(zip(DAILY_SALES_KEY, key))) for key in emptied_keys),
+                    ),
+                    number_of_transactions=0,
+                ).delete()
+
+    def update_for_transactions(
+        self, transactions: Iterable[Transaction], deleted: bool = False
+    ) -> None:
+        """Move changed transactions in the rollup.
+
+        Each transaction is removed from the row it was rolled up into, as it
+        was loaded, and added to the row it's now rolled up into. This must
+        therefore be called before the transactions' loaded values are
+        snapshotted again, e.g. from a post_save signal.
+
+        Args:
+            transactions (iterable of Transaction): The transactions which
+                have been created, changed or deleted.
+            deleted (bool): Whether the transactions have been deleted, in
+                which case they're only removed from the rollup.
+        """
+        from uobtheatre.bookings.models import Booking
+
+        transactions = list(transactions)
+        if not transactions:
+            return
+
+        old_values = []
+        new_values = []
+        for transaction_instance in transactions:
+            current_values = {
+                field: getattr(transaction_instance, field)
+                for field in DAILY_SALES_FIELDS
+            }
+            loaded_values = transaction_instance.get_loaded_values(*DAILY_SALES_FIELDS)
+            if deleted:
+                old_values.append(loaded_values or current_values)
+                continue
+            if loaded_values:
+                old_values.append(loaded_values)
+            new_values.append(current_values)
+
+        # Only transactions for bookings are rolled up
+        booking_type = ContentType.objects.get_for_model(Booking)
+        old_values = [
+            values
+            for values in old_values
+            if values["pay_object_type_id"] == booking_type.pk
+        ]
+        new_values = [
+            values
+            for values in new_values
+            if values["pay_object_type_id"] == booking_type.pk
+        ]
+
+        # Find the performance of each booking. Bookings which have already
+        # been loaded don't need looking up.
+        performance_ids = {}
+        for transaction_instance in transactions:
+            booking = Transaction.pay_object.get_cached_value(  # type: ignore
+                transaction_instance, None
+            )
+            if isinstance(booking, Booking) and booking.pk is not None:
+                performance_ids[booking.pk] = booking.performance_id
+        if booking_ids := {
+            values["pay_object_id"] for values in old_values + new_values
+        } - set(performance_ids):
+            performance_ids.update(
+                Booking.objects.filter(pk__in=booking_ids).values_list(
+                    "pk", "performance_id"
+                )
+            )
+
+        self.add_rows(
+            [
+                self._row_for_values(
+                    values, performance_ids[values["pay_object_id"]], -1
+                )
+                for values in old_values
+                if values["pay_object_id"] in performance_ids
+            ]
+            + [
+                self._row_for_values(values, performance_ids[values["pay_object_id"]])
+                for values in new_values
+                if values["pay_object_id"] in performance_ids
+            ]
+        )
+
+    @staticmethod
+    def _row_for_values(
+        values: dict, performance_id: int, sign: int = 1
+    ) -> "DailySales":
+        """The (unsaved) row a transaction, with the given values, is rolled
+        up into on its own"""
+        # The value may not have been parsed yet, if it was set as a string
+        created_at = values["created_at"]
+        if isinstance(created_at, str):
+            created_at = parse_datetime(created_at)
+        if timezone.is_naive(created_at):
+            created_at = timezone.make_aware(created_at)
+        return DailySales(
+            date=timezone.localdate(created_at),
+            performance_id=performance_id,
+            provider_name=values["provider_name"],
+            status=values["status"],
+            total_payments=(
+                sign * values["value"]
+                if values["type"] == Transaction.Type.PAYMENT
+                else 0
+            ),
+            total_refunds=(
+                sign * values["value"]
+                if values["type"] == Transaction.Type.REFUND
+                else 0
+            ),
+            app_fee=sign * (values["app_fee"] or 0),
+            provider_fee=sign * (values["provider_fee"] or 0),
+            number_of_transactions=sign,
+        )
+
+    def rebuild(self) -> int:
+        """Rebuild the whole rollup from the transactions.
+
+        Returns:
+            int: The number of rows in the rebuilt rollup.
+        """
+        with transaction.atomic():
+            DailySales.objects.all().delete()
+            return len(
+                DailySales.objects.bulk_create(
+                    self.roll_up(Transaction.objects.all()), batch_size=1000
+                )
+            )
+
+
+DailySalesManager = models.Manager.from_queryset(DailySalesQuerySet)
+
+
+class DailySales(models.Model):
+    """A rollup of the transactions for a performance on a day.
+
+    There is a row for each day, performance, provider and transaction
+    status, with the totals of those transactions. This lets the sales of
+    performances and productions be computed without scanning their
+    transactions. The rows are maintained from the transaction signals, and
+    can be rebuilt with the rebuild_daily_sales management command.
+    """
+
+    date = models.DateField()
+    performance = models.ForeignKey(
+        "productions.Performance", on_delete=models.CASCADE, related_name="daily_sales"
+    )
+    provider_name = models.CharField(
+        max_length=20, choices=transaction_providers.TransactionProvider.choices  # type: ignore
+    )
+    status = models.CharField(max_length=20, choices=Transaction.Status.choices)
+
+    # The totals of the value of the payments and of the refunds. Refunds are
+    # negative.
+    total_payments = models.IntegerField(default=0)
+    total_refunds = models.IntegerField(default=0)
+    app_fee = models.IntegerField(default=0)
+    provider_fee = models.IntegerField(default=0)
+    number_of_transactions = models.PositiveIntegerField(default=0)
+
+    objects = DailySalesManager()
+
+    class Meta:
+        verbose_name_plural = "daily sales"
+        constraints = [
+            models.UniqueConstraint(
+                fields=["date", "performance", "provider_name", "status"],
+                name="unique_daily_sales",
+            )
+        ]
+
+
+class SquareWebhookEventQuerySet(QuerySet):
+    """The query set for Square webhook events"""
+
+    def pending(self):
+        """Events which have not been processed yet"""
+        return self.filter(processed_at__isnull=True)
+
+    def receive(self, payload: dict, provider_transaction_id: str) -> bool:
+        """Store a webhook event, and queue the events for its transaction to
+        be processed
+
+        Square may send an event more than once, so events are deduplicated
+        by their event ID.
+
+        Args:
+            payload (dict): The body of the webhook
+            provider_transaction_id (str): The provider ID of the transaction
+                the event is for
+
+        Returns:
+            bool: Whether the event was new (and not a duplicate)
+        """
+        from uobtheatre.payments.tasks import process_square_webhook_events
+
+        _, created = self.get_or_create(
+            event_id=payload["event_id"],
+            defaults={
+                "type": payload["type"],
+                "provider_transaction_id": provider_transaction_id,
+                "payload": payload,
+                "occurred_at": parse_datetime(payload.get("created_at") or "")
+                or timezone.now(),
+            },
+        )
+        if created:
+            transaction.on_commit(
+                lambda: process_square_webhook_events.delay(provider_transaction_id)
+            )
+        return created
+
+    def process(self, provider_transaction_id: str) -> int:
+        """Process the pending events for a transaction
+
+        Each event holds the full state of the Square object it is for, so
+        only the latest of the pending events is applied, and the others are
+        marked as processed with it. It isn't applied at all if it's no newer
+        than an event which has already been processed, as Square may deliver
+        events late. The events are locked while they are processed, so the
+        events for a transaction are processed in order.
+
+        Args:
+            provider_transaction_id (str): The provider ID of the transaction
+
+        Returns:
+            int: The number of events processed
+
+        Raises:
+            Transaction.DoesNotExist: If the transaction does not exist (yet).
+                The events are left pending.
+        """
+        from uobtheatre.payments.square_webhooks import SquareWebhooks
+
+        with transaction.atomic():
+            events = list(
+                self.pending()
+                .filter(provider_transaction_id=provider_transaction_id)
+                .select_for_update()
+                .order_by("occurred_at", "created_at")
+            )
+            if not events:
+                return 0
+
+            latest_processed = (
+                self.filter(
+                    provider_transaction_id=provider_transaction_id,
+                    processed_at__isnull=False,
+                )
+                .order_by("-occurred_at")
+                .values_list("occurred_at", flat=True)
+                .first()
+            )
+            if latest_processed is None or events[-1].occurred_at > latest_processed:
+                SquareWebhooks.process_event(events[-1].payload)
+
+            now = timezone.now()
+            self.filter(pk__in=[event.pk for event in events]).update(
+                processed_at=now, updated_at=now
+            )
+        return len(events)
+
+
+SquareWebhookEventManager = models.Manager.from_queryset(SquareWebhookEventQuerySet)
+
+
+class SquareWebhookEvent(TimeStampedMixin, BaseModel):
+    """A webhook event sent by Square.
+
+    Events are stored when they are received, and processed in the background,
+    so that Square gets its response without waiting for the transaction to
+    be synced (and e.g. its booking to be completed).
+    """
+
+    event_id = models.CharField(max_length=255, unique=True)
+    type = models.CharField(max_length=255)
+    provider_transaction_id = models.CharField(max_length=128, db_index=True)
+    payload = models.JSONField()
+    # When Square created the event, which is used to order the events
+    occurred_at = models.DateTimeField()
+    processed_at = models.DateTimeField(null=True, blank=True)
+
+    objects = SquareWebhookEventManager()
@@ -3,9 +3,20 @@ import math
 from typing import TYPE_CHECKING, Optional
 
 from django.contrib.contenttypes.fields import GenericRelation
+from django.contrib.contenttypes.models import ContentType
 from django.core.mail import mail_admins
 from django.db import models
-from django.db.models import Count, Q, Sum
+from django.db.models import (
+    BooleanField,
+    Count,
+    Exists,
+    ExpressionWrapper,
+    IntegerField,
+    OuterRef,
+    Q,
+    Subquery,
+    Sum,
+)
 from django.db.models.functions.comparison import Coalesce
 from django.db.models.query import QuerySet
 from django_celery_results.models import TaskResult
@@ -19,7 +30,7 @@ from uobtheatre.payments.models import SalesBreakdown, Transaction
 from uobtheatre.payments.tasks import refund_payable
 from uobtheatre.users.models import User
 from uobtheatre.utils.filters import filter_passes_on_model
-from uobtheatre.utils.models import BaseModel
+from uobtheatre.utils.models import BaseModel, count_subquery
 
 if TYPE_CHECKING:
     from uobtheatre.payments.transaction_providers import PaymentProvider
@@ -34,6 +45,59 @@ class PayableQuerySet(QuerySet):
     def annotate_transaction_value(self) -> QuerySet:
         return self.annotate(transaction_totals=Coalesce(Sum("transactions__value"), 0))
 
+    def annotate_sales_breakdown(
+        self, breakdowns: Optional[list[SalesBreakdown.Enums]] = None
+    ) -> QuerySet:
+        """Annotate the sales breakdown of each payable's transactions.
+
+        Each breakdown is annotated under its key, using conditional
+        aggregates over the transactions, so the breakdowns of any number of
+        payables are computed with a single query. The payables'
+        sales_breakdown then uses these values.
+
+        Args:
+            breakdowns (list of SalesBreakdown.Enums, optional): The
+                breakdowns to annotate. Defaults to all of them.
+        """
+        return self.annotate(
+            **{
+                breakdown.key: Coalesce(breakdown.through("transactions"), 0)
+                for breakdown in SalesBreakdown.Enums
+                if breakdowns is None or breakdown in breakdowns
+            }
+        )
+
+    def annotate_refund_eligibility(self) -> QuerySet:
+        """Annotate what decides whether each payable can be refunded.
+
+        The number of payments, and whether the payable is locked or already
+        refunded, are annotated with subqueries over the transactions. This
+        lets the can_be_refunded, is_locked and is_refunded of any number of
+        payables be found with a single query.
+        """
+        transactions = Transaction.objects.filter(
+            pay_object_type=ContentType.objects.get_for_model(self.model),
+            pay_object_id=OuterRef("pk"),
+        )
+        return self.annotate(
+            payment_count=count_subquery(transactions.payments()),
+            locked=Exists(transactions.filter(status=Transaction.Status.PENDING)),
+            refund_transaction_count=count_subquery(transactions),
+            refund_transaction_totals=Subquery(
+                transactions.order_by()
+                .values("pay_object_id")
+                .annotate(total=Sum("value"))
+                .values("total"),
+                output_field=IntegerField(),
+            ),
+        ).annotate(
+            refunded=ExpressionWrapper(
+                Q(refund_transaction_count__gt=1, refund_transaction_totals=0)
+                & ~Q(locked=True),
+                output_field=BooleanField(),
+            )
+        )
+
     def locked(self) -> QuerySet:
         """A payable is locked if it has any pending transactions"""
         return self.filter(transactions__status=Transaction.Status.PENDING)
@@ -64,6 +128,7 @@ class Payable(BaseModel):  # type: ignore
         Transaction,
         object_id_field="pay_object_id",
         content_type_field="pay_object_type",
+        related_query_name="%(class)s",
     )
 
     class Status(models.TextChoices):
@@ -102,12 +167,17 @@ class Payable(BaseModel):  # type: ignore
 
     @property
     def is_refunded(self) -> bool:
+        if "refunded" in self.__dict__:
+            # Annotated by annotate_refund_eligibility
+            return self.__dict__["refunded"]
         return not self.is_locked and filter_passes_on_model(
             self, lambda qs: qs.refunded()  # type: ignore
         )
 
     @property
     def is_locked(self) -> bool:
+        if "locked" in self.__dict__:
+            return self.__dict__["locked"]
         return filter_passes_on_model(self, lambda qs: qs.locked())  # type: ignore
 
     @property
@@ -120,7 +190,10 @@ class Payable(BaseModel):  # type: ignore
             return CantBeRefundedException(
                 f"{self.__class__.__name__} ({self}) can't be refunded due to it's status ({self.status})"
             )
-        if self.transactions.payments().count() == 0:  # type: ignore
+        payment_count = self.__dict__.get("payment_count")
+        if payment_count is None:
+            payment_count = self.transactions.payments().count()  # type: ignore
+        if payment_count == 0:
             return CantBeRefundedException(
                 f"{self.__class__.__name__} ({self}) can't be refunded because it has no payments"
             )
@@ -244,7 +317,23 @@ class Payable(BaseModel):  # type: ignore
 
     @property
     def sales_breakdown(self) -> SalesBreakdown:
-        return SalesBreakdown(self.transactions)  # type: ignore
+        """The sales breakdown of the payable's transactions.
+
+        Breakdowns annotated by annotate_sales_breakdown are used if there are
+        any. Otherwise, if the transactions have been prefetched, the
+        breakdown is computed from them. Only if neither is available are the
+        transactions queried.
+        """
+        values = {
+            breakdown.key: self.__dict__[breakdown.key]
+            for breakdown in SalesBreakdown.Enums
+            if breakdown.key in self.__dict__
+        }
+        if not values and "transactions" in getattr(
+            self, "_prefetched_objects_cache", {}
+        ):
+            values = SalesBreakdown.compute(self.transactions.all())  # type: ignore
+        return SalesBreakdown(self.transactions, values)  # type: ignore
 
     @property
     def associated_tasks(self):
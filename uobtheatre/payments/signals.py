@@ -1,8 +1,13 @@
-from django.db.models.signals import post_save, pre_save
+from django.contrib.contenttypes.models import ContentType
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save, pre_save
 from django.dispatch import receiver
 
-from uobtheatre.payments.models import Transaction
+from uobtheatre.bookings.models import Booking
+from uobtheatre.bookings.signals import deleting_bookings
+from uobtheatre.payments.models import DAILY_SALES_FIELDS, DailySales, Transaction
 from uobtheatre.payments.payables import Payable
+from uobtheatre.payments.tasks import sync_provider_fees
 
 
 @receiver(pre_save, sender=Transaction)
@@ -15,22 +20,44 @@ def post_transaction_save(instance: Transaction, **_):
     post_transaction_save_callback(instance)
 
 
+@receiver(post_delete, sender=Transaction)
+def post_transaction_delete(instance: Transaction, **_):
+    """Remove the transaction from the daily sales it was rolled up into"""
+    if (
+        instance.pay_object_type_id == ContentType.objects.get_for_model(Booking).pk
+        and instance.pay_object_id in deleting_bookings.get()
+    ):
+        # The transactions of a booking being deleted have already been
+        # removed, all at once. Those deleted after the booking are skipped
+        # too, as their booking can no longer be found.
+        return
+    DailySales.objects.update_for_transactions([instance], deleted=True)
+
+
+# The fields of a transaction which affect whether its pay object is refunded
+REFUNDED_FIELDS = ["pay_object_type_id", "pay_object_id", "status", "type", "value"]
+
+
 def pre_transaction_save_callback(transaction_instance: Transaction):
     """Pre save payment actions"""
-    old_instance = (
-        Transaction.objects.get(pk=transaction_instance.id)
-        if transaction_instance.id
-        and not transaction_instance._state.adding  # pylint: disable=protected-access
-        else None
+    # Find the changes while the old values can still be fetched, for an
+    # instance which wasn't loaded from the database
+    status_changed = "status" in transaction_instance.changed_fields(
+        *DAILY_SALES_FIELDS
     )
 
-    if not old_instance:
-        return
+    if transaction_instance.is_provider_fee_pending and status_changed:
+        # This transaction has now been completed. Sync its fee once saved.
+        transaction.on_commit(
+            lambda: sync_provider_fees.delay([transaction_instance.pk])
+        )
 
+    old_status = transaction_instance.get_loaded_values("status").get("status")
     if (
         transaction_instance.type == Transaction.Type.REFUND
         and transaction_instance.status == Transaction.Status.COMPLETED
-        and not old_instance.status == Transaction.Status.COMPLETED
+        and old_status
+        and not old_status == Transaction.Status.COMPLETED
     ):
         # This refund transaction has now been completed. Notify the payment owner
         transaction_instance.notify_user()
@@ -38,9 +65,15 @@ def pre_transaction_save_callback(transaction_instance: Transaction):
 
 def post_transaction_save_callback(transaction_instance: Transaction):
     """Post save payment actions"""
+    # Move the transaction from the daily sales row it was rolled up into, to
+    # the one it's now rolled up into
+    if transaction_instance.has_changed(*DAILY_SALES_FIELDS):
+        DailySales.objects.update_for_transactions([transaction_instance])
+
     # If the object is refunded and not locked, set it to cancelled
     if (
-        not transaction_instance.Status == Payable.Status.CANCELLED
+        transaction_instance.has_changed(*REFUNDED_FIELDS)
+        and not transaction_instance.pay_object.status == Payable.Status.CANCELLED
         and not transaction_instance.pay_object.is_locked
         and transaction_instance.pay_object.is_refunded
     ):
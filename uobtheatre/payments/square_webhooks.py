@@ -6,7 +6,7 @@ from django.conf import settings
 from rest_framework.response import Response
 from rest_framework.views import APIView
 
-from uobtheatre.payments.models import Transaction
+from uobtheatre.payments.models import SquareWebhookEvent, Transaction
 from uobtheatre.payments.transaction_providers import SquarePOS
 from uobtheatre.utils.utils import deep_get
 
@@ -72,15 +72,35 @@ class SquareWebhooks(APIView):
 
         return None
 
-    def post(self, request, **_):
-        """
-        Endpoint for square webhooks
+    @classmethod
+    def get_provider_transaction_id(cls, request_data: dict) -> str | None:
+        """Returns the provider ID of the transaction a webhook is for, or None
+        if the webhook is not one which is handled"""
+        square_object = deep_get(request_data, "data.object") or {}
+        if request_data.get("type") == "terminal.checkout.updated":
+            return deep_get(square_object, "checkout.id")
+        if request_data.get("type") == "payment.updated":
+            # If this is a terminal checkout payment update, the payment is
+            # synced through its checkout
+            return deep_get(square_object, "payment.terminal_checkout_id") or deep_get(
+                square_object, "payment.id"
+            )
+        if request_data.get("type") == "refund.updated":
+            return deep_get(request_data, "data.id")
+        return None
+
+    @classmethod
+    def process_event(cls, request_data: dict):
         """
-        signature = request.META.get("HTTP_X_SQUARE_SIGNATURE", "")
-        if not self.is_valid_callback(request.data, signature):
-            return Response("Invalid signature", status=400)
+        Sync the transaction a webhook is for
+
+        Args:
+            request_data (dict): The body of the webhook
 
-        request_data = request.data
+        Raises:
+            Transaction.DoesNotExist: If the transaction is unknown, and the
+                webhook is for a (not canceled) object at our location
+        """
         try:
             if request_data["type"] == "terminal.checkout.updated":
                 # This is a terminal checkout
@@ -97,7 +117,7 @@ class SquareWebhooks(APIView):
                         == "CANCELED"
                     ):
                         # If we can't find the transaction, and square is telling us it has been cancelled, we don't mind
-                        return Response(status=202)
+                        return
                     raise exc
 
             elif request_data["type"] == "payment.updated":
@@ -125,16 +145,28 @@ class SquareWebhooks(APIView):
                 ).sync_transaction_with_provider(
                     request_data["data"]["object"]["refund"]
                 )
-            else:
-                return Response(status=202)
         except Transaction.DoesNotExist:
             # Check for the correct location
             if (
-                not self.get_object_location_id(request_data["data"]["object"])
+                cls.get_object_location_id(request_data["data"]["object"])
                 == settings.SQUARE_SETTINGS["SQUARE_LOCATION"]
             ):
-                return Response(status=202)
+                raise
+
+    def post(self, request, **_):
+        """
+        Endpoint for square webhooks
+
+        The event is stored and processed in the background, so that Square
+        gets its response straight away.
+        """
+        signature = request.META.get("HTTP_X_SQUARE_SIGNATURE", "")
+        if not self.is_valid_callback(request.data, signature):
+            return Response("Invalid signature", status=400)
 
-            return Response("Unknown Transaction", status=404)
+        provider_transaction_id = self.get_provider_transaction_id(request.data)
+        if not provider_transaction_id:
+            return Response(status=202)
 
+        SquareWebhookEvent.objects.receive(request.data, provider_transaction_id)
         return Response(status=200)
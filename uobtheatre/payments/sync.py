@@ -0,0 +1,179 @@
+import threading
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import TYPE_CHECKING, Any, Callable, Dict, Hashable, Iterable, Optional
+
+from celery.utils.log import get_task_logger
+from django.conf import settings
+from django.utils import timezone
+from sentry_sdk import capture_exception
+
+from uobtheatre.payments import models as payment_models
+from uobtheatre.utils.exceptions import SquareException
+
+if TYPE_CHECKING:
+    from uobtheatre.payments.models import Transaction
+
+logger = get_task_logger(__name__)
+
+
+class RateLimiter:
+    """Limits the rate of requests made across all of the threads using it"""
+
+    def __init__(self, requests_per_second: Optional[float]):
+        self.interval = 1 / requests_per_second if requests_per_second else 0
+        self.next_request_at = 0.0
+        self.lock = threading.Lock()
+
+    def wait(self):
+        """Wait until the next request can be made"""
+        with self.lock:
+            now = time.monotonic()
+            wait_for = self.next_request_at - now
+            self.next_request_at = max(now, self.next_request_at) + self.interval
+        if wait_for > 0:
+            time.sleep(wait_for)
+
+
+def is_retryable(exception: Exception) -> bool:
+    """Whether a failed provider request may succeed if it is retried
+
+    Requests which were rate limited, failed with a server error or failed to
+    connect are retried. Others (e.g. a payment that doesn't exist) are not.
+    """
+    if isinstance(exception, SquareException):
+        return exception.code == 429 or (exception.code or 0) >= 500
+    return isinstance(exception, (ConnectionError, TimeoutError))
+
+
+class TransactionSyncer:
+    """Syncs batches of transactions with their providers.
+
+    Requests to the providers are made concurrently across a bounded thread
+    pool, limited to a number of requests per second, and retried with
+    exponential backoff. Transactions whose only change is their provider fee
+    are then saved with a single bulk update. Transactions whose status has
+    changed are saved individually, so that their signals and completion
+    actions still run.
+    """
+
+    def __init__(
+        self,
+        max_workers: Optional[int] = None,
+        requests_per_second: Optional[float] = None,
+        max_retries: Optional[int] = None,
+        backoff: Optional[float] = None,
+    ):
+        self.max_workers = max_workers or settings.TRANSACTION_SYNC_MAX_WORKERS
+        self.rate_limiter = RateLimiter(
+            requests_per_second or settings.TRANSACTION_SYNC_REQUESTS_PER_SECOND
+        )
+        self.max_retries = (
+            max_retries
+            if max_retries is not None
+            else settings.TRANSACTION_SYNC_MAX_RETRIES
+        )
+        self.backoff = (
+            backoff if backoff is not None else settings.TRANSACTION_SYNC_BACKOFF
+        )
+        self.failed = 0
+
+    def request(self, function: Callable, *args) -> Any:
+        """Make a rate limited request to a provider, retrying if it fails
+
+        Args:
+            function (callable): The function which makes the request.
+            *args: The arguments for the function.
+
+        Returns:
+            Any: The return value of the function.
+        """
+        for attempt in range(self.max_retries + 1):
+            self.rate_limiter.wait()
+            try:
+                return function(*args)
+            except Exception as exc:  # pylint: disable=broad-except
+                if attempt == self.max_retries or not is_retryable(exc):
+                    raise
+                time.sleep(self.backoff * 2**attempt)
+        return None  # pragma: no cover
+
+    def map(self, function: Callable, items: Iterable[Hashable]) -> Dict[Any, Any]:
+        """Make a request for each of the items concurrently
+
+        Args:
+            function (callable): The function which makes the request for an
+                item.
+            items (iterable): The items to make requests for.
+
+        Returns:
+            dict: The result of the request for each item. Items whose
+                request failed are reported and omitted.
+        """
+        results = {}
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            futures = {
+                executor.submit(self.request, function, item): item for item in items
+            }
+            for future in as_completed(futures):
+                try:
+                    results[futures[future]] = future.result()
+                except Exception as exc:  # pylint: disable=broad-except
+                    logger.warning("Failed to sync %s: %s", futures[future], exc)
+                    capture_exception(exc)
+                    self.failed += 1
+        return results
+
+    def sync(self, transactions: Iterable["Transaction"]) -> Dict[str, int]:
+        """Sync the transactions with their providers
+
+        Args:
+            transactions (iterable of Transaction): The transactions to sync.
+
+        Returns:
+            dict: The number of transactions synced, and the number of
+                requests or updates which failed.
+        """
+        transactions_by_provider = defaultdict(list)
+        for transaction in transactions:
+            transactions_by_provider[transaction.provider].append(transaction)
+
+        sync_data = {}
+        for provider, provider_transactions in transactions_by_provider.items():
+            sync_data.update(provider.fetch_sync_data(provider_transactions, self))
+
+        synced = 0
+        fee_updates = []
+        for transaction, data in sync_data.items():
+            status, provider_fee = transaction.provider.parse_sync_data(data)
+            if status == transaction.status:
+                if (
+                    provider_fee is not None
+                    and provider_fee != transaction.provider_fee
+                ):
+                    transaction.provider_fee = provider_fee
+                    fee_updates.append(transaction)
+                synced += 1
+                continue
+
+            try:
+                transaction.sync_transaction_with_provider(data)
+                synced += 1
+            except Exception as exc:  # pylint: disable=broad-except
+                capture_exception(exc)
+                self.failed += 1
+
+        # bulk_update doesn't set auto_now fields, so updated_at is set here
+        # for the change to be seen by anything checking for changes
+        updated_at = timezone.now()
+        for transaction in fee_updates:
+            transaction.updated_at = updated_at
+        payment_models.Transaction.objects.bulk_update(
+            fee_updates, ["provider_fee", "updated_at"]
+        )
+        # bulk_update doesn't send the signals which maintain the daily sales
+        payment_models.DailySales.objects.update_for_transactions(fee_updates)
+        for transaction in fee_updates:
+            transaction.snapshot_loaded_values(["provider_fee", "updated_at"])
+        return {"synced": synced, "failed": self.failed}
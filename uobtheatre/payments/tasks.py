@@ -1,13 +1,19 @@
 import abc
-from typing import Union
+from datetime import timedelta
+from typing import Dict, List, Optional, Union
 from uuid import UUID
 
+from celery.utils.log import get_task_logger
 from django.contrib.contenttypes.models import ContentType
+from django.core.exceptions import ObjectDoesNotExist
+from django.utils import timezone
 
 from config.celery import app
 from uobtheatre.payments.exceptions import CantBeRefundedException
 from uobtheatre.utils.tasks import BaseTask
 
+logger = get_task_logger(__name__)
+
 
 class RefundTask(BaseTask, abc.ABC):
     """Base task for tasks that refund things"""
@@ -50,3 +56,86 @@ def refund_payable(payable_id: int, payable_content_type_id: int, authorizing_us
 
     authorizing_user = User.objects.get(pk=authorizing_user_id)
     payable.refund(authorizing_user, send_admin_email=False)
+
+
+@app.task(base=BaseTask)
+def sync_provider_fees(transaction_pks: Optional[List[int]] = None) -> Dict[str, int]:
+    """Sync transactions whose provider fee is pending with their provider
+
+    This is run periodically, and when a transaction is completed, so that
+    reports can use the stored fees rather than syncing transactions
+    themselves. A transaction which fails to sync is reported and left to be
+    retried on the next run.
+
+    Args:
+        transaction_pks (list[int], optional): The transactions to sync. If
+            not supplied, all transactions with a pending fee are synced.
+
+    Returns:
+        dict: The number of transactions synced, and the number which failed.
+    """
+    from uobtheatre.payments.models import Transaction
+
+    transactions = Transaction.objects.pending_provider_fee()
+    if transaction_pks is not None:
+        transactions = transactions.filter(pk__in=transaction_pks)
+
+    result = transactions.sync()
+    logger.info(
+        "Synced %s provider fees (%s failed)", result["synced"], result["failed"]
+    )
+    return result
+
+
+@app.task(
+    base=BaseTask,
+    autoretry_for=(ObjectDoesNotExist,),
+    retry_backoff=60,
+    max_retries=5,
+)
+def process_square_webhook_events(provider_transaction_id: str) -> int:
+    """Process the pending Square webhook events for a transaction
+
+    If the transaction doesn't exist yet (e.g. the webhook arrived before the
+    payment was saved), the task is retried with an increasing delay.
+
+    Args:
+        provider_transaction_id (str): The provider ID of the transaction
+
+    Returns:
+        int: The number of events processed
+    """
+    from uobtheatre.payments.models import SquareWebhookEvent
+
+    return SquareWebhookEvent.objects.process(provider_transaction_id)
+
+
+@app.task(base=BaseTask)
+def process_pending_square_webhook_events() -> int:
+    """Queue the Square webhook events which are still pending to be processed
+
+    This picks up events whose processing task was lost or ran out of
+    retries. Events received more than a day ago are left alone.
+
+    Returns:
+        int: The number of transactions whose events were queued
+    """
+    from uobtheatre.payments.models import SquareWebhookEvent
+
+    now = timezone.now()
+    provider_transaction_ids = set(
+        SquareWebhookEvent.objects.pending()
+        .filter(
+            created_at__lt=now - timedelta(minutes=5),
+            created_at__gte=now - timedelta(days=1),
+        )
+        .values_list("provider_transaction_id", flat=True)
+    )
+    for provider_transaction_id in provider_transaction_ids:
+        process_square_webhook_events.delay(provider_transaction_id)
+
+    logger.info(
+        "Queued the pending webhook events of %s transactions",
+        len(provider_transaction_ids),
+    )
+    return len(provider_transaction_ids)
@@ -1,3 +1,6 @@
+import threading
+import time
+from types import SimpleNamespace
 from unittest.mock import MagicMock
 
 import factory
@@ -48,6 +51,71 @@ class MockApiResponse:
         return self.success
 
 
+class FakeSquareClient:  # pylint: disable=too-many-instance-attributes
+    """
+    A local stand-in for the Square client, which serves payments, refunds and
+    terminal checkouts from memory.
+
+    Requests for an id in `failures` fail with each of its status codes in
+    turn, before succeeding. Every request is recorded, along with the maximum
+    number of requests which were in flight at once.
+    """
+
+    def __init__(  # pylint: disable=too-many-arguments,too-many-positional-arguments
+        self,
+        payments=None,
+        refunds=None,
+        checkouts=None,
+        failures=None,
+        delay=0,
+    ):
+        self.objects = {
+            "payment": payments or {},
+            "refund": refunds or {},
+            "checkout": checkouts or {},
+        }
+        self.failures = {key: list(codes) for key, codes in (failures or {}).items()}
+        self.delay = delay
+        self.requests = []
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.lock = threading.Lock()
+
+        self.payments = SimpleNamespace(
+            get_payment=lambda object_id: self.get("payment", object_id)
+        )
+        self.refunds = SimpleNamespace(
+            get_payment_refund=lambda object_id: self.get("refund", object_id)
+        )
+        self.terminal = SimpleNamespace(
+            get_terminal_checkout=lambda object_id: self.get("checkout", object_id)
+        )
+
+    def get(self, object_type, object_id):
+        """Respond to a request for a square object"""
+        with self.lock:
+            self.requests.append(object_id)
+            self.in_flight += 1
+            self.max_in_flight = max(self.max_in_flight, self.in_flight)
+            failures = self.failures.get(object_id)
+            failure_code = failures.pop(0) if failures else None
+
+        if self.delay:
+            time.sleep(self.delay)
+        with self.lock:
+            self.in_flight -= 1
+
+        if failure_code:
+            return MockApiResponse(status_code=failure_code)
+        if object_id not in self.objects[object_type]:
+            return MockApiResponse(status_code=404, reason_phrase="Not found")
+        return MockApiResponse(
+            status_code=200,
+            success=True,
+            body={object_type: self.objects[object_type][object_id]},
+        )
+
+
 def mock_payment_method(
     name="payment_method",
     is_refundable: bool = True,
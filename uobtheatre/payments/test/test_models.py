@@ -1,14 +1,19 @@
+from datetime import date, datetime, timedelta
 from unittest import mock
 from unittest.mock import MagicMock, PropertyMock, patch
 
 import pytest
+from django.db import connection
+from django.utils import timezone
 from pytest_django.asserts import assertQuerysetEqual
 
+from uobtheatre.bookings.models import Booking
+from uobtheatre.bookings.test.factories import BookingFactory, TicketFactory
 from uobtheatre.payments.exceptions import (
     CantBeCanceledException,
     CantBeRefundedException,
 )
-from uobtheatre.payments.models import Transaction
+from uobtheatre.payments.models import DailySales, SalesBreakdown, Transaction
 from uobtheatre.payments.tasks import refund_payment
 from uobtheatre.payments.test.factories import (
     TransactionFactory,
@@ -21,6 +26,7 @@ from uobtheatre.payments.transaction_providers import (
     SquarePOS,
     SquareRefund,
 )
+from uobtheatre.productions.test.factories import PerformanceFactory, ProductionFactory
 from uobtheatre.utils.exceptions import PaymentException
 from uobtheatre.utils.test.factories import TaskResultFactory
 
@@ -68,6 +74,268 @@ def test_transaction_type_filters():
     assertQuerysetEqual(Transaction.objects.refunds(), [refund_1])
 
 
+@pytest.mark.django_db
+def test_sales_breakdowns_by(django_assert_num_queries):
+    production_1, production_2, production_3 = ProductionFactory.create_batch(3)
+    booking_1 = BookingFactory(performance__production=production_1)
+    booking_2 = BookingFactory(performance__production=production_2)
+    BookingFactory(performance__production=production_3)
+
+    TransactionFactory(pay_object=booking_1, value=600, provider_fee=4, app_fee=200)
+    TransactionFactory(
+        pay_object=booking_1,
+        value=-600,
+        provider_fee=-4,
+        app_fee=-200,
+        type=Transaction.Type.REFUND,
+    )
+    TransactionFactory(pay_object=booking_1, value=200, provider_name=Cash.name)
+    TransactionFactory(pay_object=booking_2, value=400, provider_fee=10, app_fee=150)
+
+    with django_assert_num_queries(1):
+        sales_breakdowns = Transaction.objects.sales_breakdowns_by(
+            "booking__performance__production"
+        )
+
+    assert sales_breakdowns == {
+        production_1.id: production_1.sales_breakdown(),
+        production_2.id: production_2.sales_breakdown(),
+    }
+    assert sales_breakdowns[production_1.id]["net_transactions"] == 200
+    assert sales_breakdowns[production_2.id]["society_transfer_value"] == 250
+
+
+@pytest.mark.django_db
+def test_sales_breakdowns_by_with_breakdowns():
+    booking = BookingFactory()
+    TransactionFactory(pay_object=booking, value=400, provider_fee=10, app_fee=150)
+
+    assert Transaction.objects.sales_breakdowns_by(
+        "booking__performance",
+        breakdowns=[SalesBreakdown.Enums.APP_FEE, SalesBreakdown.Enums.TOTAL_PAYMENTS],
+    ) == {booking.performance.id: {"app_fee": 150, "total_payments": 400}}
+
+
+def daily_sales_rows():
+    return list(
+        DailySales.objects.order_by("date", "provider_name", "status").values_list(
+            "date",
+            "provider_name",
+            "status",
+            "total_payments",
+            "total_refunds",
+            "app_fee",
+            "provider_fee",
+            "number_of_transactions",
+        )
+    )
+
+
+@pytest.mark.django_db
+def test_daily_sales_are_maintained_from_transactions():
+    today = timezone.localdate()
+    yesterday = today - timedelta(days=1)
+    booking = BookingFactory()
+    payment = TransactionFactory(
+        pay_object=booking, value=1000, app_fee=100, provider_fee=None
+    )
+    TransactionFactory(pay_object=booking, value=500, provider_name=Cash.name)
+    refund = TransactionFactory(
+        pay_object=booking,
+        value=-1000,
+        provider_fee=-10,
+        type=Transaction.Type.REFUND,
+        status=Transaction.Status.PENDING,
+    )
+
+    assert daily_sales_rows() == [
+        (today, Cash.name, "COMPLETED", 500, 0, 0, 0, 1),
+        (today, SquareOnline.name, "COMPLETED", 1000, 0, 100, 0, 1),
+        (today, SquareOnline.name, "PENDING", 0, -1000, 0, -10, 1),
+    ]
+
+    refund.status = Transaction.Status.COMPLETED
+    refund.save()
+    payment.provider_fee = 20
+    payment.created_at -= timedelta(days=1)
+    payment.save()
+
+    assert daily_sales_rows() == [
+        (yesterday, SquareOnline.name, "COMPLETED", 1000, 0, 100, 20, 1),
+        (today, Cash.name, "COMPLETED", 500, 0, 0, 0, 1),
+        (today, SquareOnline.name, "COMPLETED", 0, -1000, 0, -10, 1),
+    ]
+
+    refund.delete()
+    assert len(daily_sales_rows()) == 2
+
+    booking.delete()
+    assert not daily_sales_rows()
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize(
+    "created_at",
+    [
+        "2021-03-01T23:30:00",
+        "2021-03-01T23:30:00+00:00",
+        datetime(2021, 3, 1, 23, 30),
+    ],
+)
+def test_daily_sales_with_unparsed_created_at(created_at):
+    payment = TransactionFactory(pay_object=BookingFactory(), value=1000)
+
+    payment.created_at = created_at
+    payment.save()
+
+    assert list(DailySales.objects.values_list("date", flat=True)) == [date(2021, 3, 1)]
+
+
+@pytest.mark.django_db
+def test_daily_sales_of_deleted_booking_with_tickets():
+    booking = BookingFactory()
+    other_booking = BookingFactory(performance=booking.performance)
+    # With tickets, the booking's transactions are deleted before it is
+    TicketFactory(booking=booking)
+    TransactionFactory(pay_object=booking, value=1000)
+    TransactionFactory(pay_object=other_booking, value=100)
+
+    with patch.object(DailySales.objects, "update_for_transactions") as update_mock:
+        booking.delete()
+
+    # The transactions were removed from the daily sales with the booking
+    update_mock.assert_not_called()
+    assert DailySales.objects.sales_breakdown(
+        [SalesBreakdown.Enums.TOTAL_PAYMENTS]
+    ) == {"total_payments": 100}
+
+
+@pytest.mark.django_db
+def test_daily_sales_move_with_transaction_pay_object():
+    booking = BookingFactory()
+    other_booking = BookingFactory()
+    payment = TransactionFactory(pay_object=booking, value=1000)
+
+    payment.pay_object = other_booking
+    payment.save()
+
+    assert list(DailySales.objects.values_list("performance_id", flat=True)) == [
+        other_booking.performance_id
+    ]
+
+
+@pytest.mark.django_db
+def test_daily_sales_move_with_booking_performance():
+    booking = BookingFactory()
+    old_performance = booking.performance
+    TransactionFactory(pay_object=booking, value=1000)
+    TransactionFactory(
+        pay_object=BookingFactory(performance=old_performance), value=100
+    )
+    new_performance = PerformanceFactory()
+
+    booking.performance = new_performance
+    booking.save()
+
+    assert DailySales.objects.sales_breakdowns_by(
+        "performance", [SalesBreakdown.Enums.TOTAL_PAYMENTS]
+    ) == {
+        old_performance.id: {"total_payments": 100},
+        new_performance.id: {"total_payments": 1000},
+    }
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize(
+    "transactions",
+    [
+        [],
+        [{"value": 200, "provider_name": Cash.name, "app_fee": 100}],
+        [
+            {"value": 600, "provider_name": SquarePOS.name, "app_fee": 200},
+            {"value": 400, "provider_fee": 10, "status": Transaction.Status.PENDING},
+            {"value": 200, "provider_name": Cash.name, "app_fee": 100},
+            {"value": -600, "app_fee": -200, "type": Transaction.Type.REFUND},
+        ],
+    ],
+)
+def test_daily_sales_breakdown(transactions):
+    booking = BookingFactory()
+    for transaction in transactions:
+        TransactionFactory(
+            pay_object=booking,
+            **{"provider_fee": None, "app_fee": None, **transaction},
+        )
+    TransactionFactory(value=1000)  # For another performance
+
+    daily_sales = DailySales.objects.filter(performance=booking.performance)
+    expected = {
+        key: value or 0
+        for key, value in booking.performance.qs.transactions()
+        .annotate_sales_breakdown()
+        .items()
+    }
+
+    assert daily_sales.sales_breakdown() == expected
+    assert daily_sales.sales_breakdown([SalesBreakdown.Enums.APP_FEE]) == {
+        "app_fee": expected["app_fee"]
+    }
+    assert daily_sales.sales_breakdowns_by("performance") == (
+        {booking.performance.id: expected} if transactions else {}
+    )
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize(
+    "transactions",
+    [
+        [],
+        [{"value": 200, "provider_name": Cash.name}],
+        [{"value": 400, "provider_fee": 10, "app_fee": None}],
+        [
+            {"value": 600, "provider_name": SquarePOS.name, "app_fee": 200},
+            {"value": 400, "provider_fee": 10, "status": Transaction.Status.PENDING},
+            {"value": 200, "provider_name": Cash.name, "app_fee": 100},
+            {"value": -600, "app_fee": -200, "type": Transaction.Type.REFUND},
+            {
+                "value": -200,
+                "provider_name": Cash.name,
+                "provider_fee": -5,
+                "type": Transaction.Type.REFUND,
+            },
+        ],
+    ],
+)
+def test_sales_breakdown_implementations_agree(transactions):
+    booking = BookingFactory()
+    for transaction in transactions:
+        TransactionFactory(
+            pay_object=booking,
+            **{"provider_fee": None, "app_fee": None, **transaction},
+        )
+    TransactionFactory(value=1000)  # For another booking
+
+    # Aggregated from the transactions
+    queried = {
+        key: value or 0
+        for key, value in booking.transactions.annotate_sales_breakdown().items()
+    }
+    assert set(queried) == {breakdown.key for breakdown in SalesBreakdown.Enums}
+
+    # Annotated onto the booking through its transactions
+    annotated_booking = Booking.objects.annotate_sales_breakdown().get(pk=booking.pk)
+    assert {key: getattr(annotated_booking, key) for key in queried} == queried
+
+    # Rolled up into the daily sales
+    assert (
+        DailySales.objects.filter(performance=booking.performance).sales_breakdown()
+        == queried
+    )
+
+    # Computed from the loaded transactions
+    assert SalesBreakdown.compute(booking.transactions.all()) == queried
+
+
 @pytest.mark.django_db
 def test_update_payment_from_square(mock_square):
     payment = TransactionFactory(provider_fee=0, provider_transaction_id="abc")
@@ -203,15 +471,37 @@ def test_cant_be_refunded_when_not_completed(status):
 @pytest.mark.django_db
 def test_transaction_qs_sync():
     transactions = [TransactionFactory() for _ in range(3)]
-    with patch(
-        "uobtheatre.payments.models.Transaction.sync_transaction_with_provider",
-        autospec=True,
-    ) as mock_sync:
-        Transaction.objects.sync()
+    with patch("uobtheatre.payments.models.TransactionSyncer") as mock_syncer:
+        mock_syncer.return_value.sync.return_value = {"synced": 3, "failed": 0}
+        queryset = Transaction.objects.all()
+        assert queryset.sync(max_workers=2) == {"synced": 3, "failed": 0}
 
-    assert mock_sync.call_count == 3
-    for transaction in transactions:
-        mock_sync.assert_any_call(transaction)
+    mock_syncer.assert_called_once_with(max_workers=2)
+    mock_syncer.return_value.sync.assert_called_once_with(queryset)
+    assert set(mock_syncer.return_value.sync.call_args.args[0]) == set(transactions)
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize(
+    "provider_name, status, provider_fee, is_pending",
+    [
+        (SquareOnline.name, Transaction.Status.COMPLETED, None, True),
+        (SquarePOS.name, Transaction.Status.COMPLETED, None, True),
+        (SquareRefund.name, Transaction.Status.COMPLETED, None, True),
+        (SquareOnline.name, Transaction.Status.COMPLETED, 10, False),
+        (SquareOnline.name, Transaction.Status.PENDING, None, False),
+        (Cash.name, Transaction.Status.COMPLETED, None, False),
+    ],
+)
+def test_transaction_provider_fee_pending(
+    provider_name, status, provider_fee, is_pending
+):
+    transaction = TransactionFactory(
+        provider_name=provider_name, status=status, provider_fee=provider_fee
+    )
+
+    assert transaction.is_provider_fee_pending is is_pending
+    assert Transaction.objects.pending_provider_fee().exists() is is_pending
 
 
 @pytest.mark.django_db
@@ -415,3 +705,54 @@ def test_payment_associated_tasks():
     )
 
     assert list(transaction.qs.associated_tasks()) == [related_task]
+
+
+@pytest.mark.django_db
+def test_transaction_lookups_use_indexes():
+    booking = BookingFactory()
+    content_type = booking.content_type
+    providers = [SquareOnline.name, SquarePOS.name, Cash.name]
+    Transaction.objects.bulk_create(
+        Transaction(
+            pay_object_type=content_type,
+            pay_object_id=booking.pk + i // 2,
+            status=(
+                Transaction.Status.PENDING
+                if i % 100 == 0
+                else Transaction.Status.COMPLETED
+            ),
+            provider_name=providers[i % 3],
+            provider_transaction_id=(
+                None if providers[i % 3] == Cash.name else f"provider-{i}"
+            ),
+            value=100,
+            provider_fee=None if i % 50 == 0 else 5,
+        )
+        for i in range(5000)
+    )
+    with connection.cursor() as cursor:
+        cursor.execute("ANALYZE payments_transaction")
+
+    for queryset, index in [
+        (booking.transactions.all(), "transaction_pay_object_idx"),
+        (
+            Transaction.objects.filter(
+                pay_object_type=content_type, status=Transaction.Status.PENDING
+            ),
+            "transaction_pending_idx",
+        ),
+        (
+            Transaction.objects.filter(
+                provider_transaction_id="provider-10", provider_name=SquarePOS.name
+            ),
+            "transaction_provider_id_idx",
+        ),
+        (
+            Transaction.objects.filter(
+                provider_transaction_id="provider-10", type=Transaction.Type.REFUND
+            ),
+            "transaction_provider_id_idx",
+        ),
+        (Transaction.objects.pending_provider_fee(), "transaction_pending_fee_idx"),
+    ]:
+        assert index in queryset.explain()
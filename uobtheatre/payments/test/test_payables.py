@@ -1,6 +1,7 @@
 from unittest.mock import PropertyMock, patch
 
 import pytest
+from django.db.models import F, Q, Sum
 from pytest_django.asserts import assertQuerysetEqual
 
 from uobtheatre.bookings.models import Booking
@@ -9,7 +10,7 @@ from uobtheatre.payments.exceptions import (
     CantBePaidForException,
     CantBeRefundedException,
 )
-from uobtheatre.payments.models import Transaction
+from uobtheatre.payments.models import SalesBreakdown, Transaction
 from uobtheatre.payments.payables import Payable
 from uobtheatre.payments.tasks import refund_payable
 from uobtheatre.payments.test.factories import TransactionFactory, mock_payment_method
@@ -19,6 +20,7 @@ from uobtheatre.payments.transaction_providers import (
     SquareOnline,
     SquarePOS,
 )
+from uobtheatre.productions.models import Production
 from uobtheatre.users.test.factories import UserFactory
 from uobtheatre.utils.test.factories import TaskResultFactory
 
@@ -122,6 +124,105 @@ def test_society_transfer_value():
     assert booking.sales_breakdown.society_transfer_value == 550
 
 
+SALES_BREAKDOWN_TRANSACTIONS = [
+    [],
+    [{"value": 200, "provider_name": Cash.name, "app_fee": 100}],
+    [
+        {"value": 600, "provider_name": Card.name, "app_fee": 200},
+        {"value": 400, "provider_name": SquareOnline.name, "provider_fee": 10},
+        {"value": 200, "provider_name": Cash.name, "app_fee": 100},
+        {
+            "value": -600,
+            "provider_name": Card.name,
+            "app_fee": -200,
+            "type": Transaction.Type.REFUND,
+        },
+    ],
+]
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize("transactions", SALES_BREAKDOWN_TRANSACTIONS)
+def test_annotate_sales_breakdown(transactions, django_assert_num_queries):
+    bookings = BookingFactory.create_batch(3)
+    for booking in bookings:
+        for transaction in transactions:
+            TransactionFactory(
+                pay_object=booking,
+                **{"provider_fee": None, "app_fee": None, **transaction},
+            )
+    expected = {
+        breakdown.key: getattr(bookings[0].sales_breakdown, breakdown.key)
+        for breakdown in SalesBreakdown.Enums
+    }
+
+    with django_assert_num_queries(1):
+        annotated = list(Booking.objects.annotate_sales_breakdown())
+        assert [
+            {
+                breakdown.key: getattr(booking.sales_breakdown, breakdown.key)
+                for breakdown in SalesBreakdown.Enums
+            }
+            for booking in annotated
+        ] == [expected] * 3
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize("transactions", SALES_BREAKDOWN_TRANSACTIONS)
+def test_sales_breakdown_from_prefetched_transactions(
+    transactions, django_assert_num_queries
+):
+    booking = BookingFactory()
+    for transaction in transactions:
+        TransactionFactory(
+            pay_object=booking,
+            **{"provider_fee": None, "app_fee": None, **transaction},
+        )
+    expected = booking.transactions.annotate_sales_breakdown()
+
+    booking = Booking.objects.prefetch_related("transactions").get(pk=booking.pk)
+    with django_assert_num_queries(0):
+        assert {
+            breakdown.key: getattr(booking.sales_breakdown, breakdown.key)
+            for breakdown in SalesBreakdown.Enums
+        } == {key: value or 0 for key, value in expected.items()}
+
+
+@pytest.mark.django_db
+def test_partially_annotated_sales_breakdown(django_assert_num_queries):
+    booking = BookingFactory()
+    TransactionFactory(pay_object=booking, value=400, app_fee=150)
+
+    booking = Booking.objects.annotate_sales_breakdown(
+        [SalesBreakdown.Enums.TOTAL_PAYMENTS]
+    ).get(pk=booking.pk)
+
+    with django_assert_num_queries(0):
+        assert booking.sales_breakdown.total_payments == 400
+    with django_assert_num_queries(1):
+        assert booking.sales_breakdown.society_revenue == 250
+
+
+@pytest.mark.django_db
+def test_relative_expression():
+    expression = SalesBreakdown.Enums.TOTAL_CARD_PAYMENTS.through("transactions")
+    expected = Sum(
+        "transactions__value",
+        filter=(
+            ~Q(transactions__provider_name=Cash.name)
+            & Q(transactions__type=Transaction.Type.PAYMENT)
+        ),
+    )
+
+    assert str(Booking.objects.annotate(total=expression).query) == str(
+        Booking.objects.annotate(total=expected).query
+    )
+    # The original expression is left unchanged
+    assert SalesBreakdown.Enums.TOTAL_CARD_PAYMENTS.value.source_expressions == [
+        F("value")
+    ]
+
+
 @pytest.mark.django_db
 @pytest.mark.parametrize(
     "payment_values, has_pending, is_refunded",
@@ -135,7 +236,9 @@ def test_society_transfer_value():
         ([5, -5], True, False),
     ],
 )
-def test_is_refunded(payment_values, has_pending, is_refunded):
+def test_is_refunded(
+    payment_values, has_pending, is_refunded, django_assert_num_queries
+):
     # Create some payments for different payobjects
     [TransactionFactory(status=Transaction.Status.COMPLETED) for _ in range(10)]
 
@@ -155,6 +258,11 @@ def test_is_refunded(payment_values, has_pending, is_refunded):
     if payment := pay_object.transactions.first():
         assert payment.is_refunded == is_refunded
 
+    annotated = Booking.objects.annotate_refund_eligibility().get(pk=pay_object.pk)
+    with django_assert_num_queries(0):
+        assert annotated.is_refunded == is_refunded
+        assert annotated.is_locked == has_pending
+
 
 @pytest.mark.django_db
 @pytest.mark.parametrize(
@@ -237,6 +345,44 @@ def test_validate_cant_be_refunded(
             assert value is None
 
 
+@pytest.mark.django_db
+def test_annotate_refund_eligibility(django_assert_num_queries):
+    refundable = BookingFactory(status=Booking.Status.PAID)
+    TransactionFactory(pay_object=refundable)
+    no_payments = BookingFactory(status=Booking.Status.PAID)
+    locked = BookingFactory(status=Booking.Status.PAID)
+    TransactionFactory(pay_object=locked, status=Transaction.Status.PENDING)
+    refunded = BookingFactory(status=Booking.Status.CANCELLED)
+    TransactionFactory(pay_object=refunded, value=100)
+    TransactionFactory(pay_object=refunded, value=-100, type=Transaction.Type.REFUND)
+    closed = BookingFactory(
+        status=Booking.Status.PAID,
+        performance__production__status=Production.Status.CLOSED,
+    )
+    TransactionFactory(pay_object=closed)
+    bookings = [refundable, no_payments, locked, refunded, closed]
+
+    with django_assert_num_queries(1):
+        annotated = list(
+            Booking.objects.filter(pk__in=[booking.pk for booking in bookings])
+            .annotate_refund_eligibility()
+            .order_by("pk")
+        )
+        assert [booking.can_be_refunded for booking in annotated] == [
+            True,
+            False,
+            False,
+            False,
+            False,
+        ]
+        errors = [booking.validate_cant_be_refunded() for booking in annotated]
+
+    assert [error and error.message for error in errors] == [
+        error and error.message
+        for error in (booking.validate_cant_be_refunded() for booking in bookings)
+    ]
+
+
 @pytest.mark.django_db
 def test_async_refund():
     booking = BookingFactory(id=45)
@@ -3,7 +3,7 @@ from unittest.mock import patch
 import pytest
 
 from uobtheatre.bookings.test.factories import BookingFactory
-from uobtheatre.payments.models import Transaction
+from uobtheatre.payments.models import DailySales, Transaction
 from uobtheatre.payments.payables import Payable
 from uobtheatre.payments.signals import pre_transaction_save_callback
 from uobtheatre.payments.test.factories import TransactionFactory
@@ -41,3 +41,78 @@ def test_payment_model_signals(mailoutbox):
     assert booking.status == Payable.Status.CANCELLED
     assert booking.is_locked is False
     assert booking.is_refunded is True
+
+
+@pytest.mark.django_db
+def test_completed_transaction_schedules_provider_fee_sync(
+    django_capture_on_commit_callbacks,
+):
+    transaction = TransactionFactory(status=Transaction.Status.PENDING)
+
+    with patch(
+        "uobtheatre.payments.signals.sync_provider_fees.delay"
+    ) as mock_delay, django_capture_on_commit_callbacks(execute=True):
+        # Saving a pending transaction doesn't schedule a sync
+        transaction.save()
+        mock_delay.assert_not_called()
+
+        transaction.status = Transaction.Status.COMPLETED
+        transaction.save()
+
+        # Nor does saving a transaction which was already completed
+        transaction.save()
+
+    mock_delay.assert_called_once_with([transaction.pk])
+
+
+@pytest.mark.django_db
+def test_created_completed_transaction_schedules_provider_fee_sync(
+    django_capture_on_commit_callbacks,
+):
+    with patch(
+        "uobtheatre.payments.signals.sync_provider_fees.delay"
+    ) as mock_delay, django_capture_on_commit_callbacks(execute=True):
+        transaction = TransactionFactory()
+        TransactionFactory(provider_fee=10)
+
+    mock_delay.assert_called_once_with([transaction.pk])
+
+
+@pytest.mark.django_db
+def test_saving_unchanged_transaction_skips_lookups(django_assert_num_queries):
+    transaction = Transaction.objects.get(pk=TransactionFactory().pk)
+
+    # Only the transaction itself is updated
+    with django_assert_num_queries(1):
+        transaction.card_brand = "VISA"
+        transaction.save()
+
+
+@pytest.mark.django_db
+def test_changing_transaction_updates_daily_sales(django_assert_num_queries):
+    transaction = TransactionFactory(value=100, status=Transaction.Status.PENDING)
+    transaction.pay_object.performance  # pylint: disable=pointless-statement
+
+    # The transaction is saved, moved between the daily sales rows (without
+    # recomputing the rest of the performance's daily sales) and its booking is
+    # checked for being refunded
+    with django_assert_num_queries(9):
+        transaction.status = Transaction.Status.COMPLETED
+        transaction.save()
+
+    assert list(DailySales.objects.values_list("status", "total_payments")) == [
+        (Transaction.Status.COMPLETED, 100)
+    ]
+
+
+@pytest.mark.django_db
+def test_deleting_booking_removes_its_transactions_from_daily_sales():
+    booking = BookingFactory()
+    TransactionFactory(pay_object=booking, value=100)
+    TransactionFactory(pay_object=booking, value=-100, type=Transaction.Type.REFUND)
+    TransactionFactory(value=200)
+
+    booking.delete()
+
+    # The transactions are only removed once
+    assert list(DailySales.objects.values_list("total_payments", flat=True)) == [200]
@@ -1,12 +1,18 @@
 from copy import deepcopy
+from datetime import timedelta
 from unittest.mock import patch
 
 import pytest
+from django.utils import timezone
 
 from uobtheatre.bookings.test.factories import BookingFactory
-from uobtheatre.payments.models import Transaction
+from uobtheatre.payments.models import SquareWebhookEvent, Transaction
 from uobtheatre.payments.payables import Payable
 from uobtheatre.payments.square_webhooks import SquareWebhooks
+from uobtheatre.payments.tasks import (
+    process_pending_square_webhook_events,
+    process_square_webhook_events,
+)
 from uobtheatre.payments.test.factories import TransactionFactory
 from uobtheatre.payments.transaction_providers import SquarePOS, SquareRefund
 
@@ -173,17 +179,20 @@ def test_handle_checkout_webhook(rest_client):
             HTTP_X_SQUARE_SIGNATURE="xoa9/2fAXamuULrlhV1HP7C4ai4=",
             format="json",
         )
+        sync_mock.assert_not_called()
+        assert SquareWebhookEvent.objects.process("dhgENdnFOPXqO") == 1
 
     assert response.status_code == 200
     sync_mock.assert_called_once_with(transaction, None)
+    assert not SquareWebhookEvent.objects.pending().exists()
 
 
 @pytest.mark.django_db
 @pytest.mark.parametrize(
-    "status,expected_code", [("COMPLETED", 404), ("CANCELED", 202)]
+    "status,is_pending", [("COMPLETED", True), ("CANCELED", False)]
 )
 def test_handle_checkout_webhook_with_unknown_transaction(
-    status, expected_code, rest_client
+    status, is_pending, rest_client
 ):
     payload = deepcopy(TEST_TERMINAL_CHECKOUT_PAYLOAD)
     payload["data"]["object"]["checkout"]["status"] = status
@@ -195,7 +204,14 @@ def test_handle_checkout_webhook_with_unknown_transaction(
             HTTP_X_SQUARE_SIGNATURE="signature",
             format="json",
         )
-    assert response.status_code == expected_code
+    assert response.status_code == 200
+
+    if is_pending:
+        with pytest.raises(Transaction.DoesNotExist):
+            SquareWebhookEvent.objects.process("dhgENdnFOPXqO")
+    else:
+        SquareWebhookEvent.objects.process("dhgENdnFOPXqO")
+    assert SquareWebhookEvent.objects.pending().exists() == is_pending
 
 
 @pytest.mark.django_db
@@ -209,6 +225,7 @@ def test_handle_webhooks_invalid_signature(rest_client):
     )
     assert response.status_code == 400
     assert response.data == "Invalid signature"
+    assert not SquareWebhookEvent.objects.exists()
 
     booking.refresh_from_db()
     assert booking.status == Payable.Status.IN_PROGRESS
@@ -227,6 +244,7 @@ def test_handle_payment_update_webhook_no_processing_fee(rest_client):
             HTTP_X_SQUARE_SIGNATURE="IoIb9bsLtyTbTcr+l2Ic039gOuo=",
             format="json",
         )
+    SquareWebhookEvent.objects.process("hYy9pRFVxpDsO1FB05SunFWUe9JZY")
 
     assert response.status_code == 200
     assert payment.provider_fee is None
@@ -259,6 +277,7 @@ def test_handle_payment_update_webhook(rest_client):
             HTTP_X_SQUARE_SIGNATURE="signature",
             format="json",
         )
+    SquareWebhookEvent.objects.process("hYy9pRFVxpDsO1FB05SunFWUe9JZY")
 
     payment.refresh_from_db()
     assert response.status_code == 200
@@ -285,6 +304,7 @@ def test_handle_payment_update_checkout_webhook(rest_client):
             HTTP_X_SQUARE_SIGNATURE="signature",
             format="json",
         )
+        SquareWebhookEvent.objects.process("dhgENdnFOPXqO")
 
     sync_mock.assert_called_once_with(payment, None)
 
@@ -302,6 +322,17 @@ def test_square_webhook_unknown_type(rest_client):
         )
 
     assert response.status_code == 202
+    assert not SquareWebhookEvent.objects.exists()
+
+
+@pytest.mark.django_db
+def test_process_event_of_unknown_type():
+    TransactionFactory(provider_transaction_id="abc")
+
+    with patch.object(Transaction, "sync_transaction_with_provider") as sync_mock:
+        SquareWebhooks.process_event({"type": "unknown.type", "data": {"id": "abc"}})
+
+    sync_mock.assert_not_called()
 
 
 @pytest.mark.django_db
@@ -320,6 +351,7 @@ def test_handle_refund_update_webhook(rest_client):
             HTTP_X_SQUARE_SIGNATURE="signature",
             format="json",
         )
+    SquareWebhookEvent.objects.process(payment.provider_transaction_id)
 
     payment.refresh_from_db()
     assert response.status_code == 200
@@ -328,27 +360,169 @@ def test_handle_refund_update_webhook(rest_client):
 
 
 @pytest.mark.django_db
-def test_handle_valid_but_unknown_transaction(rest_client):
+@pytest.mark.parametrize(
+    "location_id, is_pending", [("LMHPTEST", True), ("LMHPTESTUNKNOWN", False)]
+)
+def test_handle_valid_but_unknown_transaction(location_id, is_pending, rest_client):
+    payload = deepcopy(TEST_PAYMENT_UPDATE_PAYLOAD)
+    payload["data"]["object"]["payment"]["location_id"] = location_id
+
     with patch.object(SquareWebhooks, "is_valid_callback", return_value=True):
         response = rest_client.post(
             "/square",
-            TEST_PAYMENT_UPDATE_PAYLOAD,
+            payload,
             HTTP_X_SQUARE_SIGNATURE="signature",
             format="json",
         )
-    assert response.status_code == 404
+    assert response.status_code == 200
+
+    if is_pending:
+        # The payment may not have been saved yet, so the event is retried
+        with pytest.raises(Transaction.DoesNotExist):
+            process_square_webhook_events("hYy9pRFVxpDsO1FB05SunFWUe9JZY")
+    else:
+        assert process_square_webhook_events("hYy9pRFVxpDsO1FB05SunFWUe9JZY") == 1
+    assert SquareWebhookEvent.objects.pending().exists() == is_pending
+
+
+@pytest.mark.parametrize(
+    "payload, provider_transaction_id",
+    [
+        (TEST_TERMINAL_CHECKOUT_PAYLOAD, "dhgENdnFOPXqO"),
+        (TEST_PAYMENT_UPDATE_PAYLOAD, "hYy9pRFVxpDsO1FB05SunFWUe9JZY"),
+        (
+            {
+                "type": "payment.updated",
+                "data": {
+                    "object": {"payment": {"id": "abc", "terminal_checkout_id": "def"}}
+                },
+            },
+            "def",
+        ),
+        (
+            TEST_UPDATE_REFUND_PAYLOAD,
+            "xwo62Kt4WIOAh9LrczZxzbQbIZCZY_RVpsRbbUP3LmklUotq0kfiJnn1jDOqhNHymoqa6iDpd",
+        ),
+        ({"type": "unknown.type"}, None),
+    ],
+)
+def test_get_provider_transaction_id(payload, provider_transaction_id):
+    assert (
+        SquareWebhooks.get_provider_transaction_id(payload) == provider_transaction_id
+    )
 
 
 @pytest.mark.django_db
-def test_handle_valid_but_unknown_transaction_other_location(rest_client):
-    payload = deepcopy(TEST_PAYMENT_UPDATE_PAYLOAD)
-    payload["data"]["object"]["payment"]["location_id"] = "LMHPTESTUNKNOWN"
+def test_webhook_events_are_queued_once(
+    rest_client, django_capture_on_commit_callbacks
+):
+    with patch.object(
+        SquareWebhooks, "is_valid_callback", return_value=True
+    ), patch.object(
+        process_square_webhook_events, "delay"
+    ) as mock_delay, django_capture_on_commit_callbacks(
+        execute=True
+    ):
+        for _ in range(2):
+            response = rest_client.post(
+                "/square",
+                TEST_PAYMENT_UPDATE_PAYLOAD,
+                HTTP_X_SQUARE_SIGNATURE="signature",
+                format="json",
+            )
+            assert response.status_code == 200
+
+    mock_delay.assert_called_once_with("hYy9pRFVxpDsO1FB05SunFWUe9JZY")
+    event = SquareWebhookEvent.objects.get()
+    assert event.event_id == TEST_PAYMENT_UPDATE_PAYLOAD["event_id"]
+    assert event.payload == TEST_PAYMENT_UPDATE_PAYLOAD
+
+
+@pytest.mark.django_db
+def test_webhook_events_are_coalesced_in_order(rest_client):
+    payment = TransactionFactory(
+        provider_transaction_id="hYy9pRFVxpDsO1FB05SunFWUe9JZY", provider_fee=0
+    )
+    payloads = []
+    for minute, fee in [(2, 30), (1, 20), (0, 10)]:
+        payload = deepcopy(TEST_PAYMENT_UPDATE_PAYLOAD)
+        payload["event_id"] = f"event-{minute}"
+        payload["created_at"] = f"2021-10-03T11:0{minute}:00.000000000Z"
+        payload["data"]["object"]["payment"]["processing_fee"] = [
+            {"amount_money": {"amount": fee, "currency": "GBP"}}
+        ]
+        payloads.append(payload)
 
     with patch.object(SquareWebhooks, "is_valid_callback", return_value=True):
-        response = rest_client.post(
-            "/square",
-            payload,
-            HTTP_X_SQUARE_SIGNATURE="signature",
-            format="json",
+        for payload in payloads:
+            rest_client.post(
+                "/square",
+                payload,
+                HTTP_X_SQUARE_SIGNATURE="signature",
+                format="json",
+            )
+
+    with patch(
+        "uobtheatre.payments.models.Transaction.sync_transaction_with_provider",
+        autospec=True,
+    ) as sync_mock:
+        assert process_square_webhook_events(payment.provider_transaction_id) == 3
+        assert process_square_webhook_events(payment.provider_transaction_id) == 0
+
+    # Only the latest event is applied
+    sync_mock.assert_called_once_with(payment, payloads[0]["data"]["object"]["payment"])
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize(
+    "occurred_minutes_after, is_applied", [(-1, False), (0, False), (1, True)]
+)
+def test_stale_webhook_events_are_not_applied(occurred_minutes_after, is_applied):
+    payment = TransactionFactory(provider_transaction_id="abc")
+    processed_at = timezone.now()
+    for event_id, occurred_at, processed in [
+        ("processed", processed_at, True),
+        ("pending", processed_at + timedelta(minutes=occurred_minutes_after), False),
+    ]:
+        SquareWebhookEvent.objects.create(
+            event_id=event_id,
+            type="payment.updated",
+            provider_transaction_id="abc",
+            payload={"event_id": event_id},
+            occurred_at=occurred_at,
+            processed_at=timezone.now() if processed else None,
         )
-    assert response.status_code == 202
+
+    with patch.object(SquareWebhooks, "process_event") as process_mock:
+        assert process_square_webhook_events(payment.provider_transaction_id) == 1
+
+    # A late event mustn't undo the changes of a newer one, but is still
+    # marked as processed
+    assert process_mock.called is is_applied
+    assert not SquareWebhookEvent.objects.pending().exists()
+
+
+@pytest.mark.django_db
+def test_process_pending_square_webhook_events():
+    for event_id, received_ago, processed in [
+        ("new", timedelta(minutes=1), False),
+        ("pending", timedelta(minutes=10), False),
+        ("processed", timedelta(minutes=10), True),
+        ("old", timedelta(days=2), False),
+    ]:
+        event = SquareWebhookEvent.objects.create(
+            event_id=event_id,
+            type="payment.updated",
+            provider_transaction_id=event_id,
+            payload={},
+            occurred_at=timezone.now(),
+            processed_at=timezone.now() if processed else None,
+        )
+        SquareWebhookEvent.objects.filter(pk=event.pk).update(
+            created_at=timezone.now() - received_ago
+        )
+
+    with patch.object(process_square_webhook_events, "delay") as mock_delay:
+        assert process_pending_square_webhook_events() == 1
+
+    mock_delay.assert_called_once_with("pending")
@@ -0,0 +1,293 @@
+import time
+from unittest.mock import patch
+
+import pytest
+
+from uobtheatre.payments.models import DailySales, Transaction
+from uobtheatre.payments.sync import RateLimiter, TransactionSyncer, is_retryable
+from uobtheatre.payments.test.factories import (
+    FakeSquareClient,
+    MockApiResponse,
+    TransactionFactory,
+)
+from uobtheatre.payments.transaction_providers import (
+    Cash,
+    SquareAPIMixin,
+    SquareOnline,
+    SquarePOS,
+    SquareRefund,
+)
+from uobtheatre.utils.exceptions import SquareException
+
+
+def square_object(status="COMPLETED", fee=None):
+    """A square payment or refund, with an optional processing fee"""
+    data = {"status": status}
+    if fee is not None:
+        data["processing_fee"] = [{"amount_money": {"amount": fee, "currency": "GBP"}}]
+    return data
+
+
+def syncer(**kwargs):
+    """A syncer which doesn't wait between requests"""
+    return TransactionSyncer(
+        **{"requests_per_second": 10000, "backoff": 0, "max_retries": 2, **kwargs}
+    )
+
+
+def test_rate_limiter():
+    limiter = RateLimiter(requests_per_second=100)
+
+    start = time.monotonic()
+    for _ in range(11):
+        limiter.wait()
+
+    assert time.monotonic() - start >= 0.1
+
+
+def test_rate_limiter_unlimited():
+    limiter = RateLimiter(requests_per_second=None)
+    with patch("uobtheatre.payments.sync.time.sleep") as mock_sleep:
+        for _ in range(10):
+            limiter.wait()
+    mock_sleep.assert_not_called()
+
+
+@pytest.mark.parametrize(
+    "exception, retryable",
+    [
+        (SquareException(MockApiResponse(status_code=429)), True),
+        (SquareException(MockApiResponse(status_code=503)), True),
+        (SquareException(MockApiResponse(status_code=404)), False),
+        (ConnectionError(), True),
+        (ValueError(), False),
+    ],
+)
+def test_is_retryable(exception, retryable):
+    assert is_retryable(exception) is retryable
+
+
+@pytest.mark.django_db
+def test_syncer_updates_fees_in_bulk(django_assert_num_queries):
+    online = TransactionFactory(
+        provider_name=SquareOnline.name, provider_transaction_id="online"
+    )
+    refund = TransactionFactory(
+        provider_name=SquareRefund.name, provider_transaction_id="refund"
+    )
+    pos = TransactionFactory(
+        provider_name=SquarePOS.name, provider_transaction_id="pos"
+    )
+    cash = TransactionFactory(provider_name=Cash.name)
+    client = FakeSquareClient(
+        payments={
+            "online": square_object(fee=10),
+            "pos_1": square_object(fee=20),
+            "pos_2": square_object(fee=5),
+        },
+        refunds={"refund": square_object(fee=-3)},
+        checkouts={
+            "pos": {
+                "id": "pos",
+                "status": "COMPLETED",
+                "payment_ids": ["pos_1", "pos_2"],
+            }
+        },
+    )
+
+    updated_at = {transaction: transaction.updated_at for transaction in [online, cash]}
+
+    with patch.object(SquareAPIMixin, "client", client), patch.object(
+        DailySales.objects, "update_for_transactions"
+    ) as mock_update, django_assert_num_queries(1):
+        result = syncer().sync([online, refund, pos, cash])
+
+    assert result == {"synced": 3, "failed": 0}
+    assert sorted(client.requests) == ["online", "pos", "pos_1", "pos_2", "refund"]
+    for transaction, fee in [(online, 10), (refund, -3), (pos, 25), (cash, None)]:
+        transaction.refresh_from_db()
+        assert transaction.provider_fee == fee
+    assert online.updated_at > updated_at[online]
+    assert cash.updated_at == updated_at[cash]
+    assert set(mock_update.call_args.args[0]) == {online, refund, pos}
+
+
+@pytest.mark.django_db
+def test_syncer_refreshes_daily_sales():
+    TransactionFactory(provider_transaction_id="online", provider_fee=None)
+    client = FakeSquareClient(payments={"online": square_object(fee=10)})
+    transaction = Transaction.objects.get()
+
+    with patch.object(SquareAPIMixin, "client", client):
+        syncer().sync([transaction])
+
+    assert DailySales.objects.sales_breakdown()["provider_payment_value"] == 10
+
+    # The synced fee is now the transaction's loaded value, so it isn't
+    # counted again when the transaction is next changed
+    transaction.provider_fee = 15
+    transaction.save()
+    assert DailySales.objects.sales_breakdown()["provider_payment_value"] == 15
+
+
+@pytest.mark.django_db
+def test_syncer_saves_transactions_whose_status_changed():
+    payment = TransactionFactory(
+        provider_transaction_id="abc", status=Transaction.Status.PENDING
+    )
+    client = FakeSquareClient(payments={"abc": square_object(fee=10)})
+
+    with patch.object(SquareAPIMixin, "client", client), patch(
+        "uobtheatre.payments.models.Transaction.save", autospec=True
+    ) as mock_save:
+        assert syncer().sync([payment]) == {"synced": 1, "failed": 0}
+
+    mock_save.assert_called_once_with(payment)
+    assert payment.status == Transaction.Status.COMPLETED
+    assert payment.provider_fee == 10
+
+
+@pytest.mark.django_db
+def test_syncer_reports_failed_updates():
+    failing = TransactionFactory(
+        provider_transaction_id="failing", status=Transaction.Status.PENDING
+    )
+    succeeding = TransactionFactory(
+        provider_transaction_id="succeeding", status=Transaction.Status.PENDING
+    )
+    client = FakeSquareClient(
+        payments={
+            "failing": square_object(fee=10),
+            "succeeding": square_object(fee=10),
+        }
+    )
+    sync_transaction = Transaction.sync_transaction_with_provider
+
+    def sync_transaction_with_provider(transaction, data):
+        if transaction.provider_transaction_id == "failing":
+            raise ValueError("Failed to save")
+        sync_transaction(transaction, data)
+
+    with patch.object(SquareAPIMixin, "client", client), patch.object(
+        Transaction, "sync_transaction_with_provider", sync_transaction_with_provider
+    ), patch("uobtheatre.payments.sync.capture_exception") as mock_capture:
+        result = syncer().sync([failing, succeeding])
+
+    assert result == {"synced": 1, "failed": 1}
+    mock_capture.assert_called_once()
+    failing.refresh_from_db()
+    succeeding.refresh_from_db()
+    assert failing.status == Transaction.Status.PENDING
+    assert succeeding.status == Transaction.Status.COMPLETED
+
+
+@pytest.mark.django_db
+def test_syncer_retries_with_backoff():
+    payment = TransactionFactory(provider_transaction_id="abc")
+    client = FakeSquareClient(
+        payments={"abc": square_object(fee=10)}, failures={"abc": [429, 500]}
+    )
+
+    with patch.object(SquareAPIMixin, "client", client), patch(
+        "uobtheatre.payments.sync.RateLimiter.wait"
+    ), patch("uobtheatre.payments.sync.time.sleep") as mock_sleep:
+        result = syncer(backoff=0.5).sync(Transaction.objects.all())
+
+    assert result == {"synced": 1, "failed": 0}
+    assert client.requests == ["abc", "abc", "abc"]
+    assert [call.args[0] for call in mock_sleep.call_args_list] == [0.5, 1.0]
+    payment.refresh_from_db()
+    assert payment.provider_fee == 10
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize(
+    "failures, number_of_requests",
+    [([404], 1), ([500, 500, 500], 3)],
+)
+def test_syncer_reports_failed_requests(failures, number_of_requests):
+    failing = TransactionFactory(provider_transaction_id="failing")
+    succeeding = TransactionFactory(provider_transaction_id="succeeding")
+    client = FakeSquareClient(
+        payments={
+            "failing": square_object(fee=10),
+            "succeeding": square_object(fee=10),
+        },
+        failures={"failing": failures},
+    )
+
+    with patch.object(SquareAPIMixin, "client", client), patch(
+        "uobtheatre.payments.sync.capture_exception"
+    ) as mock_capture:
+        result = syncer().sync([failing, succeeding])
+
+    assert result == {"synced": 1, "failed": 1}
+    assert client.requests.count("failing") == number_of_requests
+    mock_capture.assert_called_once()
+    failing.refresh_from_db()
+    succeeding.refresh_from_db()
+    assert failing.provider_fee is None
+    assert succeeding.provider_fee == 10
+
+
+@pytest.mark.django_db
+def test_syncer_skips_checkouts_with_failed_payments():
+    pos = TransactionFactory(
+        provider_name=SquarePOS.name, provider_transaction_id="pos"
+    )
+    client = FakeSquareClient(
+        payments={"pos_1": square_object(fee=20)},
+        checkouts={
+            "pos": {
+                "id": "pos",
+                "status": "COMPLETED",
+                "payment_ids": ["pos_1", "pos_2"],
+            }
+        },
+    )
+
+    with patch.object(SquareAPIMixin, "client", client), patch(
+        "uobtheatre.payments.sync.capture_exception"
+    ):
+        result = syncer().sync([pos])
+
+    assert result == {"synced": 0, "failed": 1}
+    pos.refresh_from_db()
+    assert pos.provider_fee is None
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize(
+    "status", [Transaction.Status.PENDING, Transaction.Status.COMPLETED]
+)
+def test_syncer_syncs_checkouts_without_payments(status):
+    pos = TransactionFactory(
+        provider_name=SquarePOS.name, provider_transaction_id="pos", status=status
+    )
+    client = FakeSquareClient(
+        checkouts={"pos": {"id": "pos", "status": "COMPLETED"}},
+    )
+
+    with patch.object(SquareAPIMixin, "client", client):
+        result = syncer().sync([pos])
+
+    assert result == {"synced": 1, "failed": 0}
+    assert client.requests == ["pos"]
+    pos.refresh_from_db()
+    assert pos.status == Transaction.Status.COMPLETED
+    assert pos.provider_fee is None
+
+
+@pytest.mark.django_db
+def test_syncer_limits_concurrent_requests():
+    for i in range(6):
+        TransactionFactory(provider_transaction_id=str(i))
+    client = FakeSquareClient(
+        payments={str(i): square_object(fee=10) for i in range(6)}, delay=0.05
+    )
+
+    with patch.object(SquareAPIMixin, "client", client):
+        result = syncer(max_workers=2).sync(Transaction.objects.all())
+
+    assert result == {"synced": 6, "failed": 0}
+    assert client.max_in_flight == 2
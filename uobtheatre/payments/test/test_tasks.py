@@ -6,8 +6,15 @@ from django.contrib.contenttypes.models import ContentType
 
 from uobtheatre.bookings.test.factories import BookingFactory
 from uobtheatre.payments.exceptions import CantBeRefundedException
-from uobtheatre.payments.tasks import RefundTask, refund_payable, refund_payment
-from uobtheatre.payments.test.factories import TransactionFactory
+from uobtheatre.payments.models import Transaction
+from uobtheatre.payments.tasks import (
+    RefundTask,
+    refund_payable,
+    refund_payment,
+    sync_provider_fees,
+)
+from uobtheatre.payments.test.factories import FakeSquareClient, TransactionFactory
+from uobtheatre.payments.transaction_providers import SquareAPIMixin
 from uobtheatre.productions.test.factories import ProductionFactory
 from uobtheatre.users.test.factories import UserFactory
 
@@ -75,3 +82,32 @@ def test_refund_payable_task_invalid_content_type():
         ),
     ):
         refund_payable(1, content_type.pk, auth_user.pk)
+
+
+@pytest.mark.django_db
+def test_sync_provider_fees_task():
+    pending_1 = TransactionFactory(provider_transaction_id="abc")
+    pending_2 = TransactionFactory(provider_transaction_id="def")
+    TransactionFactory(provider_transaction_id="ghi", provider_fee=10)
+    client = FakeSquareClient(
+        payments={
+            payment_id: {
+                "status": "COMPLETED",
+                "processing_fee": [{"amount_money": {"amount": 5, "currency": "GBP"}}],
+            }
+            for payment_id in ("abc", "def", "ghi")
+        }
+    )
+
+    with patch.object(SquareAPIMixin, "client", client):
+        assert sync_provider_fees([pending_2.pk]) == {"synced": 1, "failed": 0}
+        assert client.requests == ["def"]
+
+        assert sync_provider_fees() == {"synced": 1, "failed": 0}
+        assert client.requests == ["def", "abc"]
+
+    pending_1.refresh_from_db()
+    pending_2.refresh_from_db()
+    assert pending_1.provider_fee == 5
+    assert pending_2.provider_fee == 5
+    assert not Transaction.objects.pending_provider_fee().exists()
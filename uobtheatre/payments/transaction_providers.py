@@ -1,6 +1,6 @@
 import abc
 import re
-from typing import TYPE_CHECKING, Any, Dict, Optional, Sequence, Type
+from typing import TYPE_CHECKING, Any, Dict, List, Optional, Sequence, Tuple, Type
 from uuid import uuid4
 
 from django.conf import settings
@@ -13,6 +13,7 @@ from uobtheatre.utils.models import classproperty
 
 if TYPE_CHECKING:
     from uobtheatre.payments.payables import Payable
+    from uobtheatre.payments.sync import TransactionSyncer
 
 
 class TransactionProvider(abc.ABC):
@@ -68,6 +69,26 @@ class TransactionProvider(abc.ABC):
     ):
         """Syncs the refund payment from the provider"""
 
+    @classmethod
+    def fetch_sync_data(
+        cls,
+        payments: List["payment_models.Transaction"],
+        syncer: "TransactionSyncer",
+    ) -> Dict["payment_models.Transaction", dict]:
+        """Fetch the data used to sync a batch of payments from the provider
+
+        Args:
+            payments (list of Transaction): The payments to fetch the data for.
+            syncer (TransactionSyncer): The syncer, which is used to make the
+                requests to the provider.
+
+        Returns:
+            dict: The data for each payment. Payments with nothing to sync, or
+                whose data could not be fetched, are omitted.
+        """
+        # pylint: disable=unused-argument
+        return {}
+
     @classmethod
     def cancel(
         cls, payment: "payment_models.Transaction"  # pylint: disable=unused-argument
@@ -223,6 +244,24 @@ class SquareAPIMixin(abc.ABC):
             fee["amount_money"]["amount"] for fee in square_object["processing_fee"]
         )
 
+    @classmethod
+    def parse_sync_data(
+        cls, data: dict
+    ) -> Tuple["payment_models.Transaction.Status", Optional[int]]:
+        """Get the status and provider fee of a payment from its sync data
+
+        Args:
+            data (dict): The data fetched for the payment by `fetch_sync_data`
+
+        Returns:
+            tuple: The status of the payment, and its processing fee (or None
+                if it has not been added yet).
+        """
+        return (
+            payment_models.Transaction.Status.from_square_status(data["status"]),
+            cls._square_transaction_processing_fee(data) or None,
+        )
+
     @classmethod
     def _fill_payment_from_square_response_object(cls, payment, response_object):
         """Updates and fills a payment model from a refund response object"""
@@ -313,19 +352,40 @@ class SquareRefund(RefundProvider, SquareAPIMixin):
             status=payment_models.Transaction.Status.PENDING,
         )
 
+    @classmethod
+    def get_refund(cls, refund_id: str) -> Dict[Any, Any]:
+        """Get full refund info from square for a given refund id.
+
+        Args:
+            refund_id (str): The id of the refund to be fetched
+
+        Returns:
+            dict: Refund response from square
+
+        Raises:
+            SquareException: When response is not successful
+        """
+        response = cls.client.refunds.get_payment_refund(refund_id)
+        cls._handle_response_failure(response)
+
+        return response.body["refund"]
+
     @classmethod
     def sync_transaction(
         cls, payment: "payment_models.Transaction", data: Optional[dict] = None
     ):
         if not data:
-            response = cls.client.refunds.get_payment_refund(
-                cls.get_payment_provider_id(payment)
-            )
-            cls._handle_response_failure(response)
-            data = response.body["refund"]
+            data = cls.get_refund(cls.get_payment_provider_id(payment))
 
         cls._fill_payment_from_square_response_object(payment, data).save()
 
+    @classmethod
+    def fetch_sync_data(cls, payments, syncer):
+        return syncer.map(
+            lambda payment: cls.get_refund(cls.get_payment_provider_id(payment)),
+            payments,
+        )
+
 
 class ManualPaymentMethodMixin(abc.ABC):
     """
@@ -490,21 +550,7 @@ class SquarePOS(PaymentProvider, SquarePaymentMethod):
         payment_id = cls.get_payment_provider_id(payment)
 
         checkout = data if data else cls.get_checkout(payment_id)
-        payment.provider_fee = (
-            sum(
-                filter(
-                    None,
-                    [
-                        cls._square_transaction_processing_fee(
-                            cls.get_payment(payment_id)
-                        )
-                        for payment_id in checkout["payment_ids"]
-                    ],
-                )
-            )
-            if "payment_ids" in checkout
-            else None
-        )
+        payment.provider_fee = cls._checkout_processing_fee(checkout)
         old_status = payment.status
         payment.status = payment_models.Transaction.Status.from_square_status(
             checkout["status"]
@@ -529,6 +575,71 @@ class SquarePOS(PaymentProvider, SquarePaymentMethod):
         ):
             payment.pay_object.complete(payment)
 
+    @classmethod
+    def fetch_sync_data(cls, payments, syncer):
+        """Fetch the checkouts of the payments, and then their square payments
+
+        The square payments of all the checkouts are fetched together, rather
+        than one checkout at a time.
+        """
+        checkouts = syncer.map(
+            lambda payment: cls.get_checkout(cls.get_payment_provider_id(payment)),
+            payments,
+        )
+        square_payments = syncer.map(
+            cls.get_payment,
+            {
+                payment_id
+                for checkout in checkouts.values()
+                for payment_id in checkout.get("payment_ids", [])
+            },
+        )
+        return {
+            payment: {
+                **checkout,
+                "payments": [
+                    square_payments[payment_id]
+                    for payment_id in checkout.get("payment_ids", [])
+                ],
+            }
+            for payment, checkout in checkouts.items()
+            # Skip the checkouts whose square payments could not be fetched
+            if all(
+                payment_id in square_payments
+                for payment_id in checkout.get("payment_ids", [])
+            )
+        }
+
+    @classmethod
+    def parse_sync_data(cls, data):
+        return (
+            payment_models.Transaction.Status.from_square_status(data["status"]),
+            cls._checkout_processing_fee(data),
+        )
+
+    @classmethod
+    def _checkout_processing_fee(cls, checkout: dict) -> Optional[int]:
+        """Get the processing fee of a checkout from its square payments
+
+        The square payments are fetched, unless they have already been
+        fetched (by `fetch_sync_data`).
+        """
+        if "payment_ids" not in checkout:
+            return None
+
+        square_payments = checkout.get("payments") or [
+            cls.get_payment(payment_id) for payment_id in checkout["payment_ids"]
+        ]
+        return sum(
+            filter(
+                None,
+                [
+                    cls._square_transaction_processing_fee(square_payment)
+                    for square_payment in square_payments
+                ],
+            )
+        )
+
 
 class SquareOnline(PaymentProvider, SquarePaymentMethod):
     """
@@ -624,3 +735,10 @@ class SquareOnline(PaymentProvider, SquarePaymentMethod):
         if data is None:
             data = cls.get_payment(payment_id)
         cls._fill_payment_from_square_response_object(payment, data).save()
+
+    @classmethod
+    def fetch_sync_data(cls, payments, syncer):
+        return syncer.map(
+            lambda payment: cls.get_payment(cls.get_payment_provider_id(payment)),
+            payments,
+        )
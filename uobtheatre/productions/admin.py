@@ -12,6 +12,7 @@ from uobtheatre.productions.models import (
     CrewMember,
     CrewRole,
     Performance,
+    PerformanceRefund,
     PerformanceSeatGroup,
     Production,
     ProductionTeamMember,
@@ -118,3 +119,20 @@ admin.site.register(CastMember)
 admin.site.register(CrewRole)
 admin.site.register(PerformanceSeatGroup)
 admin.site.register(ProductionTeamMember)
+
+
+@admin.register(PerformanceRefund)
+class PerformanceRefundAdmin(ModelAdmin):
+    """Admin for the progress of a performance's bulk refund"""
+
+    list_display = (
+        "performance",
+        "status",
+        "total_bookings",
+        "refunded_bookings",
+        "skipped_bookings",
+        "failed_bookings",
+        "created_at",
+    )
+    list_filter = ("status",)
+    readonly_fields = ("created_at", "completed_at")
@@ -0,0 +1,41 @@
+"""
+Caches of the public, computed fields of productions and performances
+"""
+
+from typing import Iterable
+
+from django.db import transaction
+
+from uobtheatre.utils.cache import ComputedFieldCache
+
+production_cache = ComputedFieldCache("production")
+performance_cache = ComputedFieldCache("performance")
+
+
+def invalidate_performances(performance_ids: Iterable[int]):
+    """Invalidate the cached fields of the performances and their productions
+
+    Like ComputedFieldCache.invalidate, this happens once the current
+    transaction commits. The productions are looked up then, so that this
+    doesn't add a query to the transaction.
+
+    Args:
+        performance_ids (list of int): The ids of the performances which have
+            changed.
+    """
+    from uobtheatre.productions.models import Performance
+
+    performance_ids = set(performance_ids)
+    if not performance_ids:
+        return
+
+    performance_cache.invalidate(performance_ids)
+    transaction.on_commit(
+        lambda: production_cache.delete(
+            set(
+                Performance.objects.filter(pk__in=performance_ids).values_list(
+                    "production_id", flat=True
+                )
+            )
+        )
+    )
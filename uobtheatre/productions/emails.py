@@ -1,7 +1,7 @@
-from typing import List, Optional
+from typing import Optional
 
 from uobtheatre.mail.composer import MailComposer
-from uobtheatre.productions.models import Performance, Production
+from uobtheatre.productions.models import PerformanceRefund, Production
 from uobtheatre.users.models import User
 from uobtheatre.utils.lang import pluralize
 
@@ -57,33 +57,27 @@ def send_production_ready_for_review_email(user: User, production: Production):
     )
 
 
-def performances_refunded_email(
-    authorizing_user: User,
-    performances: List[Performance],
-):
-    """Generate an email detailing performance refund statistics
+def performance_refunded_email(performance_refund: PerformanceRefund):
+    """Generate an email summarising a performance's refund
 
     Args:
-        authorizing_user (User): The user authorising the refunds
-        performances (List[Performance]): The performances refunded
+        performance_refund (PerformanceRefund): The completed refund
 
     Returns:
         MailComposer: Mail instance
     """
+    performance = performance_refund.performance
     mail = (
         MailComposer()
         .greeting()
+        .line(f"Refunds have been completed for {performance.pk} | {str(performance)}.")
         .line(
-            f"Refund(s) have been initiated for the following {pluralize('performance', performances)}:"
-        )
-        .line(
-            ", ".join(
-                f"{performance.pk} | {str(performance)}" for performance in performances
-            )
-        )
-        .line(
-            f"This action was requested by {authorizing_user.full_name} ({authorizing_user.email})"
+            f"Of its {performance_refund.total_bookings} paid {pluralize('booking', performance_refund.total_bookings)}, "
+            f"{performance_refund.refunded_bookings} were refunded, "
+            f"{performance_refund.skipped_bookings} were skipped (as they couldn't be refunded) "
+            f"and {performance_refund.failed_bookings} failed."
         )
-        .line("For more info please check the admin panel.")
     )
-    return mail
+    if user := performance_refund.authorizing_user:
+        mail.line(f"This action was requested by {user.full_name} ({user.email})")
+    return mail.line("For more info please check the admin panel.")
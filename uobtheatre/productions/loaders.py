@@ -0,0 +1,55 @@
+"""
+Batching loaders for the production and performance schema
+"""
+
+from typing import Dict, List
+
+from uobtheatre.productions.models import Performance, Production
+from uobtheatre.utils.loaders import Loader, ModelLoader
+
+
+class ProductionLoader(ModelLoader):
+    """Loads Productions by id, annotated with their listing fields"""
+
+    model = Production
+
+    def get_queryset(self):
+        return Production.objects.annotate_listing()
+
+
+class PerformanceLoader(ModelLoader):
+    """Loads Performances by id, along with their capacity snapshots"""
+
+    model = Performance
+
+    def get_queryset(self):
+        return Performance.objects.with_capacity_snapshots()
+
+
+class ProductionPerformancesLoader(Loader):
+    """Loads the Performances of Productions, keyed by production id.
+
+    The capacity snapshots of the performances are also loaded, so that their
+    capacity and bookability can be used without further queries.
+    """
+
+    def load_batch(self, keys):
+        performances: Dict[int, List[Performance]] = {key: [] for key in keys}
+        for performance in (
+            Performance.objects.filter(production_id__in=keys)
+            .order_by("pk")
+            .with_capacity_snapshots()
+        ):
+            performances[performance.production_id].append(performance)
+        return performances
+
+
+class PerformanceMinSeatPriceLoader(Loader):
+    """Loads the price of the cheapest seat in Performances"""
+
+    def load_batch(self, keys):
+        return dict(
+            Performance.objects.filter(pk__in=keys)
+            .annotate_cheapest_seat_price()
+            .values_list("pk", "cheapest_seat_price")
+        )
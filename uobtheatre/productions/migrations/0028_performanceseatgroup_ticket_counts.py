@@ -0,0 +1,55 @@
+# Generated by Django 3.2.25 on 2026-10-18 18:32
+
+from django.db import migrations, models
+from django.db.models import F, Func, IntegerField, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def count_performance_seat_group_tickets(apps, _):  # pragma: no cover
+    performance_seat_group_model = apps.get_model("productions", "performanceseatgroup")
+    ticket_model = apps.get_model("bookings", "ticket")
+
+    def count_tickets(status):
+        return Coalesce(
+            Subquery(
+                ticket_model.objects.filter(
+                    booking__performance=OuterRef("performance_id"),
+                    seat_group=OuterRef("seat_group_id"),
+                    booking__status=status,
+                )
+                .order_by()
+                .annotate(row_count=Func(F("pk"), function="COUNT"))
+                .values("row_count"),
+                output_field=IntegerField(),
+            ),
+            0,
+        )
+
+    performance_seat_group_model.objects.update(
+        tickets_sold=count_tickets("PAID"),
+        tickets_reserved=count_tickets("IN_PROGRESS"),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("bookings", "0007_booking_accessibility_info"),
+        ("productions", "0027_production_production_alert"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="performanceseatgroup",
+            name="tickets_reserved",
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name="performanceseatgroup",
+            name="tickets_sold",
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(
+            count_performance_seat_group_tickets, migrations.RunPython.noop
+        ),
+    ]
@@ -0,0 +1,37 @@
+# Generated by Django 3.2.25 on 2026-10-18 21:52
+
+from django.db import migrations, models
+from django.db.models import OuterRef, Subquery
+
+
+def find_reservations_expire_at(apps, _):  # pragma: no cover
+    performance_seat_group_model = apps.get_model("productions", "performanceseatgroup")
+    ticket_model = apps.get_model("bookings", "ticket")
+
+    performance_seat_group_model.objects.update(
+        reservations_expire_at=Subquery(
+            ticket_model.objects.filter(
+                booking__performance=OuterRef("performance_id"),
+                seat_group=OuterRef("seat_group_id"),
+                booking__status="IN_PROGRESS",
+            )
+            .order_by("booking__expires_at")
+            .values("booking__expires_at")[:1]
+        )
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("productions", "0029_performance_refund"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="performanceseatgroup",
+            name="reservations_expire_at",
+            field=models.DateTimeField(blank=True, editable=False, null=True),
+        ),
+        migrations.RunPython(find_reservations_expire_at, migrations.RunPython.noop),
+    ]
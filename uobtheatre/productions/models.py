@@ -1,14 +1,32 @@
 # pylint: disable=too-many-public-methods,too-many-lines
 import datetime
+import logging
 import math
+from collections import defaultdict
+from dataclasses import dataclass, field
 from typing import TYPE_CHECKING, Any, Dict, List, Optional
 
 from autoslug import AutoSlugField
 from django.contrib.contenttypes.models import ContentType
 from django.core.validators import MaxValueValidator, MinValueValidator
-from django.db import models
-from django.db.models import Max, Min, Q, Sum
-from django.db.models.query import QuerySet
+from django.db import models, transaction
+from django.db.models import (
+    Case,
+    F,
+    FloatField,
+    IntegerField,
+    Max,
+    Min,
+    OuterRef,
+    Q,
+    Subquery,
+    Sum,
+    Value,
+    When,
+    Window,
+)
+from django.db.models.functions import Cast, Ceil, Coalesce, Greatest, Least, NullIf
+from django.db.models.query import ModelIterable, QuerySet
 from django.utils import timezone
 from django.utils.functional import cached_property
 from django_tiptap.fields import TipTapTextField
@@ -16,14 +34,15 @@ from guardian.shortcuts import get_objects_for_user
 
 from uobtheatre.images.models import Image
 from uobtheatre.payments.exceptions import CantBeRefundedException
-from uobtheatre.payments.models import Transaction
+from uobtheatre.payments.models import DailySales, SalesBreakdown, Transaction
 from uobtheatre.payments.payables import Payable
+from uobtheatre.productions.cache import invalidate_performances
 from uobtheatre.productions.exceptions import (
     InvalidConcessionTypeException,
     InvalidSeatGroupException,
     NotEnoughCapacityException,
 )
-from uobtheatre.productions.tasks import refund_performance
+from uobtheatre.productions.tasks import run_performance_refund
 from uobtheatre.societies.models import Society
 from uobtheatre.users.abilities import AbilitiesMixin
 from uobtheatre.users.models import User
@@ -32,6 +51,7 @@ from uobtheatre.utils.models import (
     PermissionableModel,
     TimeStampedMixin,
     classproperty,
+    count_subquery,
 )
 from uobtheatre.utils.validators import (
     RelatedObjectsValidator,
@@ -44,6 +64,8 @@ from uobtheatre.venues.models import SeatGroup, Venue
 if TYPE_CHECKING:
     from uobtheatre.bookings.models import ConcessionType, TicketQuerySet
 
+logger = logging.getLogger(__name__)
+
 
 class CrewRole(models.Model):
     """A CrewMember's role in a production."""
@@ -159,9 +181,241 @@ class CrewMember(models.Model):
         ordering = ["id"]
 
 
+@dataclass
+class SeatGroupCapacitySnapshot:
+    """The capacity and ticket counts of a seat group in a performance"""
+
+    capacity: int = 0
+    tickets_sold: int = 0
+    tickets_sold_or_reserved: int = 0
+
+
+@dataclass
+class PerformanceCapacitySnapshot:
+    """A point in time view of the capacity of a Performance.
+
+    The snapshot holds everything required to work out the remaining capacity
+    of a performance, and each of its seat groups, so that these figures can
+    be calculated without any further queries.
+
+    Note:
+        Seat groups are keyed by the id of the SeatGroup (not the
+        PerformanceSeatGroup).
+    """
+
+    performance_capacity: Optional[int] = None
+    venue_capacity: Optional[int] = None
+    tickets_sold: int = 0
+    tickets_sold_or_reserved: int = 0
+    seat_groups: Dict[int, SeatGroupCapacitySnapshot] = field(default_factory=dict)
+
+    @property
+    def total_seat_group_capacity(self) -> int:
+        """The sum of the capacities of all the seat groups in the performance"""
+        return sum(seat_group.capacity for seat_group in self.seat_groups.values())
+
+    @property
+    def total_capacity(self) -> int:
+        """Total capacity of the performance, ignoring any existing bookings"""
+        limiting_capacities = [self.total_seat_group_capacity]
+        if self.venue_capacity is not None:
+            limiting_capacities.append(self.venue_capacity)
+        if self.performance_capacity:
+            limiting_capacities.append(self.performance_capacity)
+        return min(limiting_capacities)
+
+    def seat_group_capacity_remaining(self, seat_group_id: int) -> int:
+        """Get the number of available tickets able to be sold on a seat group"""
+        seat_group = self.seat_groups.get(seat_group_id, SeatGroupCapacitySnapshot())
+        return min(
+            self.total_capacity - self.tickets_sold_or_reserved,
+            seat_group.capacity - seat_group.tickets_sold_or_reserved,
+        )
+
+    @property
+    def capacity_remaining(self) -> int:
+        """Remaining capacity of the performance, factoring in existing bookings"""
+        return min(
+            sum(
+                self.seat_group_capacity_remaining(seat_group_id)
+                for seat_group_id in self.seat_groups
+            ),
+            self.total_capacity - self.tickets_sold_or_reserved,
+        )
+
+    @property
+    def is_sold_out(self) -> bool:
+        return self.capacity_remaining == 0
+
+
 class PerformanceQuerySet(QuerySet):
     """Queryset for Performances, also used as manager."""
 
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._with_capacity_snapshots = False
+
+    def _clone(self):
+        clone = super()._clone()  # type: ignore
+        clone._with_capacity_snapshots = (  # pylint: disable=protected-access
+            self._with_capacity_snapshots
+        )
+        return clone
+
+    def _fetch_all(self):
+        is_fetching = self._result_cache is None
+        super()._fetch_all()  # type: ignore
+        if (
+            is_fetching
+            and self._with_capacity_snapshots
+            and issubclass(self._iterable_class, ModelIterable)
+        ):
+            performances: List["Performance"] = self._result_cache  # type: ignore
+            snapshots = Performance.objects.filter(
+                pk__in=[performance.pk for performance in performances]
+            ).capacity_snapshots()
+            for performance in performances:
+                performance.prefetched_capacity_snapshot = snapshots[performance.pk]
+
+    def with_capacity_snapshots(self):
+        """Load the capacity snapshot of the performances when they are fetched.
+
+        All of the snapshots are loaded in a single query, and are then used
+        by the capacity properties of each Performance.
+
+        Returns:
+            QuerySet: The queryset which will load capacity snapshots
+        """
+        clone = self._chain()  # type: ignore
+        clone._with_capacity_snapshots = True  # pylint: disable=protected-access
+        return clone
+
+    def capacity_snapshots(
+        self, exact: bool = False
+    ) -> Dict[int, PerformanceCapacitySnapshot]:
+        """Compute the capacity snapshot of each performance in the queryset.
+
+        The capacities and ticket counts for every seat group of every
+        performance are fetched in a single query. By default the ticket
+        counts stored on each PerformanceSeatGroup are used. The stored
+        reservations include those which have expired but not yet been
+        released, so once one of a seat group's reservations may have expired
+        its unexpired reservations are counted instead.
+
+        Args:
+            exact (bool): Count all of the tickets from the Ticket table
+                instead of using the stored counts. This is slower, and should
+                only be used when validating bookings.
+
+        Returns:
+            dict of int: PerformanceCapacitySnapshot: The snapshot for each
+                performance, keyed by the performance id. Performances without
+                any seat groups map to an empty snapshot.
+        """
+        rows = (
+            PerformanceSeatGroup.objects.filter(performance__in=self)
+            .order_by()
+            .values(
+                "performance_id",
+                "seat_group_id",
+                "capacity",
+                performance_capacity=F("performance__capacity"),
+                venue_capacity=F("performance__venue__internal_capacity"),
+            )
+        )
+        from uobtheatre.bookings.models import Ticket
+
+        performance_tickets = Ticket.objects.filter(
+            booking__performance=OuterRef("performance_id")
+        )
+        seat_group_tickets = performance_tickets.filter(
+            seat_group=OuterRef("seat_group_id")
+        )
+        if exact:
+            rows = rows.annotate(
+                seat_group_sold=count_subquery(seat_group_tickets.sold()),
+                seat_group_sold_or_reserved=count_subquery(
+                    seat_group_tickets.sold_or_reserved()
+                ),
+                performance_sold=count_subquery(performance_tickets.sold()),
+                performance_sold_or_reserved=count_subquery(
+                    performance_tickets.sold_or_reserved()
+                ),
+            )
+        else:
+            rows = rows.annotate_unexpired_tickets_reserved().annotate(
+                seat_group_sold=F("tickets_sold"),
+                seat_group_sold_or_reserved=F("tickets_sold")
+                + F("unexpired_tickets_reserved"),
+                performance_sold=Window(
+                    Sum("tickets_sold"), partition_by=[F("performance_id")]
+                ),
+                performance_sold_or_reserved=Window(
+                    Sum(F("tickets_sold") + F("unexpired_tickets_reserved")),
+                    partition_by=[F("performance_id")],
+                ),
+            )
+
+        snapshots: Dict[int, PerformanceCapacitySnapshot] = defaultdict(
+            PerformanceCapacitySnapshot
+        )
+        for row in rows:
+            if row["performance_id"] not in snapshots:
+                snapshots[row["performance_id"]] = PerformanceCapacitySnapshot(
+                    performance_capacity=row["performance_capacity"],
+                    venue_capacity=row["venue_capacity"],
+                    tickets_sold=row["performance_sold"],
+                    tickets_sold_or_reserved=row["performance_sold_or_reserved"],
+                )
+            snapshots[row["performance_id"]].seat_groups[row["seat_group_id"]] = (
+                SeatGroupCapacitySnapshot(
+                    capacity=row["capacity"],
+                    tickets_sold=row["seat_group_sold"],
+                    tickets_sold_or_reserved=row["seat_group_sold_or_reserved"],
+                )
+            )
+        return snapshots
+
+    def annotate_cheapest_seat_price(self):
+        """Annotate the price of the cheapest seat in each performance.
+
+        This is the same value as Performance.min_seat_price, which includes
+        the largest single discount available for the performance. Performances
+        without any seat groups are annotated with None.
+
+        Returns:
+            QuerySet: The queryset annotated with cheapest_seat_price.
+        """
+        from uobtheatre.discounts.models import Discount
+
+        min_price = (
+            PerformanceSeatGroup.objects.filter(performance=OuterRef("pk"))
+            .order_by("price")
+            .values("price")[:1]
+        )
+        max_single_discount = (
+            Discount.objects.filter(performances=OuterRef("pk"))
+            .annotate(number_of_tickets_required=Sum("requirements__number"))
+            .filter(number_of_tickets_required=1)
+            .order_by("-percentage")
+            .values("percentage")[:1]
+        )
+        return self.annotate(
+            cheapest_seat_price=Cast(
+                Ceil(
+                    (
+                        Value(1.0)
+                        - Coalesce(
+                            Subquery(max_single_discount, output_field=FloatField()),
+                            Value(0.0),
+                        )
+                    )
+                    * Subquery(min_price, output_field=FloatField())
+                ),
+                IntegerField(),
+            )
+        )
+
     def running_on(self, date: datetime.date):
         """Performances running on the provided date.
 
@@ -315,6 +569,9 @@ class Performance(
 
     capacity = models.IntegerField(null=True, blank=True)
 
+    # Set when the performance is loaded with PerformanceQuerySet.with_capacity_snapshots
+    prefetched_capacity_snapshot: Optional["PerformanceCapacitySnapshot"] = None
+
     def validate(self):
         return self.VALIDATOR.validate(self)
 
@@ -364,39 +621,37 @@ class Performance(
             .exists()
         )
 
-    def total_seat_group_capacity(self, seat_group=None):
+    def total_seat_group_capacity(self):
         """The sum of the capacities of all the seat groups in this performance.
 
         Note:
             The sum of the capacities of all the seat groups is not necessarily
             equal to that of the Performance (the performance may be less).
 
-        Args:
-            seat_group (SeatGroup): If supplied the capacity of that SeatGroup is returned.
-                (default None)
-
         Returns:
-            int: The capacity of the seat groups (or SeatGroup if provided) of the show
+            int: The capacity of the seat groups of the show
         """
-        if seat_group:
-            queryset = self.performance_seat_groups
-            try:
-                return queryset.get(seat_group=seat_group).capacity
-            except queryset.model.DoesNotExist:
-                return 0
         response = self.performance_seat_groups.aggregate(Sum("capacity"))
         return response["capacity__sum"] or 0
 
+    @property
+    def capacity_snapshot(self) -> "PerformanceCapacitySnapshot":
+        """The capacity snapshot of the performance.
+
+        If the performance was loaded with its snapshot, that snapshot is
+        used. Otherwise a new snapshot is computed.
+
+        Returns:
+            PerformanceCapacitySnapshot: The capacity figures of the
+                performance and its seat groups.
+        """
+        if self.prefetched_capacity_snapshot is not None:
+            return self.prefetched_capacity_snapshot
+        return self.qs.capacity_snapshots()[self.pk]
+
     def seat_group_capacity_remaining(self, seat_group: SeatGroup):
         """Get the number of available tickets able to be sold on a seat group"""
-        return min(
-            self.total_capacity
-            - self.total_tickets_sold_or_reserved(),  # Top-level performance capacity remaining
-            self.total_seat_group_capacity(seat_group=seat_group)
-            - self.total_tickets_sold_or_reserved(
-                seat_group=seat_group
-            ),  # The capacity remaining for the local seat group capacity
-        )
+        return self.capacity_snapshot.seat_group_capacity_remaining(seat_group.pk)
 
     @property
     def capacity_remaining(self):
@@ -411,18 +666,9 @@ class Performance(
             be less).
 
         Returns:
-            int: The remaining capacity of the show (or SeatGroup if provided)
+            int: The remaining capacity of the show
         """
-        seat_groups_remaining_capacity = sum(
-            self.seat_group_capacity_remaining(performance_seat_group.seat_group)
-            for performance_seat_group in self.performance_seat_groups.all()
-        )
-
-        # The number of tickets remaining is the number of tickets left in the seat groups or the total capacity left for the performance - which ever is lower
-        return min(
-            seat_groups_remaining_capacity,
-            self.total_capacity - self.total_tickets_sold_or_reserved(),
-        )
+        return self.capacity_snapshot.capacity_remaining
 
     @property
     def total_capacity(self) -> int:
@@ -520,8 +766,12 @@ class Performance(
 
         """
         return {
-            discount.requirements.first().concession_type: discount.percentage
-            for discount in self.get_single_discounts()
+            min(
+                discount.requirements.all(), key=lambda requirement: requirement.pk
+            ).concession_type: discount.percentage
+            for discount in self.get_single_discounts().prefetch_related(
+                "requirements__concession_type"
+            )
         }
 
     def get_single_discounts(self) -> QuerySet[Any]:
@@ -603,7 +853,7 @@ class Performance(
         Returns:
             bool: if the performance is soldout.
         """
-        return self.capacity_remaining == 0
+        return self.capacity_snapshot.is_sold_out
 
     @property
     def is_bookable(self) -> bool:
@@ -613,6 +863,20 @@ class Performance(
             or (self.end and self.end < timezone.now())
         )
 
+    def lock_seat_groups(self) -> None:
+        """Lock the Performance's seat groups for the rest of the transaction.
+
+        Bookings for the same Performance which also lock its seat groups will
+        wait until this transaction completes, so that their capacity checks
+        see any tickets created by it. This must be called from within a
+        transaction.
+        """
+        list(
+            self.performance_seat_groups.select_for_update()
+            .order_by("pk")
+            .values_list("pk", flat=True)
+        )
+
     def validate_tickets(self, tickets, deleted_tickets=None):
         """Validates a set of tickets to be added to the performance.
 
@@ -660,11 +924,14 @@ class Performance(
             seat_group_count = seat_group_counts.get(seat_group)
             seat_group_counts[seat_group] = (seat_group_count or 0) - 1
 
+        # Always use an up to date and exact snapshot when validating
+        capacity_snapshot = self.qs.capacity_snapshots(exact=True)[self.pk]
+
         # Check each seat group is in the performance
         seat_groups_not_in_performance: List[str] = [  # type: ignore
             seat_group.name
             for seat_group in seat_group_counts.keys()  # pylint: disable=consider-iterating-dictionary
-            if seat_group not in self.seat_groups.all()
+            if seat_group.pk not in capacity_snapshot.seat_groups
         ]
 
         # If any of the seat_groups are not assigned to this performance then throw an error
@@ -681,8 +948,8 @@ class Performance(
 
         # Check that each seat group has enough capacity
         for seat_group, number_booked in seat_group_counts.items():
-            seat_group_remaining_capacity = self.seat_group_capacity_remaining(
-                seat_group=seat_group
+            seat_group_remaining_capacity = (
+                capacity_snapshot.seat_group_capacity_remaining(seat_group.pk)
             )
             if seat_group_remaining_capacity < number_booked:
                 raise NotEnoughCapacityException(
@@ -716,23 +983,32 @@ class Performance(
             return True
         return False
 
-    def sales_breakdown(self, breakdowns: Optional[list[str]] = None):
-        """Generates a breakdown of the sales of this performance"""
+    def sales_breakdown(self, breakdowns: Optional[list[SalesBreakdown.Enums]] = None):
+        """Generates a breakdown of the sales of this performance
+
+        Once the production is closed, this is read from the daily sales
+        rollup rather than the transactions.
+        """
+        if self.production.status == Production.Status.CLOSED:
+            return self.daily_sales.sales_breakdown(breakdowns)
         return self.qs.transactions().annotate_sales_breakdown(breakdowns)
 
-    def refund_bookings(self, authorizing_user: User):
+    def refund_bookings(self, authorizing_user: User) -> "PerformanceRefund":
         """Refund the performance's bookings
 
         Args:
             authorizing_user (User): The user authorizing the refund
 
+        Returns:
+            PerformanceRefund: The refund, which records its progress
+
         Raises:
             CantBeRefundedException: Raised if the performance can't be refunded
         """
         if not self.disabled:
             raise CantBeRefundedException(f"{self} is not set to disabled")
 
-        refund_performance.delay(self.pk, authorizing_user.id)
+        return PerformanceRefund.start(self, authorizing_user)
 
     def __str__(self):
         if self.start is None:
@@ -743,6 +1019,185 @@ class Performance(
         ordering = ["id"]
 
 
+class PerformanceSeatGroupQuerySet(QuerySet):
+    """Queryset for PerformanceSeatGroups, also used as manager."""
+
+    def annotate_ticket_counts(self):
+        """Annotate the number of sold and reserved tickets from the Ticket table
+
+        Adds counted_tickets_sold and counted_tickets_reserved, which should
+        match the stored tickets_sold and tickets_reserved counts,
+        counted_reservations_expire_at, when the earliest reservation expires,
+        and counted_unexpired_tickets_reserved, which should match
+        annotate_unexpired_tickets_reserved.
+
+        Returns:
+            QuerySet: The annotated queryset
+        """
+        from uobtheatre.bookings.models import Ticket
+
+        tickets = Ticket.objects.filter(
+            booking__performance=OuterRef("performance_id"),
+            seat_group=OuterRef("seat_group_id"),
+        )
+        reserved_tickets = tickets.filter(booking__status=Payable.Status.IN_PROGRESS)
+        return self.annotate(
+            counted_tickets_sold=count_subquery(
+                tickets.filter(booking__status=Payable.Status.PAID)
+            ),
+            counted_tickets_reserved=count_subquery(reserved_tickets),
+            counted_reservations_expire_at=Subquery(
+                reserved_tickets.order_by("booking__expires_at").values(
+                    "booking__expires_at"
+                )[:1]
+            ),
+            counted_unexpired_tickets_reserved=count_subquery(tickets.reserved()),
+        )
+
+    def annotate_unexpired_tickets_reserved(self):
+        """Annotate the number of reserved tickets which haven't expired
+
+        The stored tickets_reserved includes reservations which have expired
+        but not yet been released. It is therefore only used until the first
+        of the reservations may have expired (reservations_expire_at), after
+        which the unexpired reservations are counted from the Ticket table.
+
+        Returns:
+            QuerySet: The queryset annotated with unexpired_tickets_reserved
+        """
+        from uobtheatre.bookings.models import Ticket
+
+        tickets = Ticket.objects.filter(
+            booking__performance=OuterRef("performance_id"),
+            seat_group=OuterRef("seat_group_id"),
+        )
+        return self.annotate(
+            unexpired_tickets_reserved=Case(
+                When(
+                    Q(reservations_expire_at__isnull=True)
+                    | Q(reservations_expire_at__gt=timezone.now()),
+                    then=F("tickets_reserved"),
+                ),
+                default=count_subquery(tickets.reserved()),
+            )
+        )
+
+    def adjust_ticket_counts(
+        self,
+        seat_group_counts: Dict[int, int],
+        booking_status: str,
+        expires_at: Optional[datetime.datetime] = None,
+    ) -> None:
+        """Add tickets to, or remove them from, the stored ticket counts.
+
+        This should be called, in the same transaction, whenever tickets are
+        added or removed or a booking changes status. The counts are changed
+        in place, so concurrent changes don't need to lock the seat groups.
+
+        If removing tickets would make a count negative, the count has drifted
+        from the tickets. The count is kept at 0 and a warning is logged, so
+        that the counts can be corrected with reconcile_ticket_counts.
+
+        Args:
+            seat_group_counts (dict): The number of tickets added
+                (or, if negative, removed) for each seat group, keyed by the
+                id of the SeatGroup.
+            booking_status (str): The status of the booking the tickets are
+                in. Only the tickets of PAID and IN_PROGRESS bookings are
+                counted.
+            expires_at (datetime, optional): When the booking's reservation
+                expires, for an IN_PROGRESS booking.
+        """
+        count_field = {
+            Payable.Status.PAID: "tickets_sold",
+            Payable.Status.IN_PROGRESS: "tickets_reserved",
+        }.get(booking_status)
+        if count_field is None or not seat_group_counts:
+            return
+
+        seat_group_count = Case(
+            *(
+                When(seat_group_id=seat_group_id, then=Value(count))
+                for seat_group_id, count in seat_group_counts.items()
+            ),
+            default=Value(0),
+            output_field=IntegerField(),
+        )
+        if any(count < 0 for count in seat_group_counts.values()):
+            for performance_id, seat_group_id, current_count in self.filter(
+                seat_group_id__in=seat_group_counts,
+                **{f"{count_field}__lt": -seat_group_count},
+            ).values_list("performance_id", "seat_group_id", count_field):
+                logger.warning(
+                    "Removing %s from %s of %s for performance %s seat group %s "
+                    "would make it negative. The ticket counts have drifted.",
+                    -seat_group_counts[seat_group_id],
+                    count_field,
+                    current_count,
+                    performance_id,
+                    seat_group_id,
+                )
+        updates: Dict[str, Any] = {
+            count_field: Greatest(F(count_field) + seat_group_count, 0)
+        }
+        if count_field == "tickets_reserved":
+            # Once there are no reservations, none of them can expire
+            expiry_cases = [
+                When(tickets_reserved__lte=-seat_group_count, then=Value(None))
+            ]
+            if expires_at and (
+                reserved_seat_groups := [
+                    seat_group_id
+                    for seat_group_id, count in seat_group_counts.items()
+                    if count >= 0
+                ]
+            ):
+                expiry_cases.append(
+                    When(
+                        seat_group_id__in=reserved_seat_groups,
+                        then=Least(
+                            Coalesce("reservations_expire_at", Value(expires_at)),
+                            Value(expires_at),
+                        ),
+                    )
+                )
+            updates["reservations_expire_at"] = Case(
+                *expiry_cases,
+                default=F("reservations_expire_at"),
+                output_field=models.DateTimeField(),
+            )
+        self.filter(seat_group_id__in=seat_group_counts).update(**updates)
+
+    def refresh_ticket_counts(self) -> int:
+        """Recompute the stored ticket counts from the Ticket table.
+
+        The counts are kept up to date with adjust_ticket_counts, so this is
+        used to correct them in bulk, such as once expired reservations have
+        been released. The seat groups are locked first, so that concurrent
+        changes are counted once they are committed.
+
+        Returns:
+            int: The number of PerformanceSeatGroups updated
+        """
+        with transaction.atomic():
+            locked = list(
+                self.select_for_update(of=("self",))
+                .order_by("pk")
+                .values_list("pk", "performance_id")
+            )
+            # Updates don't send signals, so the performances' cached fields
+            # are invalidated here
+            invalidate_performances({performance_id for _, performance_id in locked})
+            return self.annotate_ticket_counts().update(
+                tickets_sold=F("counted_tickets_sold"),
+                tickets_reserved=F("counted_tickets_reserved"),
+                reservations_expire_at=F("counted_reservations_expire_at"),
+            )
+
+
+PerformanceSeatGroupManager = models.Manager.from_queryset(PerformanceSeatGroupQuerySet)
+
+
 class PerformanceSeatGroup(models.Model):
     """Pivot table for Performace SeatGroup relation.
 
@@ -764,6 +1219,17 @@ class PerformanceSeatGroup(models.Model):
     price = models.PositiveIntegerField()
     capacity = models.PositiveSmallIntegerField(blank=True)
 
+    # Counts of the tickets in PAID and IN_PROGRESS bookings, maintained by
+    # adjust_ticket_counts so that availability can be read without counting
+    # tickets
+    tickets_sold = models.PositiveIntegerField(default=0, editable=False)
+    tickets_reserved = models.PositiveIntegerField(default=0, editable=False)
+    # No earlier than the expiry of the first of the reserved tickets. Until
+    # then, none of the reservations counted in tickets_reserved have expired.
+    reservations_expire_at = models.DateTimeField(null=True, blank=True, editable=False)
+
+    objects = PerformanceSeatGroupManager()
+
     def save(self, *args, **kwargs):
         if self._state.adding:
             if self.capacity is None:
@@ -776,11 +1242,80 @@ class ProductionQuerySet(QuerySet):
 
     def annotate_start(self):
         """Annotate start datetime to queryset"""
-        return self.annotate(start=Min("performances__start"))
+        return self.annotate(
+            start=Subquery(
+                Performance.objects.filter(production=OuterRef("pk"))
+                .order_by(F("start").asc(nulls_last=True))
+                .values("start")[:1]
+            )
+        )
 
     def annotate_end(self):
         """Annotate end datetime to queryset"""
-        return self.annotate(end=Max("performances__end"))
+        return self.annotate(
+            end=Subquery(
+                Performance.objects.filter(production=OuterRef("pk"))
+                .order_by(F("end").desc(nulls_last=True))
+                .values("end")[:1]
+            )
+        )
+
+    def annotate_listing(self):
+        """Annotate the fields shown when listing productions.
+
+        This adds start, end, cheapest_seat_price (including single
+        discounts), capacity and tickets_sold. Each is computed with a
+        subquery, so the productions can be listed with a single query. The
+        equivalent Production methods use these annotations when present.
+
+        Returns:
+            QuerySet: The annotated queryset
+        """
+        from uobtheatre.bookings.models import Ticket
+
+        performances = Performance.objects.filter(production=OuterRef("pk"))
+        cheapest_seat_price = (
+            performances.annotate_cheapest_seat_price()
+            .order_by(F("cheapest_seat_price").asc(nulls_last=True))
+            .values("cheapest_seat_price")[:1]
+        )
+
+        # Null capacities are ignored by LEAST, matching
+        # Performance.total_capacity
+        seat_group_capacity = (
+            PerformanceSeatGroup.objects.filter(performance=OuterRef("pk"))
+            .order_by()
+            .values("performance")
+            .annotate(capacity=Sum("capacity"))
+            .values("capacity")
+        )
+        capacity = (
+            performances.annotate(
+                performance_capacity=Least(
+                    Coalesce(Subquery(seat_group_capacity), 0),
+                    F("venue__internal_capacity"),
+                    NullIf(F("capacity"), 0),
+                )
+            )
+            .order_by()
+            .values("production")
+            .annotate(capacity=Sum("performance_capacity"))
+            .values("capacity")
+        )
+
+        return (
+            self.annotate_start()
+            .annotate_end()
+            .annotate(
+                cheapest_seat_price=Subquery(cheapest_seat_price),
+                capacity=Coalesce(Subquery(capacity), 0),
+                tickets_sold=count_subquery(
+                    Ticket.objects.sold().filter(
+                        booking__performance__production=OuterRef("pk")
+                    )
+                ),
+            )
+        )
 
     def user_can_see(self, user: "User"):
         """Filter productions which the user can see
@@ -944,7 +1479,10 @@ class Production(TimeStampedMixin, PermissionableModel, AbilitiesMixin, BaseMode
         Returns:
             bool: If the booking can be booked.
         """
-        return any(performance.is_bookable for performance in self.performances.all())
+        return any(
+            performance.is_bookable
+            for performance in self.performances.with_capacity_snapshots()
+        )
 
     def end_date(self):
         """When the last Performance of the Production ends.
@@ -952,6 +1490,8 @@ class Production(TimeStampedMixin, PermissionableModel, AbilitiesMixin, BaseMode
         Returns:
             datetime: The end datatime of the Production.
         """
+        if hasattr(self, "end"):
+            return self.end
         return self.performances.all().aggregate(Max("end"))["end__max"]
 
     def start_date(self):
@@ -960,6 +1500,8 @@ class Production(TimeStampedMixin, PermissionableModel, AbilitiesMixin, BaseMode
         Returns:
             datetime: The start datatime of the Production.
         """
+        if hasattr(self, "start"):
+            return self.start
         return self.performances.all().aggregate(Min("start"))["start__min"]
 
     def min_seat_price(self) -> Optional[int]:
@@ -972,6 +1514,8 @@ class Production(TimeStampedMixin, PermissionableModel, AbilitiesMixin, BaseMode
             int, optional: The price of the cheapest seat in pennies. If no
                 SeatGroups are added to this Booking then None is returned.
         """
+        if hasattr(self, "cheapest_seat_price"):
+            return self.cheapest_seat_price
         performances = self.performances.all()
         all_min_seat_prices = [
             performance.min_seat_price() for performance in performances
@@ -1001,6 +1545,8 @@ class Production(TimeStampedMixin, PermissionableModel, AbilitiesMixin, BaseMode
     @property
     def total_capacity(self) -> int:
         """The total number of tickets which can be sold across all performances"""
+        if hasattr(self, "capacity"):
+            return self.capacity
         return sum(
             performance.total_capacity for performance in self.performances.all()
         )
@@ -1008,12 +1554,22 @@ class Production(TimeStampedMixin, PermissionableModel, AbilitiesMixin, BaseMode
     @property
     def total_tickets_sold(self) -> int:
         """The total number of tickets sold across all performances"""
+        if hasattr(self, "tickets_sold"):
+            return self.tickets_sold
         return sum(
             performance.total_tickets_sold() for performance in self.performances.all()
         )
 
-    def sales_breakdown(self, breakdowns: Optional[list[str]] = None):
-        """Generates a breakdown of the sales of this production"""
+    def sales_breakdown(self, breakdowns: Optional[list[SalesBreakdown.Enums]] = None):
+        """Generates a breakdown of the sales of this production
+
+        Once the production is closed, this is read from the daily sales
+        rollup rather than the transactions.
+        """
+        if self.status == Production.Status.CLOSED:
+            return DailySales.objects.filter(
+                performance__production=self
+            ).sales_breakdown(breakdowns)
         return self.qs.transactions().annotate_sales_breakdown(breakdowns)
 
     def validate(self) -> Optional[ValidationErrors]:
@@ -1038,3 +1594,61 @@ class Production(TimeStampedMixin, PermissionableModel, AbilitiesMixin, BaseMode
             "sales": ("change_production", "force_change_production"),
             "approve_production": ("approve_production"),
         }
+
+
+class PerformanceRefund(TimeStampedMixin, BaseModel):
+    """The progress of refunding a performance's bookings in the background
+
+    The bookings are refunded in chunks. The number of bookings refunded,
+    skipped (e.g. as they were already refunded) and failed is counted as
+    each chunk works through its bookings.
+    """
+
+    class Status(models.TextChoices):
+        PENDING = "PENDING", "Pending"
+        RUNNING = "RUNNING", "Running"
+        COMPLETE = "COMPLETE", "Complete"
+
+    performance = models.ForeignKey(
+        Performance, on_delete=models.CASCADE, related_name="refunds"
+    )
+    authorizing_user = models.ForeignKey(
+        User, on_delete=models.SET_NULL, null=True, related_name="+"
+    )
+    status = models.CharField(
+        max_length=20, choices=Status.choices, default=Status.PENDING
+    )
+    total_bookings = models.PositiveIntegerField(default=0)
+    refunded_bookings = models.PositiveIntegerField(default=0)
+    skipped_bookings = models.PositiveIntegerField(default=0)
+    failed_bookings = models.PositiveIntegerField(default=0)
+    completed_at = models.DateTimeField(null=True, blank=True)
+
+    @classmethod
+    def start(
+        cls, performance: Performance, authorizing_user: User
+    ) -> "PerformanceRefund":
+        """Starts refunding the performance's bookings in the background
+
+        Args:
+            performance (Performance): The performance to refund
+            authorizing_user (User): The user authorizing the refund
+
+        Returns:
+            PerformanceRefund: The refund
+        """
+        performance_refund = cls.objects.create(
+            performance=performance, authorizing_user=authorizing_user
+        )
+        transaction.on_commit(
+            lambda: run_performance_refund.delay(performance_refund.pk)
+        )
+        return performance_refund
+
+    @property
+    def processed_bookings(self) -> int:
+        """The number of bookings which have been refunded, skipped or failed"""
+        return self.refunded_bookings + self.skipped_bookings + self.failed_bookings
+
+    def __str__(self):
+        return f"Refund of {self.performance}"
@@ -6,6 +6,12 @@ from graphene_django import DjangoListField
 from graphene_django.filter import DjangoFilterConnectionField
 
 from uobtheatre.discounts.schema import ConcessionTypeNode
+from uobtheatre.productions.cache import performance_cache, production_cache
+from uobtheatre.productions.loaders import (
+    PerformanceMinSeatPriceLoader,
+    ProductionLoader,
+    ProductionPerformancesLoader,
+)
 from uobtheatre.productions.models import (
     CastMember,
     ContentWarning,
@@ -203,7 +209,17 @@ class ProductionNode(PermissionsMixin, AssignedUsersMixin, DjangoObjectType):
         return self.end_date()
 
     def resolve_is_bookable(self, info):
-        return self.is_bookable()
+        return production_cache.get_or_load(
+            self.pk,
+            "is_bookable",
+            lambda: ProductionPerformancesLoader.for_info(info)
+            .load(self.pk)
+            .then(
+                lambda performances: any(
+                    performance.is_bookable for performance in performances
+                )
+            ),
+        )
 
     def resolve_min_seat_price(self, info):
         return self.min_seat_price()
@@ -225,7 +241,7 @@ class ProductionNode(PermissionsMixin, AssignedUsersMixin, DjangoObjectType):
 
     @classmethod
     def get_queryset(cls, queryset, info):
-        return queryset.user_can_see(info.context.user)
+        return queryset.user_can_see(info.context.user).annotate_listing()
 
     class Meta:
         model = Production
@@ -264,11 +280,15 @@ class PerformanceSeatGroupNode(DjangoObjectType):
         ]
 
     def resolve_capacity_remaining(self, info):
-        return self.performance.seat_group_capacity_remaining(self.seat_group)
+        return self.performance.capacity_snapshot.seat_group_capacity_remaining(
+            self.seat_group_id
+        )
 
     def resolve_number_tickets_sold(self, info):
         return (
-            self.performance.total_tickets_sold(seat_group=self.seat_group)
+            self.performance.capacity_snapshot.seat_groups[
+                self.seat_group_id
+            ].tickets_sold
             if info.context.user.has_perm(
                 "view_production", self.performance.production
             )
@@ -336,14 +356,21 @@ class PerformanceNode(DjangoObjectType):
     tickets_breakdown = graphene.Field(PerformanceTicketsBreakdown, required=True)
     sales_breakdown = graphene.Field(SalesBreakdownNode)
 
+    def resolve_production(self, info):
+        return ProductionLoader.for_info(info).load(self.production_id)
+
     def resolve_ticket_options(self, info):
-        return self.performance_seat_groups.all()
+        return self.performance_seat_groups.order_by("id")
 
     def resolve_capacity_remaining(self, info):
         return self.capacity_remaining
 
     def resolve_min_seat_price(self, info):
-        return self.min_seat_price()
+        return performance_cache.get_or_load(
+            self.pk,
+            "min_seat_price",
+            lambda: PerformanceMinSeatPriceLoader.for_info(info).load(self.pk),
+        )
 
     def resolve_is_inperson(self, info):
         return True
@@ -358,12 +385,13 @@ class PerformanceNode(DjangoObjectType):
         return self.is_sold_out
 
     def resolve_tickets_breakdown(self, info):
+        capacity_snapshot = self.capacity_snapshot
         return PerformanceTicketsBreakdown(
-            self.total_capacity,
-            self.total_tickets_sold(),
+            capacity_snapshot.total_capacity,
+            capacity_snapshot.tickets_sold,
             self.total_tickets_checked_in,
             self.total_tickets_unchecked_in,
-            self.capacity_remaining,
+            capacity_snapshot.capacity_remaining,
         )
 
     def resolve_sales_breakdown(self, info):
@@ -376,11 +404,13 @@ class PerformanceNode(DjangoObjectType):
         return SalesBreakdownNode(**self.sales_breakdown())
 
     def resolve_is_bookable(self, info):
-        return self.is_bookable
+        return performance_cache.get_or_compute(
+            self.pk, "is_bookable", lambda: self.is_bookable
+        )
 
     @classmethod
     def get_queryset(cls, queryset, info):
-        return queryset.user_can_see(info.context.user)
+        return queryset.user_can_see(info.context.user).with_capacity_snapshots()
 
     class Meta:
         model = Performance
@@ -408,7 +438,7 @@ class Query(graphene.ObjectType):
         if all(arg is None for arg in args.values()):
             return None
         try:
-            qs = Production.objects.user_can_see(info.context.user)
+            qs = Production.objects.user_can_see(info.context.user).annotate_listing()
             return qs.get(**args)
         except Production.DoesNotExist:
             return None
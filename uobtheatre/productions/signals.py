@@ -1,9 +1,24 @@
+from typing import Union
+
 from django.core.exceptions import ValidationError
-from django.db.models.signals import pre_save
+from django.db.models.signals import (
+    m2m_changed,
+    post_delete,
+    post_save,
+    pre_delete,
+    pre_save,
+)
 from django.dispatch import receiver
 
+from uobtheatre.bookings.models import Booking
+from uobtheatre.discounts.models import Discount, DiscountRequirement
 from uobtheatre.payments.models import Transaction
-from uobtheatre.productions.models import Production
+from uobtheatre.productions.cache import (
+    invalidate_performances,
+    performance_cache,
+    production_cache,
+)
+from uobtheatre.productions.models import Performance, PerformanceSeatGroup, Production
 
 
 @receiver(pre_save, sender=Production)
@@ -13,18 +28,13 @@ def pre_production_save(instance: Production, **_):
 
 def check_production_status_validation(production_instance: Production):
     """Check that the production's status is valid given it's current state"""
-    old_instance = (
-        Production.objects.get(pk=production_instance.id)
-        if production_instance.id
-        and not production_instance._state.adding  # pylint: disable=protected-access
-        else None
-    )
+    old_status = production_instance.get_loaded_values("status").get("status")
 
     # If we are changing the status to closed
     if (
-        old_instance
+        old_status
         and production_instance.status == Production.Status.CLOSED
-        and not old_instance.status == Production.Status.CLOSED
+        and not old_status == Production.Status.CLOSED
     ):
         # Get number of performances that have payments that are not complete
         num_performances_with_uncomplete_payments = (
@@ -36,3 +46,58 @@ def check_production_status_validation(production_instance: Production):
             raise ValidationError(
                 "This production can't be closed because it has payments that are not yet complete"
             )
+
+
+@receiver(post_save, sender=Production)
+@receiver(post_delete, sender=Production)
+def post_production_change(instance: Production, **_):
+    production_cache.invalidate([instance.pk])
+
+
+@receiver(post_save, sender=Performance)
+@receiver(post_delete, sender=Performance)
+def post_performance_change(instance: Performance, **_):
+    performance_cache.invalidate([instance.pk])
+    production_cache.invalidate([instance.production_id])
+
+
+@receiver(post_save, sender=PerformanceSeatGroup)
+@receiver(post_delete, sender=PerformanceSeatGroup)
+@receiver(post_save, sender=Booking)
+@receiver(post_delete, sender=Booking)
+def post_performance_relation_change(
+    instance: Union[PerformanceSeatGroup, Booking], **_
+):
+    """Clear the cached fields of the performance the instance belongs to"""
+    invalidate_performances([instance.performance_id])
+
+
+@receiver(post_save, sender=Discount)
+@receiver(pre_delete, sender=Discount)
+def discount_change(instance: Discount, **_):
+    invalidate_performances(instance.performances.values_list("pk", flat=True))
+
+
+@receiver(post_save, sender=DiscountRequirement)
+@receiver(post_delete, sender=DiscountRequirement)
+def post_discount_requirement_change(instance: DiscountRequirement, **_):
+    invalidate_performances(
+        Discount.performances.through.objects.filter(
+            discount_id=instance.discount_id
+        ).values_list("performance_id", flat=True)
+    )
+
+
+@receiver(m2m_changed, sender=Discount.performances.through)
+def discount_performances_changed(instance, action: str, reverse: bool, pk_set, **_):
+    """Clear the cached fields of performances added to or removed from a discount"""
+    if action not in ("post_add", "post_remove", "pre_clear"):
+        return
+
+    if reverse:
+        # The performance's discounts have changed
+        invalidate_performances([instance.pk])
+    elif action == "pre_clear":
+        invalidate_performances(instance.performances.values_list("pk", flat=True))
+    else:
+        invalidate_performances(pk_set)
@@ -1,38 +1,205 @@
-from typing import Union
-from uuid import UUID
+import math
+from typing import Dict, List
 
+from celery import chord
+from celery.utils.log import get_task_logger
+from django.conf import settings
 from django.core.mail import mail_admins
+from django.db.models import F
+from django.utils import timezone
+from sentry_sdk import capture_exception
 
 from config.celery import app
-from uobtheatre.payments.tasks import RefundTask
+from uobtheatre.payments.sync import RateLimiter
+from uobtheatre.utils.tasks import BaseTask
 
+logger = get_task_logger(__name__)
 
-@app.task(base=RefundTask)
-def refund_performance(performance_id: int, authorizing_user_id):
+
+def chunk_bookings(booking_ids: List[int]) -> List[List[int]]:
+    """Split the bookings of a performance refund into chunks
+
+    Chunks have BULK_REFUND_CHUNK_SIZE bookings, unless this would make more
+    than BULK_REFUND_MAX_CHUNKS chunks, in which case the chunks are made
+    larger. This bounds the number of chunks refunding at once.
+
+    Args:
+        booking_ids (list of int): The bookings to refund
+
+    Returns:
+        list of list of int: The chunks of bookings
+    """
+    chunk_size = max(
+        settings.BULK_REFUND_CHUNK_SIZE,
+        math.ceil(len(booking_ids) / settings.BULK_REFUND_MAX_CHUNKS),
+    )
+    return [
+        booking_ids[start : start + chunk_size]
+        for start in range(0, len(booking_ids), chunk_size)
+    ]
+
+
+@app.task(base=BaseTask)
+def refund_performance(performance_id: int, authorizing_user_id: int):
     """Refund the performance's bookings
+
+    Deprecated: kept so that refunds queued with this signature still run.
+    Use PerformanceRefund.start (and run_performance_refund) instead.
+
     Args:
         performance_id (int): The id of the performance to refund
         authorizing_user_id (int): Id of the user authorizing the refund
-    Raises:
-        CantBeRefundedException: Raised if the performance can't be refunded
+    """
+    from uobtheatre.productions.models import PerformanceRefund
+
+    performance_refund = PerformanceRefund.objects.create(
+        performance_id=performance_id, authorizing_user_id=authorizing_user_id
+    )
+    run_performance_refund(performance_refund.pk)
+
+
+@app.task(base=BaseTask)
+def run_performance_refund(performance_refund_id: int):
+    """Refund the paid bookings of a performance
+
+    The bookings are split into chunks, which are refunded in parallel. Once
+    all of the chunks have finished, the refund is completed and a summary is
+    sent to the admins. This happens even if a chunk fails, in which case its
+    unprocessed bookings are counted as failed.
+
+    Args:
+        performance_refund_id (int): The id of the performance refund
     """
     from uobtheatre.payments.payables import Payable
-    from uobtheatre.productions.emails import performances_refunded_email
-    from uobtheatre.productions.models import Performance
-    from uobtheatre.users.models import User
+    from uobtheatre.productions.models import PerformanceRefund
 
-    performance = Performance.objects.get(pk=performance_id)
-    authorizing_user = User.objects.get(pk=authorizing_user_id)
+    performance_refund = PerformanceRefund.objects.get(pk=performance_refund_id)
+    booking_ids = list(
+        performance_refund.performance.bookings.filter(status=Payable.Status.PAID)
+        .order_by("pk")
+        .values_list("pk", flat=True)
+    )
+    performance_refund.total_bookings = len(booking_ids)
+    performance_refund.status = PerformanceRefund.Status.RUNNING
+    performance_refund.save(update_fields=["total_bookings", "status", "updated_at"])
 
-    for booking in performance.bookings.filter(status=Payable.Status.PAID):
-        booking.async_refund(authorizing_user=authorizing_user)
+    if not (chunks := chunk_bookings(booking_ids)):
+        complete_performance_refund(performance_refund_id)
+        return
 
-    mail = performances_refunded_email(
-        authorizing_user,
-        [performance],
+    # Each chunk gets an equal share of the requests per second, so that the
+    # refund as a whole is within the limit
+    requests_per_second = settings.BULK_REFUND_REQUESTS_PER_SECOND / len(chunks)
+    chord(
+        refund_booking_chunk.si(performance_refund_id, chunk, requests_per_second)
+        for chunk in chunks
+    )(
+        complete_performance_refund.si(performance_refund_id).on_error(
+            fail_performance_refund.si(performance_refund_id)
+        )
     )
+
+
+@app.task(base=BaseTask)
+def refund_booking_chunk(
+    performance_refund_id: int, booking_ids: List[int], requests_per_second: float
+) -> Dict[str, int]:
+    """Refund a chunk of a performance refund's bookings, one at a time
+
+    Bookings which can't be refunded (e.g. as they have already been
+    refunded) are skipped. A booking which fails to refund is reported, and
+    the chunk carries on with the other bookings.
+
+    Args:
+        performance_refund_id (int): The id of the performance refund
+        booking_ids (list of int): The bookings to refund
+        requests_per_second (float): The number of bookings to refund per
+            second
+
+    Returns:
+        dict: The number of bookings refunded, skipped and failed
+    """
+    from uobtheatre.bookings.models import Booking
+    from uobtheatre.productions.models import PerformanceRefund
+
+    performance_refund = PerformanceRefund.objects.select_related(
+        "authorizing_user"
+    ).get(pk=performance_refund_id)
+    rate_limiter = RateLimiter(requests_per_second)
+    counts = {"refunded": 0, "skipped": 0, "failed": 0}
+
+    for booking in (
+        Booking.objects.filter(pk__in=booking_ids)
+        .annotate_refund_eligibility()
+        .order_by("pk")
+    ):
+        if not booking.can_be_refunded:
+            outcome = "skipped"
+        else:
+            rate_limiter.wait()
+            try:
+                booking.refund(
+                    performance_refund.authorizing_user,
+                    do_async=False,
+                    send_admin_email=False,
+                )
+                outcome = "refunded"
+            except Exception as exc:  # pylint: disable=broad-except
+                logger.warning("Failed to refund %s: %s", booking, exc)
+                capture_exception(exc)
+                outcome = "failed"
+
+        counts[outcome] += 1
+        PerformanceRefund.objects.filter(pk=performance_refund_id).update(
+            **{f"{outcome}_bookings": F(f"{outcome}_bookings") + 1},
+            updated_at=timezone.now(),
+        )
+
+    return counts
+
+
+@app.task(base=BaseTask)
+def complete_performance_refund(performance_refund_id: int):
+    """Complete a performance refund, and send its summary to the admins
+
+    Args:
+        performance_refund_id (int): The id of the performance refund
+    """
+    from uobtheatre.productions.emails import performance_refunded_email
+    from uobtheatre.productions.models import PerformanceRefund
+
+    performance_refund = PerformanceRefund.objects.select_related(
+        "performance__production", "authorizing_user"
+    ).get(pk=performance_refund_id)
+    performance_refund.status = PerformanceRefund.Status.COMPLETE
+    performance_refund.completed_at = timezone.now()
+    performance_refund.save(update_fields=["status", "completed_at", "updated_at"])
+
+    mail = performance_refunded_email(performance_refund)
     mail_admins(
-        "Performance Refunds Initiated",
+        "Performance Refunds Completed",
         mail.to_plain_text(),
         html_message=mail.to_html(),
     )
+
+
+@app.task(base=BaseTask)
+def fail_performance_refund(performance_refund_id: int):
+    """Complete a performance refund, one of whose chunks has failed
+
+    The bookings which weren't refunded or skipped, including those the
+    failed chunk didn't get to, are counted as failed. The summary is then
+    sent to the admins as usual.
+
+    Args:
+        performance_refund_id (int): The id of the performance refund
+    """
+    from uobtheatre.productions.models import PerformanceRefund
+
+    PerformanceRefund.objects.filter(pk=performance_refund_id).update(
+        failed_bookings=F("total_bookings")
+        - F("refunded_bookings")
+        - F("skipped_bookings"),
+        updated_at=timezone.now(),
+    )
+    complete_performance_refund(performance_refund_id)
@@ -0,0 +1,139 @@
+"""
+Benchmarks for the production and performance queries. Run with
+`pytest -m benchmark -s` to see the query counts and timings.
+"""
+
+import pytest
+from django.core.cache import cache
+from graphql_relay.node.node import to_global_id
+
+from uobtheatre.bookings.test.factories import create_booked_performance
+from uobtheatre.productions.test.factories import PerformanceFactory, ProductionFactory
+from uobtheatre.utils.test_utils import run_benchmark
+
+PRODUCTION_LISTING_QUERY = """
+    {
+      productions {
+        edges {
+          node {
+            id
+            name
+            slug
+            start
+            end
+            isBookable
+            minSeatPrice
+            totalCapacity
+            totalTicketsSold
+            society {
+              name
+            }
+            venues {
+              name
+            }
+            performances {
+              edges {
+                node {
+                  id
+                  start
+                  isBookable
+                  soldOut
+                  minSeatPrice
+                  capacityRemaining
+                  durationMins
+                }
+              }
+            }
+          }
+        }
+      }
+    }
+"""
+
+PERFORMANCE_DETAIL_QUERY = """
+    {
+      performance(id: "%s") {
+        id
+        start
+        capacityRemaining
+        minSeatPrice
+        durationMins
+        soldOut
+        isBookable
+        production {
+          name
+          isBookable
+        }
+        venue {
+          name
+        }
+        ticketOptions {
+          capacityRemaining
+          seatGroup {
+            name
+          }
+          concessionTypes {
+            concessionType {
+              name
+            }
+            price
+          }
+        }
+      }
+    }
+"""
+
+
+def create_booked_productions(number_of_productions, performances_per_production=3):
+    """Create productions whose performances have bookings"""
+    productions = ProductionFactory.create_batch(number_of_productions)
+    for production in productions:
+        for _ in range(performances_per_production):
+            create_booked_performance(
+                PerformanceFactory(production=production, capacity=1000),
+                number_of_bookings=5,
+            )
+    return productions
+
+
+def warm_up(gql_client, query):
+    """Execute the query once, so that the content type cache is populated.
+
+    The computed field cache is then cleared, so that the benchmark measures
+    an uncached request.
+    """
+    gql_client.execute(query)
+    cache.clear()
+
+
+@pytest.mark.benchmark
+@pytest.mark.django_db
+@pytest.mark.parametrize("number_of_productions, max_queries", [(2, 26), (10, 90)])
+def test_benchmark_production_listing(gql_client, number_of_productions, max_queries):
+    create_booked_productions(number_of_productions)
+    warm_up(gql_client, PRODUCTION_LISTING_QUERY)
+
+    response = run_benchmark(
+        f"Production listing ({number_of_productions} productions)",
+        lambda: gql_client.execute(PRODUCTION_LISTING_QUERY),
+        max_queries=max_queries,
+    )
+
+    assert len(response["data"]["productions"]["edges"]) == number_of_productions
+
+
+@pytest.mark.benchmark
+@pytest.mark.django_db
+@pytest.mark.parametrize("number_of_bookings, max_queries", [(5, 34), (50, 34)])
+def test_benchmark_performance_detail(gql_client, number_of_bookings, max_queries):
+    performance = create_booked_performance(number_of_bookings=number_of_bookings)
+    query = PERFORMANCE_DETAIL_QUERY % to_global_id("PerformanceNode", performance.id)
+    warm_up(gql_client, query)
+
+    response = run_benchmark(
+        f"Performance detail ({number_of_bookings} bookings)",
+        lambda: gql_client.execute(query),
+        max_queries=max_queries,
+    )
+
+    assert len(response["data"]["performance"]["ticketOptions"]) == 3
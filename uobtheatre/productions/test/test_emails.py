@@ -4,11 +4,12 @@ import pytest
 
 from uobtheatre.mail.composer import MailComposer
 from uobtheatre.productions.emails import (
-    performances_refunded_email,
+    performance_refunded_email,
     send_production_approved_email,
     send_production_needs_changes_email,
     send_production_ready_for_review_email,
 )
+from uobtheatre.productions.models import PerformanceRefund
 from uobtheatre.productions.test.factories import PerformanceFactory, ProductionFactory
 from uobtheatre.users.test.factories import UserFactory
 
@@ -65,15 +66,33 @@ def test_send_production_needs_changes_email_with_message():
 
 
 @pytest.mark.django_db
-def test_performances_refunded_email():
-    performances = [PerformanceFactory(), PerformanceFactory()]
-    mail = performances_refunded_email(
-        UserFactory(),
-        performances,
+def test_performance_refunded_email():
+    performance_refund = PerformanceRefund.objects.create(
+        performance=PerformanceFactory(),
+        authorizing_user=UserFactory(email="admin@example.org"),
+        total_bookings=3,
+        refunded_bookings=2,
+        skipped_bookings=1,
     )
+    mail = performance_refunded_email(performance_refund)
 
     plain_text = mail.to_plain_text()
-    assert "Refund(s) have been initiated" in plain_text
+    assert "Refunds have been completed" in plain_text
+    assert str(performance_refund.performance.pk) in plain_text
+    assert (
+        "Of its 3 paid bookings, 2 were refunded, 1 were skipped (as they couldn't be refunded) and 0 failed."
+        in plain_text
+    )
+    assert "admin@example.org" in plain_text
+
+
+@pytest.mark.django_db
+def test_performance_refunded_email_without_authorizing_user():
+    performance_refund = PerformanceRefund.objects.create(
+        performance=PerformanceFactory(), authorizing_user=None
+    )
+    mail = performance_refunded_email(performance_refund)
 
-    for performance in performances:
-        assert str(performance.pk) in plain_text
+    plain_text = mail.to_plain_text()
+    assert "Of its 0 paid bookings, 0 were refunded" in plain_text
+    assert "This action was requested by" not in plain_text
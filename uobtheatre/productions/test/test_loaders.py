@@ -0,0 +1,104 @@
+import datetime
+
+import pytest
+from django.utils import timezone
+from promise import Promise
+
+from uobtheatre.bookings.test.factories import PerformanceSeatingFactory
+from uobtheatre.productions.loaders import (
+    PerformanceLoader,
+    PerformanceMinSeatPriceLoader,
+    ProductionLoader,
+    ProductionPerformancesLoader,
+)
+from uobtheatre.productions.test.factories import PerformanceFactory, ProductionFactory
+
+
+def load_all(loader, keys):
+    """Load the keys in a single batch, as they would be in a GraphQL execution"""
+    return (
+        Promise.resolve(None)
+        .then(lambda _: Promise.all([loader.load(key) for key in keys]))
+        .get()
+    )
+
+
+def create_productions():
+    """Create two productions with performances, and one without"""
+    production = ProductionFactory()
+    first_performance = PerformanceFactory(
+        production=production,
+        start=timezone.now() + datetime.timedelta(days=1),
+        end=timezone.now() + datetime.timedelta(days=1, hours=2),
+    )
+    PerformanceSeatingFactory(performance=first_performance, price=1000)
+    second_performance = PerformanceFactory(
+        production=production,
+        start=timezone.now() + datetime.timedelta(days=2),
+        end=timezone.now() + datetime.timedelta(days=2, hours=2),
+    )
+    PerformanceSeatingFactory(performance=second_performance, price=500)
+
+    other_production = PerformanceFactory().production
+    return [production, other_production, ProductionFactory()]
+
+
+@pytest.mark.django_db
+def test_production_loader(django_assert_num_queries):
+    productions = create_productions()
+
+    with django_assert_num_queries(1):
+        loaded = load_all(
+            ProductionLoader(), [production.pk for production in productions]
+        )
+        assert [production.min_seat_price() for production in loaded] == [
+            500,
+            None,
+            None,
+        ]
+    assert loaded == productions
+
+
+@pytest.mark.django_db
+def test_production_performances_loader(django_assert_num_queries):
+    productions = create_productions()
+    expected_capacities = [
+        performance.total_capacity
+        for performance in productions[0].performances.order_by("pk")
+    ]
+
+    loader = ProductionPerformancesLoader()
+    with django_assert_num_queries(2):
+        performances = load_all(loader, [production.pk for production in productions])
+        assert [
+            performance.capacity_snapshot.total_capacity
+            for performance in performances[0]
+        ] == expected_capacities
+
+    assert performances[0] == list(productions[0].performances.order_by("pk"))
+    assert performances[1] == list(productions[1].performances.all())
+    assert performances[2] == []
+
+
+@pytest.mark.django_db
+def test_performance_loaders(django_assert_num_queries):
+    productions = create_productions()
+    performances = list(productions[0].performances.all()) + [PerformanceFactory()]
+
+    expected_capacities = [
+        performance.capacity_remaining for performance in performances
+    ]
+
+    with django_assert_num_queries(2):
+        loaded = load_all(
+            PerformanceLoader(), [performance.pk for performance in performances]
+        )
+        assert [
+            performance.capacity_remaining for performance in loaded
+        ] == expected_capacities
+    assert loaded == performances
+
+    assert load_all(
+        PerformanceMinSeatPriceLoader(),
+        [performance.pk for performance in performances],
+    ) == [performance.min_seat_price() for performance in performances]
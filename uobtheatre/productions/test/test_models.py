@@ -10,7 +10,7 @@ from django.utils import timezone
 from guardian.shortcuts import assign_perm
 from pytest_django.asserts import assertQuerysetEqual
 
-from uobtheatre.bookings.models import Ticket
+from uobtheatre.bookings.models import Booking, Ticket
 from uobtheatre.bookings.test.factories import (
     BookingFactory,
     PerformanceSeatingFactory,
@@ -32,7 +32,14 @@ from uobtheatre.productions.exceptions import (
     InvalidSeatGroupException,
     NotEnoughCapacityException,
 )
-from uobtheatre.productions.models import Performance, PerformanceSeatGroup, Production
+from uobtheatre.productions.models import (
+    Performance,
+    PerformanceCapacitySnapshot,
+    PerformanceRefund,
+    PerformanceSeatGroup,
+    Production,
+    SeatGroupCapacitySnapshot,
+)
 from uobtheatre.productions.test.factories import (
     CastMemberFactory,
     ContentWarningFactory,
@@ -295,6 +302,92 @@ def test_production_total_tickets_sold():
     assert perf_1.production.total_tickets_sold == 3
 
 
+@pytest.mark.django_db
+def test_production_annotate_listing(django_assert_num_queries):
+    production = ProductionFactory()
+    limited_performance = PerformanceFactory(
+        production=production,
+        capacity=100,
+        venue=VenueFactory(internal_capacity=1000),
+        start=timezone.now() + timedelta(days=1),
+        end=timezone.now() + timedelta(days=1, hours=2),
+    )
+    PerformanceSeatingFactory(performance=limited_performance, capacity=500, price=30)
+    PerformanceSeatingFactory(performance=limited_performance, capacity=20, price=10)
+    venue_limited_performance = PerformanceFactory(
+        production=production,
+        capacity=0,
+        venue=VenueFactory(internal_capacity=40),
+        start=timezone.now() + timedelta(days=2),
+        end=timezone.now() + timedelta(days=2, hours=2),
+    )
+    PerformanceSeatingFactory(
+        performance=venue_limited_performance, capacity=50, price=20
+    )
+    PerformanceFactory(
+        production=production,
+        venue=None,
+        start=timezone.now() + timedelta(days=1, hours=1),
+        end=timezone.now() + timedelta(days=1, hours=3),
+    )
+
+    single_discount = DiscountFactory(percentage=0.27)
+    DiscountRequirementFactory(discount=single_discount, number=1)
+    single_discount.performances.set([limited_performance])
+
+    TicketFactory(booking=BookingFactory(performance=limited_performance))
+    TicketFactory(booking=BookingFactory(performance=venue_limited_performance))
+    TicketFactory(
+        booking=BookingFactory(
+            performance=limited_performance, status=Payable.Status.IN_PROGRESS
+        )
+    )
+
+    empty_production = ProductionFactory()
+
+    with django_assert_num_queries(1):
+        annotated = {
+            annotated_production.pk: annotated_production
+            for annotated_production in Production.objects.annotate_listing()
+        }
+        assert [
+            (
+                annotated_production.start_date(),
+                annotated_production.end_date(),
+                annotated_production.min_seat_price(),
+                annotated_production.total_capacity,
+                annotated_production.total_tickets_sold,
+            )
+            for annotated_production in annotated.values()
+        ] == [
+            (
+                limited_performance.start,
+                venue_limited_performance.end,
+                8,
+                140,
+                2,
+            ),
+            (None, None, None, 0, 0),
+        ]
+
+    # The annotations match the non-annotated methods
+    for unannotated_production in [production, empty_production]:
+        annotated_production = annotated[unannotated_production.pk]
+        assert annotated_production.start_date() == unannotated_production.start_date()
+        assert annotated_production.end_date() == unannotated_production.end_date()
+        assert (
+            annotated_production.min_seat_price()
+            == unannotated_production.min_seat_price()
+        )
+        assert (
+            annotated_production.total_capacity == unannotated_production.total_capacity
+        )
+        assert (
+            annotated_production.total_tickets_sold
+            == unannotated_production.total_tickets_sold
+        )
+
+
 @pytest.mark.django_db
 def test_production_validate():
     production = ProductionFactory()
@@ -563,91 +656,149 @@ def test_performance_total_capacity(
     assert performance.total_capacity == expected
 
 
-@pytest.mark.django_db
 @pytest.mark.parametrize(
-    "total_performance_capacity,seat_groups_capacities_remaining,sold_tickets,expected",
+    "performance_capacity,venue_capacity,seat_groups,expected",
     [
-        (
-            100,
-            [50, 20],
-            2,
-            70,  # Note that it is seat group capacities __remaining__
-        ),
-        (
-            100,
-            [50, 20],
-            40,
-            60,  # Now the performance becomes the dominating factor
-        ),
-        (
-            100,
-            [50, 207],
-            2,
-            98,
-        ),
-        (
-            100,
-            [],
-            1,
-            0,
-        ),
+        (100, None, [(50, 0), (20, 0)], 70),
+        (60, None, [(50, 10), (20, 0)], 50),  # The performance dominates
+        (None, 30, [(50, 0), (20, 0)], 30),  # The venue dominates
+        (None, None, [(50, 45), (20, 0)], 25),
+        (100, 100, [], 0),
     ],
 )
-def test_performance_capacity_remaining(
-    total_performance_capacity, seat_groups_capacities_remaining, sold_tickets, expected
+def test_performance_capacity_snapshot_capacity_remaining(
+    performance_capacity, venue_capacity, seat_groups, expected
 ):
-    performance = PerformanceFactory()
-    for _ in seat_groups_capacities_remaining:
-        PerformanceSeatingFactory(performance=performance)
+    snapshot = PerformanceCapacitySnapshot(
+        performance_capacity=performance_capacity,
+        venue_capacity=venue_capacity,
+        tickets_sold_or_reserved=sum(sold for _, sold in seat_groups),
+        seat_groups={
+            i: SeatGroupCapacitySnapshot(
+                capacity=capacity, tickets_sold_or_reserved=sold
+            )
+            for i, (capacity, sold) in enumerate(seat_groups)
+        },
+    )
 
-    with patch(
-        "uobtheatre.productions.models.Performance.total_capacity",
-        new_callable=PropertyMock(return_value=total_performance_capacity),
-    ), patch.object(
-        performance,
-        "seat_group_capacity_remaining",
-        side_effect=seat_groups_capacities_remaining,
-    ), patch.object(
-        performance, "total_tickets_sold_or_reserved", return_value=sold_tickets
-    ):
-        assert performance.capacity_remaining == expected
+    assert snapshot.capacity_remaining == expected
+    assert snapshot.is_sold_out == (expected == 0)
 
 
-@pytest.mark.django_db
 @pytest.mark.parametrize(
-    "total_performance_capacity,total_sold_tickets,total_seat_group_capacity,seat_group_sold_tickets,expected",
+    "performance_capacity,total_sold_tickets,seat_group_capacity,seat_group_sold_tickets,expected",
     [
         (100, 10, 50, 5, 45),
         (100, 10, 207, 5, 90),
         (100, 10, 207, 127, 80),
     ],
 )
-def test_performance_seat_group_capacity_remaining(
-    total_performance_capacity,
+def test_performance_capacity_snapshot_seat_group_capacity_remaining(
+    performance_capacity,
     total_sold_tickets,
-    total_seat_group_capacity,
+    seat_group_capacity,
     seat_group_sold_tickets,
     expected,
 ):
-    performance = PerformanceFactory()
-    seat_group = PerformanceSeatingFactory().seat_group
-    with patch(
-        "uobtheatre.productions.models.Performance.total_capacity",
-        new_callable=PropertyMock(return_value=total_performance_capacity),
-    ), patch.object(
-        performance,
-        "total_seat_group_capacity",
-        return_value=total_seat_group_capacity,
-    ) as total_seat_group_capacity_mock, patch.object(
-        performance,
-        "total_tickets_sold_or_reserved",
-        side_effect=lambda seat_group=None: (
-            seat_group_sold_tickets if seat_group else total_sold_tickets
-        ),
-    ) as total_tickets_sold_or_reserved_mock:
-        assert performance.seat_group_capacity_remaining(seat_group) == expected
-        total_seat_group_capacity_mock.assert_called_once_with(seat_group=seat_group)
-        total_tickets_sold_or_reserved_mock.assert_any_call(seat_group=seat_group)
+    snapshot = PerformanceCapacitySnapshot(
+        performance_capacity=performance_capacity,
+        tickets_sold_or_reserved=total_sold_tickets,
+        seat_groups={
+            1: SeatGroupCapacitySnapshot(
+                capacity=seat_group_capacity,
+                tickets_sold_or_reserved=seat_group_sold_tickets,
+            ),
+            2: SeatGroupCapacitySnapshot(capacity=1000),
+        },
+    )
+
+    assert snapshot.seat_group_capacity_remaining(1) == expected
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize("exact", [False, True])
+def test_performance_capacity_snapshots(exact):
+    performance = PerformanceFactory(
+        capacity=None, venue=VenueFactory(internal_capacity=100)
+    )
+    seat_group_1 = PerformanceSeatingFactory(performance=performance, capacity=50)
+    seat_group_2 = PerformanceSeatingFactory(performance=performance, capacity=20)
+    empty_performance = PerformanceFactory()
+
+    paid_booking = BookingFactory(performance=performance, status=Payable.Status.PAID)
+    reserved_booking = BookingFactory(
+        performance=performance, status=Payable.Status.IN_PROGRESS
+    )
+    expired_booking = BookingFactory(
+        performance=performance,
+        status=Payable.Status.IN_PROGRESS,
+        expires_at=timezone.now() - timedelta(minutes=20),
+    )
+    cancelled_booking = BookingFactory(
+        performance=performance, status=Payable.Status.CANCELLED
+    )
+    for booking, seat_group in [
+        (paid_booking, seat_group_1),
+        (paid_booking, seat_group_1),
+        (paid_booking, seat_group_2),
+        (reserved_booking, seat_group_2),
+        (expired_booking, seat_group_2),
+        (cancelled_booking, seat_group_1),
+    ]:
+        TicketFactory(booking=booking, seat_group=seat_group.seat_group)
+
+    snapshots = Performance.objects.filter(
+        pk__in=[performance.pk, empty_performance.pk]
+    ).capacity_snapshots(exact=exact)
+
+    assert snapshots[performance.pk] == PerformanceCapacitySnapshot(
+        performance_capacity=None,
+        venue_capacity=100,
+        tickets_sold=3,
+        tickets_sold_or_reserved=4,
+        seat_groups={
+            seat_group_1.seat_group.pk: SeatGroupCapacitySnapshot(
+                capacity=50, tickets_sold=2, tickets_sold_or_reserved=2
+            ),
+            seat_group_2.seat_group.pk: SeatGroupCapacitySnapshot(
+                capacity=20,
+                tickets_sold=1,
+                tickets_sold_or_reserved=2,
+            ),
+        },
+    )
+    assert snapshots[empty_performance.pk] == PerformanceCapacitySnapshot()
+
+    # The performance's properties use the stored counts
+    assert performance.capacity_remaining == 66
+    assert performance.seat_group_capacity_remaining(seat_group_2.seat_group) == 18
+    assert empty_performance.capacity_remaining == 0
+
+
+@pytest.mark.django_db
+def test_performance_with_capacity_snapshots(django_assert_num_queries):
+    performances = [PerformanceFactory(), PerformanceFactory()]
+    for performance in performances:
+        PerformanceSeatingFactory(performance=performance, capacity=10)
+        PerformanceSeatingFactory(performance=performance, capacity=10)
+        TicketFactory(
+            booking=BookingFactory(performance=performance),
+            seat_group=performance.performance_seat_groups.first().seat_group,
+        )
+    expected = {
+        performance.pk: performance.capacity_remaining for performance in performances
+    }
+
+    # One query for the performances, and one for all of their snapshots
+    with django_assert_num_queries(2):
+        loaded_performances = list(
+            Performance.objects.filter(pk__in=expected.keys()).with_capacity_snapshots()
+        )
+        assert {
+            performance.pk: performance.capacity_remaining
+            for performance in loaded_performances
+        } == expected
+        assert not any(performance.is_sold_out for performance in loaded_performances)
 
 
 @pytest.mark.django_db
@@ -707,6 +858,38 @@ def test_performance_min_price_with_single_discounts():
     assert performance.min_seat_price() == 8
 
 
+@pytest.mark.django_db
+def test_performance_annotate_cheapest_seat_price():
+    performance = PerformanceFactory()
+    PerformanceSeatingFactory(performance=performance, price=30)
+    PerformanceSeatingFactory(performance=performance, price=10)
+
+    free_performance = PerformanceFactory()
+    PerformanceSeatingFactory(performance=free_performance, price=0)
+
+    no_seats_performance = PerformanceFactory()
+
+    single_discount = DiscountFactory(percentage=0.27)
+    DiscountRequirementFactory(discount=single_discount, number=1)
+    group_discount = DiscountFactory(percentage=0.5)
+    DiscountRequirementFactory(discount=group_discount, number=2)
+    single_discount.performances.set([performance, free_performance])
+    group_discount.performances.set([performance])
+
+    prices = dict(
+        Performance.objects.annotate_cheapest_seat_price().values_list(
+            "pk", "cheapest_seat_price"
+        )
+    )
+
+    assert prices == {
+        performance.pk: 8,
+        free_performance.pk: 0,
+        no_seats_performance.pk: None,
+    }
+    assert prices[performance.pk] == performance.min_seat_price()
+
+
 @pytest.mark.django_db
 @pytest.mark.parametrize(
     "seat_groups, performance_capacity, is_valid",
@@ -1250,6 +1433,27 @@ def test_sales_breakdown_with_blank_fees():
     }
 
 
+@pytest.mark.django_db
+def test_closed_production_sales_breakdown_uses_daily_sales():
+    production = ProductionFactory()
+    performance = PerformanceFactory(production=production)
+    booking = BookingFactory(performance=performance)
+    TransactionFactory(pay_object=booking, value=600, app_fee=200, provider_fee=4)
+    TransactionFactory(pay_object=booking, value=200, provider_name=Cash.name)
+    open_production_breakdown = production.sales_breakdown()
+    open_performance_breakdown = performance.sales_breakdown()
+
+    production.status = Production.Status.CLOSED
+    production.save()
+
+    with patch(
+        "uobtheatre.payments.models.TransactionQuerySet.annotate_sales_breakdown"
+    ) as mock_transactions_breakdown:
+        assert production.sales_breakdown() == open_production_breakdown
+        assert performance.sales_breakdown() == open_performance_breakdown
+    mock_transactions_breakdown.assert_not_called()
+
+
 @pytest.mark.django_db
 def test_performance_validate():
     performance = PerformanceFactory()
@@ -1279,19 +1483,43 @@ def test_performance_validate_without_possible_tickets():
     "disabled,fails",
     [(False, True), (True, False)],
 )
-def test_performance_refund_bookings(disabled, fails):
+def test_performance_refund_bookings(
+    disabled, fails, django_capture_on_commit_callbacks
+):
     performance = PerformanceFactory(id=1, disabled=disabled)
     user = UserFactory(id=123)
 
     with patch(
-        "uobtheatre.productions.tasks.refund_performance.delay",
-    ) as refund_task_mock:
+        "uobtheatre.productions.tasks.run_performance_refund.delay",
+    ) as refund_task_mock, django_capture_on_commit_callbacks(execute=True):
         if fails:
             with pytest.raises(CantBeRefundedException):
                 performance.refund_bookings(user)
         else:
-            performance.refund_bookings(user)
-            refund_task_mock.assert_called_once_with(1, 123)
+            performance_refund = performance.refund_bookings(user)
+
+    if fails:
+        refund_task_mock.assert_not_called()
+        assert not PerformanceRefund.objects.exists()
+    else:
+        refund_task_mock.assert_called_once_with(performance_refund.pk)
+        assert performance_refund.performance == performance
+        assert performance_refund.authorizing_user == user
+        assert performance_refund.status == PerformanceRefund.Status.PENDING
+
+
+@pytest.mark.django_db
+def test_performance_refund_str():
+    performance = PerformanceFactory(
+        production=ProductionFactory(name="TRASH"),
+        start=parser.parse("2020-12-27T11:17:43Z"),
+    )
+    performance_refund = PerformanceRefund.objects.create(performance=performance)
+
+    assert (
+        str(performance_refund)
+        == "Refund of Performance of TRASH at 11:17 on 27/12/2020"
+    )
 
 
 @pytest.mark.django_db
@@ -1393,3 +1621,106 @@ def test_performances_booked_users():
         [booking_1.user, booking_2.user],
         ordered=False,
     )
+
+
+@pytest.mark.django_db
+def test_performance_seat_group_refresh_ticket_counts():
+    performance = PerformanceFactory()
+    psg = PerformanceSeatingFactory(performance=performance)
+    other_psg = PerformanceSeatingFactory(performance=performance)
+    for status in [
+        Payable.Status.PAID,
+        Payable.Status.PAID,
+        Payable.Status.IN_PROGRESS,
+        Payable.Status.CANCELLED,
+    ]:
+        TicketFactory(
+            booking=BookingFactory(performance=performance, status=status),
+            seat_group=psg.seat_group,
+        )
+    PerformanceSeatGroup.objects.update(tickets_sold=10, tickets_reserved=10)
+
+    assert PerformanceSeatGroup.objects.filter(pk=psg.pk).refresh_ticket_counts() == 1
+
+    psg.refresh_from_db()
+    other_psg.refresh_from_db()
+    assert (psg.tickets_sold, psg.tickets_reserved) == (2, 1)
+    assert (
+        psg.reservations_expire_at
+        == Booking.objects.get(status=Payable.Status.IN_PROGRESS).expires_at
+    )
+    assert (other_psg.tickets_sold, other_psg.tickets_reserved) == (10, 10)
+
+
+@pytest.mark.django_db
+def test_performance_seat_group_adjust_ticket_counts():
+    psg = PerformanceSeatingFactory()
+    other_psg = PerformanceSeatingFactory(performance=psg.performance)
+    seat_groups = PerformanceSeatGroup.objects.filter(performance=psg.performance)
+    expires_at = timezone.now() + timedelta(minutes=10)
+
+    seat_groups.adjust_ticket_counts(
+        {psg.seat_group_id: 2, other_psg.seat_group_id: 1},
+        Payable.Status.IN_PROGRESS,
+        expires_at,
+    )
+    seat_groups.adjust_ticket_counts(
+        {psg.seat_group_id: 1},
+        Payable.Status.IN_PROGRESS,
+        expires_at + timedelta(minutes=5),
+    )
+    seat_groups.adjust_ticket_counts({psg.seat_group_id: 3}, Payable.Status.PAID)
+    seat_groups.adjust_ticket_counts(
+        {other_psg.seat_group_id: -1}, Payable.Status.IN_PROGRESS
+    )
+    seat_groups.adjust_ticket_counts({psg.seat_group_id: 5}, Payable.Status.CANCELLED)
+
+    psg.refresh_from_db()
+    other_psg.refresh_from_db()
+    assert (psg.tickets_sold, psg.tickets_reserved) == (3, 3)
+    assert psg.reservations_expire_at == expires_at
+    assert (other_psg.tickets_sold, other_psg.tickets_reserved) == (0, 0)
+    assert other_psg.reservations_expire_at is None
+
+
+@pytest.mark.django_db
+def test_performance_seat_group_adjust_ticket_counts_warns_of_drift(caplog):
+    psg = PerformanceSeatingFactory()
+    other_psg = PerformanceSeatingFactory(performance=psg.performance)
+    PerformanceSeatGroup.objects.update(tickets_sold=1)
+
+    PerformanceSeatGroup.objects.adjust_ticket_counts(
+        {psg.seat_group_id: -2, other_psg.seat_group_id: -1}, Payable.Status.PAID
+    )
+
+    assert [record.getMessage() for record in caplog.records] == [
+        f"Removing 2 from tickets_sold of 1 for performance {psg.performance_id} "
+        f"seat group {psg.seat_group_id} would make it negative. "
+        "The ticket counts have drifted."
+    ]
+    assert list(
+        PerformanceSeatGroup.objects.order_by("pk").values_list(
+            "tickets_sold", flat=True
+        )
+    ) == [0, 0]
+
+
+@pytest.mark.django_db
+def test_performance_capacity_snapshots_count_reservations_which_may_have_expired():
+    psg = PerformanceSeatingFactory(capacity=10)
+    TicketFactory(
+        booking=BookingFactory(
+            performance=psg.performance, status=Payable.Status.IN_PROGRESS
+        ),
+        seat_group=psg.seat_group,
+    )
+    performances = Performance.objects.filter(pk=psg.performance_id)
+
+    # Until one of the reservations may have expired, the stored count is used
+    PerformanceSeatGroup.objects.update(tickets_reserved=5)
+    snapshot = performances.capacity_snapshots()[psg.performance_id]
+    assert snapshot.tickets_sold_or_reserved == 5
+
+    PerformanceSeatGroup.objects.update(reservations_expire_at=timezone.now())
+    snapshot = performances.capacity_snapshots()[psg.performance_id]
+    assert snapshot.tickets_sold_or_reserved == 1
@@ -4,6 +4,9 @@ import math
 
 import pytest
 import pytz
+from django.core.cache import cache
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
 from django.utils import timezone
 from graphql_relay.node.node import from_global_id, to_global_id
 from guardian.shortcuts import assign_perm
@@ -817,6 +820,59 @@ def test_production_venues(gql_client):
     }
 
 
+@pytest.mark.django_db
+def test_productions_computed_fields_are_batched(gql_client):
+    def create_productions(number):
+        for _ in range(number):
+            production = ProductionFactory()
+            for _ in range(2):
+                performance = PerformanceFactory(production=production)
+                PerformanceSeatingFactory(performance=performance)
+                TicketFactory(booking=BookingFactory(performance=performance))
+
+    request = """
+        {
+          productions {
+            edges {
+              node {
+                start
+                end
+                isBookable
+                minSeatPrice
+                totalCapacity
+                totalTicketsSold
+              }
+            }
+          }
+          performances {
+            edges {
+              node {
+                minSeatPrice
+                isBookable
+                production {
+                  start
+                }
+              }
+            }
+          }
+        }
+    """
+
+    def count_queries():
+        cache.clear()
+        with CaptureQueriesContext(connection) as context:
+            response = gql_client.execute(request)
+        assert "errors" not in response
+        return len(context.captured_queries)
+
+    create_productions(1)
+    count_queries()  # Populate Django's content type cache
+    queries_for_one_production = count_queries()
+    create_productions(4)
+
+    assert count_queries() == queries_for_one_production
+
+
 ###
 # Performance Queries
 ###
@@ -1,10 +1,20 @@
 import pytest
 from django.core.exceptions import ValidationError
 
-from uobtheatre.bookings.test.factories import BookingFactory
+from uobtheatre.bookings.test.factories import (
+    BookingFactory,
+    PerformanceSeatingFactory,
+    TicketFactory,
+)
+from uobtheatre.discounts.test.factories import (
+    DiscountFactory,
+    DiscountRequirementFactory,
+)
 from uobtheatre.payments.models import Transaction
 from uobtheatre.payments.test.factories import TransactionFactory
-from uobtheatre.productions.models import Production
+from uobtheatre.productions.cache import performance_cache, production_cache
+from uobtheatre.productions.models import PerformanceSeatGroup, Production
+from uobtheatre.productions.test.factories import PerformanceFactory
 
 
 @pytest.mark.django_db
@@ -35,3 +45,119 @@ def test_production_pre_save_closed_signal(with_pending_payment):
             set_to_closed()
     else:
         set_to_closed()
+
+
+def cache_production_and_performance(performance):
+    production_cache.get_or_compute(performance.production_id, "field", lambda: "old")
+    performance_cache.get_or_compute(performance.pk, "field", lambda: "old")
+
+
+def assert_production_and_performance_invalidated(performance):
+    """Assert the cached fields of the performance and its production were cleared"""
+    assert (
+        production_cache.get_or_compute(
+            performance.production_id, "field", lambda: "new"
+        )
+        == "new"
+    )
+    assert (
+        performance_cache.get_or_compute(performance.pk, "field", lambda: "new")
+        == "new"
+    )
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize(
+    "change",
+    [
+        lambda performance: performance.save(update_fields=["description"]),
+        lambda performance: PerformanceSeatingFactory(performance=performance),
+        lambda performance: BookingFactory(performance=performance),
+        lambda performance: DiscountFactory().performances.set([performance]),
+        lambda performance: performance.discounts.add(DiscountFactory()),
+        lambda performance: performance.discounts.first().delete(),
+        lambda performance: performance.discounts.first().performances.clear(),
+        lambda performance: DiscountRequirementFactory(
+            discount=performance.discounts.first()
+        ),
+    ],
+)
+def test_changes_invalidate_cached_fields(change, django_capture_on_commit_callbacks):
+    performance = PerformanceFactory()
+    DiscountFactory().performances.add(performance)
+    cache_production_and_performance(performance)
+
+    with django_capture_on_commit_callbacks(execute=True):
+        change(performance)
+        # The fields are only invalidated once the change is committed
+        assert (
+            performance_cache.get_or_compute(performance.pk, "field", lambda: "new")
+            == "old"
+        )
+
+    assert_production_and_performance_invalidated(performance)
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize(
+    "change",
+    [
+        lambda booking, psg: booking.reserve_tickets([], booking.tickets.all()),
+        lambda booking, psg: TicketFactory(booking=booking, seat_group=psg.seat_group),
+        lambda booking, psg: PerformanceSeatGroup.objects.filter(
+            pk=psg.pk
+        ).refresh_ticket_counts(),
+    ],
+)
+def test_ticket_count_changes_invalidate_cached_fields(
+    change, django_capture_on_commit_callbacks
+):
+    psg = PerformanceSeatingFactory()
+    booking = BookingFactory(performance=psg.performance)
+    TicketFactory(booking=booking, seat_group=psg.seat_group)
+    cache_production_and_performance(psg.performance)
+
+    with django_capture_on_commit_callbacks(execute=True):
+        change(booking, psg)
+
+    assert_production_and_performance_invalidated(psg.performance)
+
+
+@pytest.mark.django_db
+def test_production_change_invalidates_cached_fields(
+    django_capture_on_commit_callbacks,
+):
+    performance = PerformanceFactory()
+    other_performance = PerformanceFactory()
+    cache_production_and_performance(performance)
+    cache_production_and_performance(other_performance)
+
+    with django_capture_on_commit_callbacks(execute=True):
+        performance.production.save()
+
+    assert (
+        production_cache.get_or_compute(
+            performance.production_id, "field", lambda: "new"
+        )
+        == "new"
+    )
+    assert (
+        production_cache.get_or_compute(
+            other_performance.production_id, "field", lambda: "new"
+        )
+        == "old"
+    )
+    assert (
+        performance_cache.get_or_compute(performance.pk, "field", lambda: "new")
+        == "old"
+    )
+
+
+@pytest.mark.django_db
+def test_production_pre_save_doesnt_look_up_old_production(django_assert_num_queries):
+    production = Production.objects.get(pk=PerformanceFactory().production.pk)
+    production.name = "New name"
+
+    # Only the slug's uniqueness check, and the update of the production
+    with django_assert_num_queries(2):
+        production.save()
@@ -3,23 +3,192 @@ from unittest.mock import patch
 import pytest
 
 from uobtheatre.bookings.test.factories import BookingFactory
-from uobtheatre.productions.tasks import refund_performance
+from uobtheatre.payments.models import Transaction
+from uobtheatre.payments.payables import Payable
+from uobtheatre.payments.test.factories import TransactionFactory
+from uobtheatre.productions.models import PerformanceRefund
+from uobtheatre.productions.tasks import (
+    chunk_bookings,
+    complete_performance_refund,
+    fail_performance_refund,
+    refund_booking_chunk,
+    refund_performance,
+    run_performance_refund,
+)
 from uobtheatre.productions.test.factories import PerformanceFactory
 from uobtheatre.users.test.factories import UserFactory
 
 
+def create_performance_refund(**kwargs):
+    return PerformanceRefund.objects.create(
+        performance=kwargs.pop("performance", None) or PerformanceFactory(),
+        authorizing_user=UserFactory(),
+        **kwargs,
+    )
+
+
+@pytest.mark.parametrize(
+    "number_of_bookings, chunk_sizes",
+    [
+        (0, []),
+        (1, [1]),
+        (3, [2, 1]),
+        (5, [2, 2, 1]),
+        (9, [3, 3, 3]),
+        (10, [4, 4, 2]),
+    ],
+)
+def test_chunk_bookings(settings, number_of_bookings, chunk_sizes):
+    settings.BULK_REFUND_CHUNK_SIZE = 2
+    settings.BULK_REFUND_MAX_CHUNKS = 3
+
+    chunks = chunk_bookings(list(range(number_of_bookings)))
+
+    assert [len(chunk) for chunk in chunks] == chunk_sizes
+    assert sum(chunks, []) == list(range(number_of_bookings))
+
+
 @pytest.mark.django_db
-def test_refund_performance_task(mailoutbox):
-    performance = PerformanceFactory()
-    booking = BookingFactory(performance=performance)
+def test_run_performance_refund_task(settings):
+    settings.BULK_REFUND_CHUNK_SIZE = 2
+    settings.BULK_REFUND_REQUESTS_PER_SECOND = 10
+    performance_refund = create_performance_refund()
+    bookings = [
+        BookingFactory(performance=performance_refund.performance) for _ in range(3)
+    ]
+    BookingFactory(
+        performance=performance_refund.performance, status=Payable.Status.CANCELLED
+    )
     BookingFactory()
-    auth_user = UserFactory()
+
+    with patch("uobtheatre.productions.tasks.chord") as chord_mock:
+        run_performance_refund(performance_refund.pk)
+
+    header, callback = chord_mock.call_args.args[0], chord_mock.return_value.call_args
+    assert [chunk.args for chunk in header] == [
+        (performance_refund.pk, [bookings[0].pk, bookings[1].pk], 5),
+        (performance_refund.pk, [bookings[2].pk], 5),
+    ]
+    assert callback.args[0].args == (performance_refund.pk,)
+    # The refund is still completed if a chunk fails
+    assert [errback.args for errback in callback.args[0].options["link_error"]] == [
+        (performance_refund.pk,)
+    ]
+    assert (
+        callback.args[0].options["link_error"][0].task == fail_performance_refund.name
+    )
+
+    performance_refund.refresh_from_db()
+    assert performance_refund.status == PerformanceRefund.Status.RUNNING
+    assert performance_refund.total_bookings == 3
+
+
+@pytest.mark.django_db
+def test_run_performance_refund_task_without_bookings(mailoutbox):
+    performance_refund = create_performance_refund()
+
+    with patch("uobtheatre.productions.tasks.chord") as chord_mock:
+        run_performance_refund(performance_refund.pk)
+
+    chord_mock.assert_not_called()
+    performance_refund.refresh_from_db()
+    assert performance_refund.status == PerformanceRefund.Status.COMPLETE
+    assert len(mailoutbox) == 1
+
+
+@pytest.mark.django_db
+def test_refund_performance_task():
+    performance = PerformanceFactory()
+    user = UserFactory()
 
     with patch(
-        "uobtheatre.bookings.models.Booking.async_refund", autospec=True
-    ) as refund_mock:
-        refund_performance(performance.pk, auth_user.pk)
+        "uobtheatre.productions.tasks.run_performance_refund"
+    ) as run_refund_mock:
+        refund_performance(performance.pk, user.pk)
+
+    performance_refund = PerformanceRefund.objects.get()
+    assert performance_refund.performance == performance
+    assert performance_refund.authorizing_user == user
+    run_refund_mock.assert_called_once_with(performance_refund.pk)
+
+
+@pytest.mark.django_db
+def test_refund_booking_chunk_task():
+    performance_refund = create_performance_refund(total_bookings=4)
+    refundable = BookingFactory(performance=performance_refund.performance)
+    TransactionFactory(pay_object=refundable)
+    failing = BookingFactory(performance=performance_refund.performance)
+    TransactionFactory(pay_object=failing, value=123)
+    locked = BookingFactory(performance=performance_refund.performance)
+    TransactionFactory(pay_object=locked, status=Transaction.Status.PENDING)
+    no_payments = BookingFactory(performance=performance_refund.performance)
+
+    def refund(payment):
+        if payment.value == 123:
+            raise ValueError("Refund failed")
+
+    with patch.object(
+        Transaction, "refund", autospec=True, side_effect=refund
+    ) as refund_mock, patch(
+        "uobtheatre.productions.tasks.capture_exception"
+    ) as capture_mock:
+        counts = refund_booking_chunk(
+            performance_refund.pk,
+            [booking.pk for booking in [refundable, failing, locked, no_payments]],
+            1000,
+        )
+
+    assert counts == {"refunded": 1, "skipped": 2, "failed": 1}
+    assert [call.args[0].pay_object for call in refund_mock.call_args_list] == [
+        refundable,
+        failing,
+    ]
+    capture_mock.assert_called_once()
+
+    performance_refund.refresh_from_db()
+    assert performance_refund.refunded_bookings == 1
+    assert performance_refund.skipped_bookings == 2
+    assert performance_refund.failed_bookings == 1
+    assert performance_refund.processed_bookings == 4
+
+
+@pytest.mark.django_db
+def test_complete_performance_refund_task(mailoutbox):
+    performance_refund = create_performance_refund(
+        status=PerformanceRefund.Status.RUNNING,
+        total_bookings=4,
+        refunded_bookings=2,
+        skipped_bookings=1,
+        failed_bookings=1,
+    )
+
+    complete_performance_refund(performance_refund.pk)
+
+    performance_refund.refresh_from_db()
+    assert performance_refund.status == PerformanceRefund.Status.COMPLETE
+    assert performance_refund.completed_at is not None
+    assert len(mailoutbox) == 1
+    assert mailoutbox[0].subject == "[UOBTheatre] Performance Refunds Completed"
+    assert "2 were refunded, 1 were skipped" in mailoutbox[0].body
+
+
+@pytest.mark.django_db
+def test_fail_performance_refund_task(mailoutbox):
+    performance_refund = create_performance_refund(
+        status=PerformanceRefund.Status.RUNNING,
+        total_bookings=10,
+        refunded_bookings=4,
+        skipped_bookings=1,
+        failed_bookings=1,
+    )
+
+    fail_performance_refund(performance_refund.pk)
 
-    refund_mock.assert_called_once_with(booking, authorizing_user=auth_user)
+    # The bookings the failed chunk didn't process are counted as failed
+    performance_refund.refresh_from_db()
+    assert performance_refund.status == PerformanceRefund.Status.COMPLETE
+    assert performance_refund.failed_bookings == 5
+    assert performance_refund.processed_bookings == 10
     assert len(mailoutbox) == 1
-    assert mailoutbox[0].subject == "[UOBTheatre] Performance Refunds Initiated"
+    assert "4 were refunded, 1 were skipped" in mailoutbox[0].body
+    assert "and 5 failed" in mailoutbox[0].body
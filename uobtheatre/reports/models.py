@@ -1,4 +1,17 @@
-from django.db import models
+import hashlib
+import json
+import uuid
+from typing import TYPE_CHECKING, List
+
+from django.db import models, transaction
+from django.db.models.query import QuerySet
+
+from uobtheatre.reports.tasks import generate_report
+from uobtheatre.users.models import User
+from uobtheatre.utils.models import BaseModel, TimeStampedMixin
+
+if TYPE_CHECKING:
+    from uobtheatre.reports.reports import Report
 
 
 class Reports(models.Model):
@@ -12,3 +25,114 @@ class Reports(models.Model):
         # and "view" default permissions
 
         permissions = (("finance_reports", "Finance Reports"),)
+
+
+class ReportJobQuerySet(QuerySet):
+    """The query set for report jobs"""
+
+    def reusable(self, key: str, data_version: str):
+        """Completed jobs with the key, generated from the same version of the
+        data, whose file can be reused"""
+        return self.filter(
+            key=key, data_version=data_version, status=ReportJob.Status.COMPLETE
+        ).exclude(file="")
+
+
+def report_job_upload_to(job: "ReportJob", filename: str) -> str:
+    """Stores each job's file in its own, unguessable, directory"""
+    return f"reports/{job.pk}/{filename}"
+
+
+class ReportJob(TimeStampedMixin, BaseModel):
+    """A report generated in the background, and the file it was exported to
+
+    Jobs by the same user, for the same report, format and options share a
+    key. A completed job is reused by later requests with the same key, until
+    the data the report is generated from changes. Jobs aren't shared between
+    users, as the exported file names the user who generated it.
+    """
+
+    class Status(models.TextChoices):
+        PENDING = "PENDING", "Pending"
+        RUNNING = "RUNNING", "Running"
+        COMPLETE = "COMPLETE", "Complete"
+        FAILED = "FAILED", "Failed"
+
+    class Format(models.TextChoices):
+        XLSX = "XLSX", "Excel"
+        CSV = "CSV", "CSV"
+
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name="+")
+    report_name = models.CharField(max_length=255)
+    options = models.JSONField(default=list)
+    file_format = models.CharField(
+        max_length=10, choices=Format.choices, default=Format.XLSX
+    )
+    key = models.CharField(max_length=64, db_index=True)
+    data_version = models.CharField(max_length=64, blank=True)
+    status = models.CharField(
+        max_length=20, choices=Status.choices, default=Status.PENDING
+    )
+    file = models.FileField(upload_to=report_job_upload_to, null=True, blank=True)
+
+    objects = ReportJobQuerySet.as_manager()
+
+    @staticmethod
+    def get_key(user: User, report_name: str, file_format: str, options: List) -> str:
+        """Gets the key shared by the user's jobs for the same report, format
+        and options"""
+        options = sorted(options, key=lambda option: option["name"])
+        return hashlib.sha256(
+            json.dumps(
+                [str(user.pk), report_name, file_format, options], default=str
+            ).encode()
+        ).hexdigest()
+
+    @classmethod
+    def start(
+        cls, user: User, report_name: str, file_format: str, options: List
+    ) -> "ReportJob":
+        """Starts a job to generate the report in the background
+
+        If the user has already generated the same report, with the same format
+        and options, from the current version of the data, its file is reused and
+        the job is completed straight away.
+
+        Args:
+            user (User): The user generating the report
+            report_name (str): The name of the report
+            file_format (str): The format to export the report to
+            options (list): The options of the report
+
+        Returns:
+            ReportJob: The job
+        """
+        job = cls(
+            user=user,
+            report_name=report_name,
+            file_format=file_format,
+            options=options,
+            key=cls.get_key(user, report_name, file_format, options),
+        )
+        reusable_job = (
+            cls.objects.reusable(job.key, job.get_report().get_data_version())
+            .order_by("-created_at")
+            .first()
+        )
+        if reusable_job:
+            job.data_version = reusable_job.data_version
+            job.file = reusable_job.file.name
+            job.status = cls.Status.COMPLETE
+            job.save()
+            return job
+
+        job.save()
+        transaction.on_commit(lambda: generate_report.delay(str(job.pk)))
+        return job
+
+    def get_report(self) -> "Report":
+        """Gets the report the job generates"""
+        from uobtheatre.reports.schema import available_reports
+
+        return available_reports[self.report_name]["cls"](self.options)  # type: ignore
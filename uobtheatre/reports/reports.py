@@ -1,16 +1,25 @@
 import abc
+import hashlib
+import json
 from abc import ABC
 from dataclasses import dataclass, field
-from typing import Dict, List, Optional, Union
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple, Union
 
+from django.contrib.contenttypes.models import ContentType
+from django.db.models import Case, Count, Max, OuterRef, QuerySet, Subquery, Sum, When
+from django.db.models.functions import Coalesce
 from graphql_relay.node.node import from_global_id
 
-from uobtheatre.bookings.models import Booking
-from uobtheatre.payments.models import Transaction
+from uobtheatre.bookings.models import Booking, Ticket
+from uobtheatre.discounts.models import ConcessionType
+from uobtheatre.payments.models import DailySales, SalesBreakdown, Transaction
 from uobtheatre.payments.payables import Payable
 from uobtheatre.productions.models import Performance, Production
+from uobtheatre.societies.models import Society
 from uobtheatre.users.models import User
 from uobtheatre.utils.exceptions import AuthorizationException, GQLException
+from uobtheatre.utils.models import TimeStampedMixin
+from uobtheatre.venues.models import SeatGroup
 
 
 def get_option(options: List[Dict[str, str]], name: str, default=None):
@@ -34,26 +43,76 @@ class MetaItem:
 
 @dataclass
 class DataSet:
-    """A data set represents a table, with headers and rows of data"""
+    """A data set represents a table, with headers and rows of data
+
+    The rows are indexed by their first column, so that a row can be found by
+    its first column without scanning the data. Rows should therefore be
+    added with `add_row`, rather than by appending to the data.
+
+    The headings of the columns holding amounts of money (in pence) are listed
+    in `currency_columns`, so that they can be formatted when exported.
+    """
 
     name: str
     headings: List[str]
     data: List[List[str]] = field(default_factory=list)
+    currency_columns: List[str] = field(default_factory=list)
+    _rows_by_first_column: Dict[Any, List] = field(
+        default_factory=dict, init=False, repr=False, compare=False
+    )
+
+    def __post_init__(self):
+        for row in self.data:
+            self._index_row(row)
+
+    def _index_row(self, row):
+        if row:
+            self._rows_by_first_column.setdefault(row[0], row)
 
     def add_row(self, data):
         self.data.append(data)
+        self._index_row(data)
 
     def find_or_create_row_by_first_column(self, value, default_row_data):
-        row = next((row for row in self.data if row[0] == value), None)
+        row = self._rows_by_first_column.get(value)
         if not row:
             row = default_row_data
             self.add_row(row)
         return row
 
 
+@dataclass
+class StreamedDataSet(DataSet):
+    """A data set whose rows are generated as it is exported
+
+    The rows are not held in memory, so a large data set can be exported in
+    constant memory. They can therefore only be read once, and rows can't be
+    added to (or found in) the data set.
+    """
+
+    data: Iterable[List] = field(default_factory=list)  # type: ignore
+
+    def __post_init__(self):
+        pass
+
+    def add_row(self, data):
+        raise TypeError("Rows can't be added to a streamed data set")
+
+
 class Report(ABC):
     """An abstract class for a generic report"""
 
+    # The title and usage notes included when the report is exported
+    title: Optional[str] = None
+    descriptions: List[str] = []
+
+    # The models the report is generated from. A report generated earlier with
+    # the same options is reused until one of these models is changed.
+    data_models: tuple = (Transaction, Booking, Performance, Production)
+    # The fields the report outputs of those data models without an
+    # updated_at. Only these (and the primary keys) are fingerprinted.
+    data_fields: Dict[type, Tuple[str, ...]] = {}
+
     def __init__(self, options: Optional[list] = None):
         self.datasets: list[DataSet] = []
         self.meta: list[MetaItem] = []
@@ -74,6 +133,45 @@ class Report(ABC):
     def get_meta_array(self):
         return [[meta.name, meta.value] for meta in self.meta]
 
+    def get_export_meta(self):
+        """Gets the meta included when the report is exported"""
+        return self.get_meta_array()
+
+    def get_data_queryset(self, model) -> QuerySet:
+        """Gets the rows of one of the report's data models that the report is
+        generated from"""
+        return model.objects.all()
+
+    def get_data_version(self) -> str:
+        """Gets a fingerprint of the data the report is generated from
+
+        The fingerprint is made from the number of rows, and when a row was
+        last updated, for each of the report's data models. Models without an
+        updated_at are fingerprinted by the primary keys and data_fields of
+        their rows instead, so their querysets should be kept small. The
+        fingerprint therefore changes whenever a row is added or deleted, or
+        a row is changed in a way the report could show.
+
+        Returns:
+            str: The fingerprint of the data
+        """
+        state = []
+        for model in self.data_models:
+            queryset = self.get_data_queryset(model).order_by()
+            if issubclass(model, TimeStampedMixin):
+                state.append(
+                    queryset.aggregate(count=Count("pk"), updated_at=Max("updated_at"))
+                )
+            else:
+                state.append(
+                    list(
+                        queryset.distinct()
+                        .order_by("pk")
+                        .values_list("pk", *self.data_fields.get(model, ()))
+                    )
+                )
+        return hashlib.sha256(json.dumps(state, default=str).encode()).hexdigest()
+
     @staticmethod
     def authorize_user(user: User, options: List):
         raise NotImplementedError()
@@ -97,99 +195,85 @@ class TimeScopedReport(Report):
 class PeriodTotalsBreakdown(TimeScopedReport):
     """Generates a report on payments made via specified providers over a given time period"""
 
+    title = "Period Totals Report"
+    descriptions = [
+        "This report provides summaries and totals of payments taken and recorded.",
+        "Totals are calcualted by summing the payments (which are positive in the case of a charge, or negative for a refund).",
+        "Totals are the amount collected, without any costs and fees that are charged to the society or the payment deducted. Hence, these figures should not be used to calculate account transfers to societies.",
+        "All currency is PENCE (i.e. 100 = £1.00)",
+    ]
+
+    def get_export_meta(self):
+        return [
+            ["Period From", str(self.get_option("start_time"))],
+            ["Period To", str(self.get_option("end_time"))],
+        ] + super().get_export_meta()
+
     def run(self):
         start = self.get_option("start_time")
         end = self.get_option("end_time")
-        production_totals_set = DataSet(
-            "Production Totals",
-            ["Production ID", "Production Name", "Total Income (Pence)"],
-        )
-
-        provider_totals_set = DataSet(
-            "Provider Totals", ["Provider Name", "Total Income (Pence)"]
-        )
 
         payments = Transaction.objects.filter(
             created_at__gt=start,
             status=Transaction.Status.COMPLETED,
             created_at__lt=end,
-        ).prefetch_related("pay_object__performance__production__society")
-
-        # Resync any payments that dont have provider fees
-        payments.missing_provider_fee().sync()  # type: ignore
-
-        self.meta.append(MetaItem("No. of Payments", str(len(payments))))
-        self.meta.append(
-            MetaItem("Total Income", str(sum(payment.value for payment in payments)))
         )
 
-        for payment in payments:
-            # Handle production
-            row = production_totals_set.find_or_create_row_by_first_column(
-                (
-                    payment.pay_object.performance.production.id
-                    if payment.pay_object
-                    else ""
-                ),
-                [
-                    (
-                        payment.pay_object.performance.production.id
-                        if payment.pay_object
-                        else ""
-                    ),
-                    (
-                        payment.pay_object.performance.production.name
-                        if payment.pay_object
-                        else ""
-                    ),
-                    0,
-                ],
+        totals = payments.aggregate(
+            number_of_payments=Count("pk"), total_income=Coalesce(Sum("value"), 0)
+        )
+        self.meta.append(MetaItem("No. of Payments", str(totals["number_of_payments"])))
+        self.meta.append(MetaItem("Total Income", str(totals["total_income"])))
+        self.meta.append(
+            MetaItem(
+                "Pending Provider Fees",
+                str(payments.pending_provider_fee().count()),  # type: ignore
             )
-            row[2] += payment.value
+        )
 
-            # Handle Provider
-            row = provider_totals_set.find_or_create_row_by_first_column(
-                payment.provider_name,
-                [
-                    payment.provider_name,
-                    0,
-                ],
-            )
-            row[1] += payment.value
+        provider_totals_set = DataSet(
+            "Provider Totals",
+            ["Provider Name", "Total Income (Pence)"],
+            [
+                list(row)
+                for row in payments.order_by("provider_name")
+                .values("provider_name")
+                .annotate(total=Sum("value"))
+                .values_list("provider_name", "total")
+            ],
+            currency_columns=["Total Income (Pence)"],
+        )
 
-        # Sort alphabetically
-        provider_totals_set.data.sort(key=lambda provider: provider[0])
-        production_totals_set.data.sort(key=lambda production: production[0])
-        payments_data = [
+        production_totals_set = DataSet(
+            "Production Totals",
+            ["Production ID", "Production Name", "Total Income (Pence)"],
             [
-                str(payment.id),
-                payment.created_at.strftime("%Y-%m-%d %H:%M:%S"),
-                payment.type,
-                str(payment.pay_object.id) if payment.pay_object else "",
-                type(payment.pay_object).__name__ if payment.pay_object else "",
-                str(
-                    payment.pay_object.performance.production.id
-                    if isinstance(payment.pay_object, Booking)
-                    else ""
-                ),
-                str(
-                    payment.pay_object.performance.production.name
-                    if isinstance(payment.pay_object, Booking)
-                    else ""
-                ),
-                str(payment.value),
-                str(payment.provider_name),
-                str(payment.provider_transaction_id or ""),
-            ]
-            for payment in payments
-        ]
-        payments_data.sort(key=lambda payment: payment[1])
+                list(row)
+                for row in Booking.objects.filter(transactions__in=payments)
+                .order_by("performance__production_id")
+                .values("performance__production_id", "performance__production__name")
+                .annotate(total=Sum("transactions__value"))
+                .values_list(
+                    "performance__production_id",
+                    "performance__production__name",
+                    "total",
+                )
+            ],
+            currency_columns=["Total Income (Pence)"],
+        )
+        # Payments which aren't for a booking have no production. They are
+        # totalled separately, so that the production totals add up to the
+        # total income.
+        if unmatched_total := totals["total_income"] - sum(
+            int(row[2]) for row in production_totals_set.data
+        ):
+            production_totals_set.add_row(["", "No Production", unmatched_total])
 
         self.datasets.extend(
             [
                 provider_totals_set,
                 production_totals_set,
-                DataSet(
+                StreamedDataSet(
                     "Payments",
                     [
                         "Payment ID",
@@ -203,11 +287,71 @@ class PeriodTotalsBreakdown(TimeScopedReport):
                         "Provider",
                         "Provider ID",
                     ],
-                    payments_data,
+                    self.get_payments_rows(payments),
+                    currency_columns=["Payment Value"],
                 ),
             ]
         )
 
+    @staticmethod
+    def get_payments_rows(payments) -> Iterator[List]:
+        """Yields a row for each of the payments, as they are read from the
+        database
+
+        Args:
+            payments (QuerySet): The payments to list
+
+        Yields:
+            list: The row for the payment
+        """
+        booking_content_type = ContentType.objects.get_for_model(Booking)
+        bookings = Booking.objects.filter(pk=OuterRef("pay_object_id"))
+        payment_values = (
+            payments.annotate(
+                production_id=Case(
+                    When(
+                        pay_object_type=booking_content_type,
+                        then=Subquery(bookings.values("performance__production_id")),
+                    )
+                ),
+                production_name=Case(
+                    When(
+                        pay_object_type=booking_content_type,
+                        then=Subquery(bookings.values("performance__production__name")),
+                    )
+                ),
+            )
+            .order_by("created_at")
+            .values(
+                "id",
+                "created_at",
+                "type",
+                "pay_object_id",
+                "pay_object_type_id",
+                "production_id",
+                "production_name",
+                "value",
+                "provider_name",
+                "provider_transaction_id",
+            )
+        )
+        for payment in payment_values.iterator():
+            yield [
+                str(payment["id"]),
+                payment["created_at"].strftime("%Y-%m-%d %H:%M:%S"),
+                payment["type"],
+                str(payment["pay_object_id"]),
+                # Content types are cached, so this doesn't query per payment
+                ContentType.objects.get_for_id(payment["pay_object_type_id"])
+                .model_class()
+                .__name__,
+                str(payment["production_id"] or ""),
+                str(payment["production_name"] or ""),
+                payment["value"],
+                str(payment["provider_name"]),
+                str(payment["provider_transaction_id"] or ""),
+            ]
+
     @staticmethod
     def authorize_user(user: User, options: List):
         if not user.has_perm("reports.finance_reports"):
@@ -217,6 +361,17 @@ class PeriodTotalsBreakdown(TimeScopedReport):
 class OutstandingSocietyPayments(Report):
     """Generates a report on outstanding balances to be paid to societies"""
 
+    title = "Outstanding Society Payments"
+    descriptions = [
+        "This report details the production income at the time the report is generated.",
+        "Once the payment has been made, this MUST be recorded on the system in order to remove the balance.",
+        "If the balance for a certain production shows negative, this is because this society owes the STA money. Please do not action negative balances.",
+        "The balance that should be transferred to a production's society is indicated in the 'Society Payment Due' column.",
+        "All currency is PENCE (i.e. 100 = £1.00)",
+    ]
+
+    data_models = (Transaction, Booking, Performance, Production, Society)
+
     def run(self):
         productions_dataset = DataSet(
             "Productions",
@@ -235,6 +390,17 @@ class OutstandingSocietyPayments(Report):
                 "STA Fees",
                 "Society Net Income",
             ],
+            currency_columns=[
+                "Total Payments",
+                "Total Payments via Card",
+                "Total Refunds",
+                "Total Refunds via Card",
+                "Net Transactions",
+                "Net Transactions via Card",
+                "Processing Fees",
+                "STA Fees",
+                "Society Net Income",
+            ],
         )
 
         societies_dataset = DataSet(
@@ -244,25 +410,31 @@ class OutstandingSocietyPayments(Report):
                 "Society Name",
                 "Total Amount Due",
             ],
+            currency_columns=["Total Amount Due"],
         )
 
         # Get productions that are marked closed
         productions = Production.objects.filter(
             status=Production.Status.CLOSED
-        ).prefetch_related("society")
+        ).select_related("society")
 
-        # Sync all payments associated with these productions
-        productions.transactions().missing_provider_fee().sync()  # type: ignore
+        # Compute the sales breakdown of every closed production at once, from
+        # the daily sales rollup
+        sales_breakdowns = DailySales.objects.filter(
+            performance__production__in=productions
+        ).sales_breakdowns_by("performance__production")
+        no_sales = {breakdown.key: 0 for breakdown in SalesBreakdown.Enums}
 
         sta_total_due = 0
 
         for production in productions:
-            sales_breakdown = production.sales_breakdown()
+            if production.society is None:
+                raise GQLException(f"Production {production.id} has no society")
+
+            sales_breakdown = sales_breakdowns.get(production.id, no_sales)
             production_sta_fees = sales_breakdown["app_payment_value"]
             sta_total_due += production_sta_fees
 
-            if production.society is None:
-                raise GQLException(f"Production {production.id} has no society")
             productions_dataset.find_or_create_row_by_first_column(
                 production.id,
                 [
@@ -299,6 +471,12 @@ class OutstandingSocietyPayments(Report):
                 str(sum(int(row[2]) for row in societies_dataset.data)),
             )
         )
+        self.meta.append(
+            MetaItem(
+                "Pending Provider Fees",
+                str(productions.transactions().pending_provider_fee().count()),  # type: ignore
+            )
+        )
 
         self.datasets.append(societies_dataset)
         self.datasets.append(productions_dataset)
@@ -312,6 +490,47 @@ class OutstandingSocietyPayments(Report):
 class PerformanceBookings(Report):
     """Generates a report with the bookings for a production"""
 
+    title = "Performance Bookings"
+    descriptions = [
+        "This report provides details of the bookings for the specified performance",
+    ]
+
+    data_models = (
+        Transaction,
+        Booking,
+        Ticket,
+        User,
+        SeatGroup,
+        ConcessionType,
+        Performance,
+        Production,
+    )
+    data_fields = {
+        Ticket: ("booking_id", "seat_group_id", "concession_type_id"),
+        User: ("first_name", "last_name", "email"),
+        SeatGroup: ("name",),
+        ConcessionType: ("name",),
+    }
+
+    def get_data_queryset(self, model) -> QuerySet:
+        performance_id = from_global_id(self.get_option("id"))[1]
+        return {
+            Transaction: Transaction.objects.filter(
+                booking__performance_id=performance_id
+            ),
+            Booking: Booking.objects.filter(performance_id=performance_id),
+            Ticket: Ticket.objects.filter(booking__performance_id=performance_id),
+            User: User.objects.filter(bookings__performance_id=performance_id),
+            SeatGroup: SeatGroup.objects.filter(
+                tickets__booking__performance_id=performance_id
+            ),
+            ConcessionType: ConcessionType.objects.filter(
+                seat_bookings__booking__performance_id=performance_id
+            ),
+            Performance: Performance.objects.filter(pk=performance_id),
+            Production: Production.objects.filter(performances=performance_id),
+        }[model]
+
     def run(self):
         performance = Performance.objects.get(
             pk=from_global_id(self.get_option("id"))[1]
@@ -319,13 +538,14 @@ class PerformanceBookings(Report):
         bookings_dataset = DataSet(
             "Bookings",
             ["ID", "Reference", "Name", "Email", "Tickets", "Total Paid (Pence)"],
+            currency_columns=["Total Paid (Pence)"],
         )
 
         self.meta.append(MetaItem("Performance", str(performance)))
         for booking in (
             performance.bookings.filter(status=Payable.Status.PAID)
+            .annotate_sales_breakdown([SalesBreakdown.Enums.TOTAL_PAYMENTS])
             .prefetch_related(
-                "transactions",
                 "user",
                 "tickets__seat_group",
                 "tickets__concession_type",
@@ -339,7 +559,7 @@ class PerformanceBookings(Report):
                     str(booking.user),
                     booking.user.email,
                     "\r\n".join([str(ticket) for ticket in booking.tickets.all()]),
-                    str(booking.sales_breakdown.total_payments),
+                    booking.sales_breakdown.total_payments,
                 ]
             )
 
@@ -4,10 +4,13 @@ import graphene
 from django.conf import settings
 from django.urls import reverse
 from django.urls.exceptions import NoReverseMatch
+from graphene import relay
 from graphene.types.datetime import DateTime
 from graphene.types.scalars import String
+from graphene_django import DjangoObjectType
 
 from uobtheatre.reports import reports
+from uobtheatre.reports.models import ReportJob
 from uobtheatre.reports.utils import generate_report_download_signature
 from uobtheatre.utils.exceptions import GQLException, SafeMutation
 from uobtheatre.utils.schema import AuthRequiredMixin
@@ -28,6 +31,11 @@ available_reports = {
 }
 
 
+ReportFormatEnum = graphene.Enum(
+    "ReportFormat", [(value, value) for value in ReportJob.Format.values]
+)
+
+
 class ReportOption(graphene.InputObjectType):
     name = graphene.String(required=True)
     value = graphene.String(required=True)
@@ -49,24 +57,73 @@ class ReportNode(graphene.ObjectType):
     meta = graphene.List(MetaItemNode)
 
 
+class ReportJobNode(DjangoObjectType):
+    """A report being generated in the background"""
+
+    file_format = graphene.Field(ReportFormatEnum, required=True)
+    download_uri = graphene.String()
+
+    def resolve_download_uri(self, info):
+        if self.status != ReportJob.Status.COMPLETE:
+            return None
+        signature = generate_report_download_signature(
+            info.context.user, "ReportJob", [{"name": "id", "value": str(self.pk)}]
+        )
+        return (
+            settings.BASE_URL
+            + reverse("report_job", args=(self.pk,))
+            + "?signature="
+            + signature
+        )
+
+    @classmethod
+    def get_queryset(cls, queryset, info):
+        """Get the queryset for a group of report job nodes"""
+        if not info.context.user.is_authenticated:
+            return queryset.none()
+        return queryset.filter(user=info.context.user)
+
+    class Meta:
+        model = ReportJob
+        fields = (
+            "id",
+            "report_name",
+            "file_format",
+            "status",
+            "created_at",
+            "updated_at",
+        )
+        interfaces = (relay.Node,)
+
+
 class GenerateReport(AuthRequiredMixin, SafeMutation):
-    """Mutation to generate a report"""
+    """Mutation to generate a report
+
+    By default, the report can be downloaded straight away from the download
+    URI. When run in the background, a job is started instead, which can be
+    polled until its file is ready to download.
+    """
 
     class Arguments:
         name = graphene.String(required=True)
         start_time = graphene.DateTime()
         end_time = graphene.DateTime()
         options = graphene.List(ReportOption)
+        file_format = graphene.Argument(ReportFormatEnum)
+        run_in_background = graphene.Boolean()
 
     download_uri = graphene.String()
     report = graphene.Field(ReportNode)
+    job = graphene.Field(ReportJobNode)
 
     def resolve_report(self, _):
+        if not self.report:
+            return None
         self.report.run()
         return self.report
 
     @classmethod
-    def resolve_mutation(
+    def resolve_mutation(  # pylint: disable=too-many-arguments,too-many-positional-arguments
         cls,
         _,
         info,
@@ -74,6 +131,8 @@ class GenerateReport(AuthRequiredMixin, SafeMutation):
         start_time: Optional[DateTime] = None,
         end_time: Optional[DateTime] = None,
         options: Optional[List] = None,
+        file_format: str = ReportJob.Format.XLSX,
+        run_in_background: bool = False,
     ):
         if not name in available_reports:
             raise GQLException(
@@ -105,6 +164,11 @@ class GenerateReport(AuthRequiredMixin, SafeMutation):
         matching_report["cls"].validate_options(options)  # type: ignore
         matching_report["cls"].authorize_user(info.context.user, options)  # type: ignore
 
+        if run_in_background:
+            return GenerateReport(
+                job=ReportJob.start(info.context.user, name, file_format, options)
+            )
+
         # Generate signature to authorize user to access
         signature = generate_report_download_signature(info.context.user, name, options)
         try:
@@ -117,11 +181,19 @@ class GenerateReport(AuthRequiredMixin, SafeMutation):
                 str(matching_report["uri"]),
             )
 
+        download_uri = settings.BASE_URL + download_uri + "?signature=" + signature
+        if file_format == ReportJob.Format.CSV:
+            download_uri += "&format=csv"
+
         return GenerateReport(
-            download_uri=settings.BASE_URL + download_uri + "?signature=" + signature,
+            download_uri=download_uri,
             report=matching_report["cls"](options),  # type: ignore
         )
 
 
+class Query(graphene.ObjectType):
+    report_job = relay.Node.Field(ReportJobNode)
+
+
 class Mutation(graphene.ObjectType):
     generate_report = GenerateReport.Field()
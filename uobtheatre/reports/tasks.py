@@ -0,0 +1,31 @@
+from config.celery import app
+from uobtheatre.reports.utils import get_report_exporter
+from uobtheatre.utils.tasks import BaseTask
+
+
+@app.task(base=BaseTask)
+def generate_report(job_id: str):
+    """Run a report job's report, and store the file it is exported to"""
+    from uobtheatre.reports.models import ReportJob
+
+    job = ReportJob.objects.get(pk=job_id)
+    job.status = ReportJob.Status.RUNNING
+    job.save(update_fields=["status", "updated_at"])
+
+    try:
+        report = job.get_report()
+        # The version is taken before the report is run, so that any changes
+        # made while it runs cause it to be regenerated next time
+        job.data_version = report.get_data_version()
+        exported_file = get_report_exporter(
+            report, job.file_format, job.user
+        ).get_file()
+        with exported_file:
+            job.file.save(exported_file.name, exported_file, save=False)
+    except Exception:
+        job.status = ReportJob.Status.FAILED
+        job.save(update_fields=["status", "updated_at"])
+        raise
+
+    job.status = ReportJob.Status.COMPLETE
+    job.save()
@@ -0,0 +1,242 @@
+"""
+Benchmarks for report generation. Run with `pytest -m benchmark -s` to see the
+query counts and timings.
+"""
+
+import time
+from datetime import timedelta
+from urllib.parse import urlsplit
+
+import pytest
+from django.utils import timezone
+from graphql_relay.node.node import to_global_id
+from guardian.shortcuts import assign_perm
+
+from uobtheatre.bookings.test.factories import BookingFactory, create_booked_performance
+from uobtheatre.payments import transaction_providers
+from uobtheatre.payments.models import Transaction
+from uobtheatre.payments.test.factories import TransactionFactory
+from uobtheatre.productions.models import Production
+from uobtheatre.productions.test.factories import PerformanceFactory
+from uobtheatre.reports.reports import DataSet, PeriodTotalsBreakdown, Report
+from uobtheatre.reports.utils import ExcelReport
+from uobtheatre.utils.test_utils import run_benchmark
+
+
+def generate_and_download_report(gql_client, client, request):
+    """Generate a report's download link with the mutation, then download it"""
+    response = gql_client.execute(request)
+    download_uri = urlsplit(response["data"]["generateReport"]["downloadUri"])
+    return client.get(f"{download_uri.path}?{download_uri.query}")
+
+
+def create_paid_performance(number_of_bookings):
+    """Create a booked performance where each booking has a synced payment"""
+    performance = create_booked_performance(number_of_bookings=number_of_bookings)
+    for booking in performance.bookings.all():
+        TransactionFactory(
+            pay_object=booking,
+            value=booking.total,
+            provider_fee=booking.total // 50,
+            app_fee=booking.total // 20,
+        )
+    return performance
+
+
+@pytest.mark.benchmark
+@pytest.mark.django_db
+@pytest.mark.parametrize(
+    "report_name, number_of_performances, max_queries",
+    [
+        ("PeriodTotals", 1, 15),
+        ("PeriodTotals", 5, 15),
+        ("OutstandingPayments", 1, 10),
+        ("OutstandingPayments", 5, 10),
+    ],
+)
+def test_benchmark_generate_finance_report(
+    gql_client, client, report_name, number_of_performances, max_queries
+):
+    for _ in range(number_of_performances):
+        create_paid_performance(number_of_bookings=10)
+    # Close the productions, so that they're in the outstanding payments
+    Production.objects.update(status=Production.Status.CLOSED)
+    request = """
+        mutation {
+          generateReport(name: "%s", startTime: "2000-01-01T00:00:00+00:00", endTime: "2100-01-01T00:00:00+00:00") {
+            downloadUri
+          }
+        }
+    """ % (
+        report_name
+    )
+    gql_client.login()
+    assign_perm("reports.finance_reports", gql_client.user)
+
+    response = run_benchmark(
+        f"{report_name} report ({number_of_performances} performances)",
+        lambda: generate_and_download_report(gql_client, client, request),
+        max_queries=max_queries,
+    )
+
+    assert response.status_code == 200
+
+
+@pytest.mark.benchmark
+@pytest.mark.django_db
+@pytest.mark.parametrize(
+    "number_of_bookings, max_queries",
+    [(10, 21), (100, 21)],
+)
+def test_benchmark_generate_performance_bookings_report(
+    gql_client, client, number_of_bookings, max_queries
+):
+    performance = create_booked_performance(
+        PerformanceFactory(capacity=1000), number_of_bookings=number_of_bookings
+    )
+    request = """
+        mutation {
+          generateReport(name: "PerformanceBookings", options: [{name: "id", value: "%s"}]) {
+            downloadUri
+          }
+        }
+    """ % to_global_id(
+        "PerformanceNode", performance.id
+    )
+    gql_client.login()
+    assign_perm("change_production", gql_client.user, performance.production)
+
+    response = run_benchmark(
+        f"PerformanceBookings report ({number_of_bookings} bookings)",
+        lambda: generate_and_download_report(gql_client, client, request),
+        max_queries=max_queries,
+    )
+
+    assert response.status_code == 200
+
+
+def find_or_create_row_by_scanning(dataset, value, default_row_data):
+    """The original implementation, which scans every row of the data set"""
+    row = next((row for row in dataset.data if row[0] == value), None)
+    if not row:
+        row = default_row_data
+        dataset.add_row(row)
+    return row
+
+
+def group_rows(find_or_create_row, number_of_rows):
+    """Group payments into rows, as the period totals report does"""
+    dataset = DataSet("Production Totals", ["Production ID", "Total"])
+    start = time.perf_counter()
+    for i in range(number_of_rows * 2):
+        row = find_or_create_row(dataset, i % number_of_rows, [i % number_of_rows, 0])
+        row[1] += 100
+    return dataset, time.perf_counter() - start
+
+
+@pytest.mark.benchmark
+@pytest.mark.parametrize("number_of_rows", [100, 1000, 5000])
+def test_benchmark_dataset_grouping(number_of_rows):
+    scanned_dataset, scanning_time = group_rows(
+        find_or_create_row_by_scanning, number_of_rows
+    )
+    indexed_dataset, indexed_time = group_rows(
+        DataSet.find_or_create_row_by_first_column, number_of_rows
+    )
+
+    print(
+        f"\n{number_of_rows} rows: scanning {scanning_time * 1000:.1f}ms, "
+        f"indexed {indexed_time * 1000:.1f}ms"
+    )
+    assert indexed_dataset.data == scanned_dataset.data
+
+
+@pytest.mark.benchmark
+@pytest.mark.django_db
+@pytest.mark.parametrize("number_of_payments", [100, 1000, 5000])
+def test_benchmark_period_totals_report(number_of_payments):
+    bookings = [BookingFactory(performance=PerformanceFactory()) for _ in range(20)]
+    Transaction.objects.bulk_create(
+        Transaction(
+            pay_object=bookings[i % len(bookings)],
+            value=1000,
+            provider_fee=20,
+            provider_name=transaction_providers.SquareOnline.name,
+        )
+        for i in range(number_of_payments)
+    )
+    report = PeriodTotalsBreakdown(
+        [
+            {"name": "start_time", "value": timezone.now() - timedelta(days=1)},
+            {"name": "end_time", "value": timezone.now() + timedelta(days=1)},
+        ]
+    )
+
+    run_benchmark(
+        f"PeriodTotals report ({number_of_payments} payments)",
+        report.run,
+        max_queries=10,
+    )
+
+    production_totals = report.dataset_by_name("Production Totals")
+    assert len(production_totals.data) == len(bookings)
+    assert sum(row[2] for row in production_totals.data) == 1000 * number_of_payments
+
+
+class BookingsReport(Report):
+    """A report with a single, large, bookings dataset"""
+
+    def __init__(self, number_of_rows):
+        super().__init__()
+        self.datasets.append(
+            DataSet(
+                "Bookings",
+                ["ID", "Reference", "Name", "Email", "Tickets", "Total Paid (Pence)"],
+                [
+                    [i, f"REF{i:06}", f"User {i}", f"user{i}@example.org", 2, 1100]
+                    for i in range(number_of_rows)
+                ],
+                currency_columns=["Total Paid (Pence)"],
+            )
+        )
+
+    def run(self):
+        pass
+
+
+def write_dataset_by_column(excel, dataset, start):
+    """The original implementation, which writes each column as a list"""
+    excel.write(start[0], start[1], dataset.name, excel.formats["dataset_title"])
+    for i, header in enumerate(dataset.headings):
+        excel.write_list(
+            (start[0] + 1, start[1] + i), [data[i] for data in dataset.data], header
+        )
+
+
+def time_write_dataset(write_dataset, report, streaming=False):
+    """Time writing the report's dataset into a new workbook"""
+    excel = ExcelReport(report, "Bookings", streaming=streaming)
+    start = time.perf_counter()
+    write_dataset(excel, report.datasets[0], (excel.row_tracker, 0))
+    duration = time.perf_counter() - start
+    excel.get_output().close()
+    return excel, duration
+
+
+@pytest.mark.benchmark
+def test_benchmark_excel_write_dataset():
+    number_of_rows = 100_000
+    report = BookingsReport(number_of_rows)
+
+    _, by_column_time = time_write_dataset(write_dataset_by_column, report)
+    excel, by_row_time = time_write_dataset(ExcelReport.write_dataset, report)
+    _, streaming_time = time_write_dataset(
+        ExcelReport.write_dataset, report, streaming=True
+    )
+
+    print(
+        f"\n{number_of_rows} rows: by column {by_column_time:.2f}s, "
+        f"by row {by_row_time:.2f}s, streaming {streaming_time:.2f}s"
+    )
+    # The header takes 6 rows, followed by the dataset's name and headings
+    assert excel.row_tracker == 6 + 2 + number_of_rows
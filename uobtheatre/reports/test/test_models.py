@@ -0,0 +1,109 @@
+from unittest.mock import patch
+
+import pytest
+
+from uobtheatre.payments.test.factories import TransactionFactory
+from uobtheatre.reports.models import ReportJob
+from uobtheatre.users.test.factories import UserFactory
+
+PERIOD_OPTIONS = [
+    {"name": "start_time", "value": "2021-01-01 00:00:00+00:00"},
+    {"name": "end_time", "value": "2022-01-01 00:00:00+00:00"},
+]
+
+
+@pytest.mark.django_db
+def test_report_job_key():
+    user = UserFactory()
+    key = ReportJob.get_key(user, "PeriodTotals", "XLSX", PERIOD_OPTIONS)
+
+    assert key == ReportJob.get_key(user, "PeriodTotals", "XLSX", PERIOD_OPTIONS[::-1])
+    assert key != ReportJob.get_key(user, "PeriodTotals", "CSV", PERIOD_OPTIONS)
+    assert key != ReportJob.get_key(user, "PeriodTotals", "XLSX", PERIOD_OPTIONS[:1])
+    assert key != ReportJob.get_key(user, "OutstandingPayments", "XLSX", PERIOD_OPTIONS)
+    assert key != ReportJob.get_key(
+        UserFactory(), "PeriodTotals", "XLSX", PERIOD_OPTIONS
+    )
+
+
+@pytest.mark.django_db
+def test_report_job_start(django_capture_on_commit_callbacks):
+    user = UserFactory()
+    with patch(
+        "uobtheatre.reports.models.generate_report.delay"
+    ) as mock_delay, django_capture_on_commit_callbacks(execute=True):
+        job = ReportJob.start(user, "PeriodTotals", "CSV", PERIOD_OPTIONS)
+
+    mock_delay.assert_called_once_with(str(job.pk))
+    job.refresh_from_db()
+    assert job.user == user
+    assert job.status == ReportJob.Status.PENDING
+    assert job.key == ReportJob.get_key(user, "PeriodTotals", "CSV", PERIOD_OPTIONS)
+    assert not job.file
+
+
+@pytest.mark.django_db
+def test_report_job_start_reuses_file_until_data_changes():
+    user = UserFactory()
+    completed_job = ReportJob.objects.create(
+        user=user,
+        report_name="OutstandingPayments",
+        key=ReportJob.get_key(user, "OutstandingPayments", "XLSX", []),
+        data_version=ReportJob(report_name="OutstandingPayments")
+        .get_report()
+        .get_data_version(),
+        status=ReportJob.Status.COMPLETE,
+        file="reports/abc/outstanding_society_payments.xlsx",
+    )
+
+    with patch("uobtheatre.reports.models.generate_report.delay") as mock_delay:
+        job = ReportJob.start(user, "OutstandingPayments", "XLSX", [])
+    assert job.pk != completed_job.pk
+    assert job.status == ReportJob.Status.COMPLETE
+    assert job.file.name == completed_job.file.name
+    assert job.data_version == completed_job.data_version
+
+    TransactionFactory()
+    with patch("uobtheatre.reports.models.generate_report.delay") as mock_delay:
+        job = ReportJob.start(user, "OutstandingPayments", "XLSX", [])
+    assert job.status == ReportJob.Status.PENDING
+    assert not job.file
+    mock_delay.assert_not_called()  # Only called once the transaction commits
+
+
+@pytest.mark.django_db
+def test_report_job_start_doesnt_reuse_incomplete_jobs():
+    user = UserFactory()
+    ReportJob.objects.create(
+        user=user,
+        report_name="OutstandingPayments",
+        key=ReportJob.get_key(user, "OutstandingPayments", "XLSX", []),
+        data_version=ReportJob(report_name="OutstandingPayments")
+        .get_report()
+        .get_data_version(),
+        status=ReportJob.Status.FAILED,
+    )
+
+    job = ReportJob.start(user, "OutstandingPayments", "XLSX", [])
+
+    assert job.status == ReportJob.Status.PENDING
+
+
+@pytest.mark.django_db
+def test_report_job_start_doesnt_reuse_other_users_jobs():
+    user = UserFactory()
+    ReportJob.objects.create(
+        user=user,
+        report_name="OutstandingPayments",
+        key=ReportJob.get_key(user, "OutstandingPayments", "XLSX", []),
+        data_version=ReportJob(report_name="OutstandingPayments")
+        .get_report()
+        .get_data_version(),
+        status=ReportJob.Status.COMPLETE,
+        file="reports/abc/outstanding_society_payments.xlsx",
+    )
+
+    job = ReportJob.start(UserFactory(), "OutstandingPayments", "XLSX", [])
+
+    assert job.status == ReportJob.Status.PENDING
+    assert not job.file
@@ -1,3 +1,4 @@
+from datetime import timedelta
 from unittest.mock import patch
 
 import pytest
@@ -28,6 +29,7 @@ from uobtheatre.reports.reports import (
     PerformanceBookings,
     PeriodTotalsBreakdown,
     Report,
+    StreamedDataSet,
     get_option,
     require_option,
 )
@@ -197,6 +199,31 @@ def test_dataset_class():
     assert row is row_2
 
 
+def test_dataset_class_finds_rows_in_initial_data():
+    first_row = ["ID 1", "First value"]
+    dataset = DataSet(
+        "My Dataset",
+        ["Heading 1", "Heading 2"],
+        [first_row, ["ID 2", "Second value"], ["ID 1", "Duplicate value"]],
+    )
+
+    row = dataset.find_or_create_row_by_first_column("ID 1", ["ID 1", "New value"])
+    assert row is first_row
+
+    dataset.find_or_create_row_by_first_column("ID 0", ["ID 0", "New value"])
+    assert [row[0] for row in dataset.data] == ["ID 1", "ID 2", "ID 1", "ID 0"]
+    assert dataset == DataSet("My Dataset", ["Heading 1", "Heading 2"], dataset.data)
+
+
+def test_dataset_class_with_empty_rows():
+    dataset = DataSet("My Dataset", ["Heading 1", "Heading 2"], [[]])
+    dataset.add_row([])
+
+    row = dataset.find_or_create_row_by_first_column("ID 1", ["ID 1", "New value"])
+    assert row == ["ID 1", "New value"]
+    assert dataset.data == [[], [], ["ID 1", "New value"]]
+
+
 def test_abstract_report():
     class SimpleReport(Report):
         def run(self):
@@ -248,15 +275,18 @@ def test_period_totals_breakdown_report():
         )
         report.run()
 
-        mock_sync.assert_called_once()
+        # Fees are synced in the background, not when the report is run
+        mock_sync.assert_not_called()
 
     assert len(report.datasets) == 3
 
-    assert len(report.meta) == 2
+    assert len(report.meta) == 3
     assert report.meta[0].name == "No. of Payments"
     assert report.meta[0].value == "4"
     assert report.meta[1].name == "Total Income"
     assert report.meta[1].value == "1680"
+    assert report.meta[2].name == "Pending Provider Fees"
+    assert report.meta[2].value == "1"  # payment_3 has no provider fee
 
     assert report.datasets[0].name == "Provider Totals"
     assert len(report.datasets[0].headings) == 2
@@ -283,7 +313,9 @@ def test_period_totals_breakdown_report():
 
     assert report.datasets[2].name == "Payments"
     assert len(report.datasets[2].headings) == 10
-    assert report.datasets[2].data == [
+    # The payments are streamed as the report is exported
+    assert isinstance(report.datasets[2], StreamedDataSet)
+    assert list(report.datasets[2].data) == [
         [
             str(payment_1.id),
             "2021-09-08 00:00:01",
@@ -292,7 +324,7 @@ def test_period_totals_breakdown_report():
             "Booking",
             str(booking_1.performance.production.id),
             "Amazing Show 1",
-            "1100",
+            1100,
             "SQUARE_POS",
             "square_id",
         ],
@@ -304,7 +336,7 @@ def test_period_totals_breakdown_report():
             "Booking",
             str(booking_3.performance.production.id),
             "Amazing Show 2",
-            "580",
+            580,
             "SQUARE_ONLINE",
             payment_3.provider_transaction_id,
         ],
@@ -316,7 +348,7 @@ def test_period_totals_breakdown_report():
             "Booking",
             str(booking_5.performance.production.id),
             "Amazing Show 1",
-            "1100",
+            1100,
             "SQUARE_ONLINE",
             payment_4.provider_transaction_id,
         ],
@@ -328,13 +360,41 @@ def test_period_totals_breakdown_report():
             "Booking",
             str(booking_5.performance.production.id),
             "Amazing Show 1",
-            "-1100",
+            -1100,
             "SQUARE_REFUND",
             refund_1.provider_transaction_id,
         ],
     ]
 
 
+@pytest.mark.django_db
+def test_period_totals_breakdown_report_payments_without_a_production():
+    TransactionFactory(value=100)
+    # A payment whose booking no longer exists
+    orphaned_payment = TransactionFactory(value=50)
+    Transaction.objects.filter(pk=orphaned_payment.pk).update(pay_object_id=0)
+    report = PeriodTotalsBreakdown(
+        [
+            {"name": "start_time", "value": timezone.now() - timedelta(days=1)},
+            {"name": "end_time", "value": timezone.now() + timedelta(days=1)},
+        ]
+    )
+    report.run()
+
+    assert report.meta[1].value == "150"
+    production_totals = report.dataset_by_name("Production Totals").data
+    assert production_totals[-1] == ["", "No Production", 50]
+    assert sum(row[2] for row in production_totals) == 150
+
+
+def test_streamed_dataset_class():
+    dataset = StreamedDataSet("My Dataset", ["Heading 1"], iter([["Row 1"]]))
+
+    with pytest.raises(TypeError):
+        dataset.add_row(["Row 2"])
+    assert list(dataset.data) == [["Row 1"]]
+
+
 @pytest.mark.django_db
 def test_outstanding_society_payments_report():
     create_fixtures()
@@ -345,13 +405,15 @@ def test_outstanding_society_payments_report():
         report = OutstandingSocietyPayments()
         report.run()
 
-    mock_sync.assert_called_once()
+    mock_sync.assert_not_called()
 
     assert len(report.datasets) == 2
 
-    assert len(report.meta) == 1
+    assert len(report.meta) == 2
     assert report.meta[0].name == "Total Outstanding"
     assert report.meta[0].value == "1090"
+    assert report.meta[1].name == "Pending Provider Fees"
+    assert report.meta[1].value == "0"
 
     assert report.datasets[0].name == "Societies"
     assert len(report.datasets[0].headings) == 3
@@ -389,6 +451,54 @@ def test_outstanding_society_payments_report():
     ]
 
 
+@pytest.mark.django_db
+def test_outstanding_society_payments_report_many_productions(
+    django_assert_num_queries,
+):
+    society_1, society_2 = SocietyFactory.create_batch(2)
+    productions = [
+        ProductionFactory(society=society, status=Production.Status.CLOSED)
+        for society in [society_1, society_1, society_2, society_2]
+    ]
+    for production in productions[:3]:
+        for _ in range(2):
+            TransactionFactory(
+                pay_object=BookingFactory(performance__production=production),
+                value=1000,
+                provider_fee=10,
+                app_fee=100,
+            )
+    # A production with no sales, and one that isn't closed
+    ProductionFactory(society=society_2)
+
+    # Productions, their sales breakdowns and the pending provider fees
+    with django_assert_num_queries(3):
+        report = OutstandingSocietyPayments()
+        report.run()
+
+    assert [row[0] for row in report.datasets[1].data] == [
+        production.id for production in productions
+    ]
+    assert report.datasets[1].data[0][4:] == [
+        2000,
+        2000,
+        0,
+        0,
+        2000,
+        2000,
+        20,
+        180,
+        1800,
+    ]
+    assert report.datasets[1].data[3][4:] == [0] * 9
+    assert report.datasets[0].data == [
+        [society_1.id, society_1.name, 3600],
+        [society_2.id, society_2.name, 1800],
+        ["", "Stage Technicians' Association", 540],
+    ]
+    assert report.meta[0].value == "5940"
+
+
 @pytest.mark.django_db
 def test_outstanding_society_payments_report_production_no_society():
     ProductionFactory(id=1, status=Production.Status.CLOSED, society=None)
@@ -428,7 +538,7 @@ def test_performance_bookings_report():
             "Joe Bloggs",
             "joe@example.org",
             "SeatGroup1 | ConessionType1",
-            "1100",
+            1100,
         ],
         [
             Booking.objects.first().id + 1,
@@ -436,6 +546,68 @@ def test_performance_bookings_report():
             "Gill Bloggs",
             "gill@example.org",
             "SeatGroup1 | ConessionType1\r\nSeatGroup1 | ConessionType1",
-            "2100",
+            2100,
         ],
     ]
+
+
+@pytest.mark.django_db
+def test_report_data_version():
+    report = OutstandingSocietyPayments()
+    version = report.get_data_version()
+    assert version == OutstandingSocietyPayments().get_data_version()
+
+    transaction = TransactionFactory()
+    changed_version = report.get_data_version()
+    assert changed_version != version
+
+    transaction.save()
+    assert report.get_data_version() != changed_version
+
+
+@pytest.mark.django_db
+def test_performance_bookings_data_version():
+    performance = PerformanceFactory()
+    booking = BookingFactory(performance=performance)
+    ticket = TicketFactory(booking=booking)
+    report = PerformanceBookings(
+        [{"name": "id", "value": to_global_id("PerformanceNode", performance.id)}]
+    )
+    version = report.get_data_version()
+
+    # Changes to other performances' bookings don't change the version
+    TicketFactory()
+    assert report.get_data_version() == version
+
+    # Nor do changes to what the report doesn't show, such as a booker logging in
+    booking.user.last_login = timezone.now()
+    booking.user.set_password("newpassword")
+    booking.user.save()
+    assert report.get_data_version() == version
+
+    # But changes to this performance's bookers and tickets do, even though
+    # they aren't timestamped
+    booking.user.first_name = "Changed"
+    booking.user.save()
+    changed_version = report.get_data_version()
+    assert changed_version != version
+
+    ticket.seat_group.name = "Changed"
+    ticket.seat_group.save()
+    assert report.get_data_version() != changed_version
+
+
+def test_period_totals_breakdown_export_meta():
+    report = PeriodTotalsBreakdown(
+        [
+            {"name": "start_time", "value": "2021-01-01"},
+            {"name": "end_time", "value": "2022-01-01"},
+        ]
+    )
+    report.meta.append(MetaItem("No. of Payments", "0"))
+
+    assert report.get_export_meta() == [
+        ["Period From", "2021-01-01"],
+        ["Period To", "2022-01-01"],
+        ["No. of Payments", "0"],
+    ]
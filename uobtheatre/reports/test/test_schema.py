@@ -1,8 +1,13 @@
+from unittest.mock import patch
+
 import pytest
 from graphql_relay.node.node import to_global_id
 from guardian.shortcuts import assign_perm
 
 from uobtheatre.productions.test.factories import PerformanceFactory
+from uobtheatre.reports.models import ReportJob
+from uobtheatre.reports.utils import validate_report_download_signature
+from uobtheatre.users.test.factories import UserFactory
 
 
 @pytest.mark.django_db
@@ -258,3 +263,143 @@ def test_cannot_generate_report_with_end_but_no_start(gql_client):
         "message": "A start time must be provided when using an end time",
         "field": "startTime",
     }
+
+
+@pytest.mark.django_db
+def test_generate_report_link_as_csv(gql_client):
+    gql_client.login()
+    assign_perm("reports.finance_reports", gql_client.user)
+
+    response = gql_client.execute(
+        """
+        mutation {
+            generateReport(name: "OutstandingPayments", fileFormat: CSV) {
+                downloadUri
+            }
+        }
+        """
+    )
+
+    assert response["data"]["generateReport"]["downloadUri"].endswith("&format=csv")
+
+
+@pytest.mark.django_db
+def test_generate_report_in_background(gql_client):
+    gql_client.login()
+    assign_perm("reports.finance_reports", gql_client.user)
+
+    with patch("uobtheatre.reports.models.generate_report.delay"):
+        response = gql_client.execute(
+            """
+            mutation {
+                generateReport(name: "OutstandingPayments", fileFormat: CSV, runInBackground: true) {
+                    downloadUri
+                    report {
+                        meta {
+                            name
+                        }
+                    }
+                    job {
+                        id
+                        reportName
+                        fileFormat
+                        status
+                        downloadUri
+                    }
+                }
+            }
+            """
+        )
+
+    job = ReportJob.objects.get()
+    assert response["data"]["generateReport"] == {
+        "downloadUri": None,
+        "report": None,
+        "job": {
+            "id": to_global_id("ReportJobNode", job.pk),
+            "reportName": "OutstandingPayments",
+            "fileFormat": "CSV",
+            "status": "PENDING",
+            "downloadUri": None,
+        },
+    }
+    assert job.user == gql_client.user
+
+
+@pytest.mark.django_db
+def test_unauthorized_cant_generate_report_in_background(gql_client):
+    gql_client.login()
+
+    response = gql_client.execute(
+        """
+        mutation {
+            generateReport(name: "OutstandingPayments", runInBackground: true) {
+                job {
+                    id
+                }
+            }
+        }
+        """
+    )
+
+    assert response["data"]["generateReport"]["job"] is None
+    assert not ReportJob.objects.exists()
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize("is_owner", [True, False])
+def test_report_job_query(gql_client, is_owner):
+    gql_client.login()
+    job = ReportJob.objects.create(
+        user=gql_client.user if is_owner else UserFactory(),
+        report_name="OutstandingPayments",
+        status=ReportJob.Status.COMPLETE,
+        file="reports/abc/outstanding_society_payments.xlsx",
+    )
+
+    response = gql_client.execute(
+        """
+        {
+            reportJob(id: "%s") {
+                status
+                downloadUri
+            }
+        }
+        """
+        % to_global_id("ReportJobNode", job.pk)
+    )
+
+    if not is_owner:
+        assert response["data"]["reportJob"] is None
+        return
+
+    assert response["data"]["reportJob"]["status"] == "COMPLETE"
+    split_url = response["data"]["reportJob"]["downloadUri"].split("?signature=")
+    assert split_url[0] == f"https://api.example.com/reports/jobs/{job.pk}"
+    assert validate_report_download_signature(split_url[1]) == {
+        "user_id": str(gql_client.user.id),
+        "report": "ReportJob",
+        "options": [{"name": "id", "value": str(job.pk)}],
+    }
+
+
+@pytest.mark.django_db
+def test_report_job_query_when_not_logged_in(gql_client):
+    job = ReportJob.objects.create(
+        user=UserFactory(),
+        report_name="OutstandingPayments",
+        status=ReportJob.Status.COMPLETE,
+    )
+
+    response = gql_client.execute(
+        """
+        {
+            reportJob(id: "%s") {
+                status
+            }
+        }
+        """
+        % to_global_id("ReportJobNode", job.pk)
+    )
+
+    assert response["data"]["reportJob"] is None
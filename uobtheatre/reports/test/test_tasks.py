@@ -0,0 +1,43 @@
+from unittest.mock import patch
+
+import pytest
+
+from uobtheatre.reports.models import ReportJob
+from uobtheatre.reports.tasks import generate_report
+from uobtheatre.users.test.factories import UserFactory
+
+
+@pytest.mark.django_db
+def test_generate_report_task():
+    job = ReportJob.objects.create(
+        user=UserFactory(first_name="Joe", last_name="Bloggs"),
+        report_name="OutstandingPayments",
+        file_format=ReportJob.Format.CSV,
+    )
+
+    generate_report(str(job.pk))
+
+    job.refresh_from_db()
+    assert job.status == ReportJob.Status.COMPLETE
+    assert job.data_version == job.get_report().get_data_version()
+    assert job.file.name == f"reports/{job.pk}/outstanding_society_payments.csv"
+    with job.file.open("rb") as file:
+        content = file.read().decode()
+    assert content.startswith("UOB Theatre,Outstanding Society Payments")
+    assert "Generated By,Joe Bloggs" in content
+
+
+@pytest.mark.django_db
+def test_generate_report_task_failure():
+    job = ReportJob.objects.create(
+        user=UserFactory(), report_name="OutstandingPayments"
+    )
+
+    with patch.object(
+        ReportJob, "get_report", side_effect=ValueError("Oops")
+    ), pytest.raises(ValueError):
+        generate_report(str(job.pk))
+
+    job.refresh_from_db()
+    assert job.status == ReportJob.Status.FAILED
+    assert not job.file
@@ -1,17 +1,33 @@
+import csv
+import io
 import time
+import zipfile
 from datetime import timedelta
 from unittest.mock import patch
 
 import pytest
+from django.http.response import StreamingHttpResponse
 
 from uobtheatre.reports.exceptions import InvalidReportSignature
+from uobtheatre.reports.reports import DataSet, Report
 from uobtheatre.reports.utils import (
+    CsvReport,
+    ExcelReport,
     generate_report_download_signature,
+    get_report_exporter,
     validate_report_download_signature,
 )
 from uobtheatre.users.test.factories import UserFactory
 
 
+class SimpleReport(Report):
+    def run(self):
+        self.datasets.append(
+            DataSet("Payments", ["Id", "Value"], [["abc", 100], ["def", -50]])
+        )
+        self.datasets.append(DataSet("Totals", ["Total"], [[50]]))
+
+
 def test_validate_report_signature_with_none():
     with pytest.raises(InvalidReportSignature):
         validate_report_download_signature(None)
@@ -44,3 +60,112 @@ def test_validate_expired_report_signature():
 
     with pytest.raises(InvalidReportSignature):
         validate_report_download_signature(signature)
+
+
+def test_csv_report_streams_rows():
+    meta = [["Period From", "2021-01-01"]]
+    response = CsvReport(
+        SimpleReport(), "My Report", ["A description"], meta
+    ).get_response()
+
+    assert isinstance(response, StreamingHttpResponse)
+    assert response["Content-Type"] == "text/csv"
+    assert response["Content-Disposition"] == "attachment; filename=my_report.csv"
+
+    rows = list(csv.reader(b"".join(response.streaming_content).decode().splitlines()))
+    assert rows[:2] == [["UOB Theatre", "My Report"], ["Period From", "2021-01-01"]]
+    assert rows[2][0] == "Generated At"
+    assert rows[3:] == [
+        [],
+        ["Description and Usage Notes:"],
+        ["A description"],
+        [],
+        ["Payments"],
+        ["Id", "Value"],
+        ["abc", "100"],
+        ["def", "-50"],
+        [],
+        ["Totals"],
+        ["Total"],
+        ["50"],
+    ]
+    assert meta == [["Period From", "2021-01-01"]]
+
+
+def test_csv_report_without_descriptions():
+    rows = list(CsvReport(SimpleReport(), "My Report").get_rows())
+
+    assert rows[0] == ["UOB Theatre", "My Report"]
+    assert ["Description and Usage Notes:"] not in rows
+    assert rows[2:5] == [[], ["Payments"], ["Id", "Value"]]
+
+
+@pytest.mark.parametrize(
+    "file_format, exporter_class", [("CSV", CsvReport), ("XLSX", ExcelReport)]
+)
+def test_get_report_exporter_runs_report(file_format, exporter_class):
+    report = SimpleReport()
+
+    exporter = get_report_exporter(report, file_format)
+
+    assert isinstance(exporter, exporter_class)
+    assert [dataset.name for dataset in report.datasets] == ["Payments", "Totals"]
+
+
+def test_get_report_exporter_with_report_already_run():
+    report = SimpleReport()
+    report.run()
+
+    with patch.object(report, "run") as run_mock:
+        exporter = get_report_exporter(report, "CSV")
+
+    run_mock.assert_not_called()
+    assert exporter.report is report
+    assert len(report.datasets) == 2
+
+
+@pytest.mark.django_db
+def test_excel_report_streaming():
+    user = UserFactory(first_name="Joe", last_name="Bloggs")
+    excel = ExcelReport(
+        SimpleReport(), "My Report", ["A description"], [], user, streaming=True
+    )
+    response = excel.get_response()
+
+    assert isinstance(response, StreamingHttpResponse)
+    assert response["Content-Disposition"] == "attachment; filename=my_report.xlsx"
+
+    with zipfile.ZipFile(io.BytesIO(b"".join(response.streaming_content))) as workbook:
+        sheet = workbook.read("xl/worksheets/sheet1.xml").decode()
+    for text in ["My Report", "A description", "Joe Bloggs", "Payments", "def"]:
+        assert text in sheet
+    assert "<v>-50</v>" in sheet
+
+    response.close()
+    assert excel.output_buffer.closed
+
+
+def test_excel_report_write_dataset():
+    dataset = DataSet(
+        "Payments",
+        ["Id", "Value", "Fee", "Provider"],
+        [["abc", 100, None, "CASH"], ["def", -50, 3, "SQUARE_ONLINE"]],
+        currency_columns=["Value", "Fee"],
+    )
+    excel = ExcelReport(SimpleReport())
+    excel.write_dataset(dataset, (10, 1))
+
+    table = excel.worksheet.table
+    assert table[10][1].string is not None
+    assert [table[11][col].format for col in range(1, 5)] == [excel.formats["bold"]] * 4
+    assert table[13][2].number == -50
+    assert table[13][3].number == 3
+    for col in (2, 3):
+        assert table[12][col].format is excel.formats["pence"]
+        assert table[13][col].format is excel.formats["pence"]
+    for col in (1, 4):
+        assert table[13][col].format is None
+
+    assert excel.row_tracker == 14
+    assert excel.column_widths[4] == len("Provider") + 2
+    assert excel.column_widths[1] == 20
@@ -1,8 +1,10 @@
+import uuid
 from datetime import datetime, timedelta
 from unittest.mock import patch
 
 import pytest
 import pytz
+from django.core.files.base import ContentFile
 from django.http.response import HttpResponse
 from django.test import TestCase
 from django.test.client import RequestFactory
@@ -10,6 +12,7 @@ from django.urls import reverse
 from graphql_relay.node.node import to_global_id
 
 from uobtheatre.productions.test.factories import PerformanceFactory
+from uobtheatre.reports.models import ReportJob
 from uobtheatre.reports.reports import (
     OutstandingSocietyPayments,
     PerformanceBookings,
@@ -90,6 +93,22 @@ class SocietyOutstandingPaymentsTests(TestCase):
         )
         self.assertEqual(response.status_code, 403)
 
+    @pytest.mark.django_db
+    def test_can_download_csv(self):
+        response = self.client.get(
+            reverse(
+                "outstanding_society_payments",
+            )
+            + "?format=csv&signature=%s"
+            % generate_report_download_signature(UserFactory(), "OutstandingPayments")
+        )
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response["Content-Type"], "text/csv")
+        content = b"".join(response.streaming_content).decode()
+        assert content.startswith("UOB Theatre,Outstanding Society Payments")
+        assert "Societies" in content
+
 
 class PerformanceBookingsTests(TestCase):
     @pytest.mark.django_db
@@ -124,3 +143,54 @@ class PerformanceBookingsTests(TestCase):
             )
         )
         self.assertEqual(response.status_code, 403)
+
+
+def report_job_download_uri(job, user, job_id=None):
+    return reverse(
+        "report_job", args=(job.pk,)
+    ) + "?signature=%s" % generate_report_download_signature(
+        user, "ReportJob", [{"name": "id", "value": str(job_id or job.pk)}]
+    )
+
+
+@pytest.mark.django_db
+def test_can_download_report_job(client):
+    job = ReportJob.objects.create(
+        user=UserFactory(),
+        report_name="OutstandingPayments",
+        status=ReportJob.Status.COMPLETE,
+    )
+    job.file.save("outstanding_society_payments.csv", ContentFile(b"UOB Theatre"))
+
+    response = client.get(report_job_download_uri(job, job.user))
+
+    assert response.status_code == 200
+    assert response["Content-Disposition"] == (
+        'attachment; filename="outstanding_society_payments.csv"'
+    )
+    assert b"".join(response.streaming_content) == b"UOB Theatre"
+
+
+@pytest.mark.django_db
+def test_cant_download_report_job_with_another_jobs_signature(client):
+    job = ReportJob.objects.create(
+        user=UserFactory(),
+        report_name="OutstandingPayments",
+        status=ReportJob.Status.COMPLETE,
+        file="reports/abc/outstanding_society_payments.csv",
+    )
+
+    response = client.get(report_job_download_uri(job, job.user, uuid.uuid4()))
+
+    assert response.status_code == 403
+
+
+@pytest.mark.django_db
+def test_cant_download_incomplete_report_job(client):
+    job = ReportJob.objects.create(
+        user=UserFactory(), report_name="OutstandingPayments"
+    )
+
+    response = client.get(report_job_download_uri(job, job.user))
+
+    assert response.status_code == 404
@@ -18,4 +18,9 @@ urlpatterns = [
         views.performance_bookings,  # type: ignore[arg-type]
         name="performance_bookings",
     ),
+    path(
+        "jobs/<uuid:job_id>",
+        views.report_job,  # type: ignore[arg-type]
+        name="report_job",
+    ),
 ]
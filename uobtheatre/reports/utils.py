@@ -1,11 +1,15 @@
+import csv
 import io
+import tempfile
 from datetime import datetime, timedelta
-from typing import List, Optional, Tuple
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+from wsgiref.util import FileWrapper
 
 import xlsxwriter
 from django.core import signing
+from django.core.files import File
 from django.core.signing import TimestampSigner
-from django.http.response import HttpResponse
+from django.http.response import HttpResponse, HttpResponseBase, StreamingHttpResponse
 
 from uobtheatre.reports.exceptions import InvalidReportSignature
 from uobtheatre.users.models import User
@@ -14,9 +18,39 @@ from . import reports
 
 signer = TimestampSigner()
 
+STREAMING_CHUNK_SIZE = 64 * 1024
 
-class ExcelReport:  # pragma: no cover
-    """Generates an Excel xlxs spreadsheet"""
+
+def add_default_meta(meta: Optional[List], user: Optional[User] = None) -> List:
+    """Adds the time of generation, and the user generating it, to report meta
+
+    Args:
+        meta (List): The meta of the report
+        user (User): The user generating the report
+
+    Returns:
+        List: The meta, including the default meta
+    """
+    meta = list(meta or [])
+    meta.append(["Generated At", datetime.now().strftime("%Y-%m-%d %H:%M")])
+    if user:
+        meta.append(["Generated By", str(user)])
+    return meta
+
+
+def get_attachment_filename(name: Optional[str], extension: str) -> str:
+    """Gets the filename a report is downloaded as"""
+    return (name or "uobtheatre-export").lower().replace(" ", "_") + "." + extension
+
+
+class ExcelReport:  # pragma: no cover pylint: disable=too-many-instance-attributes
+    """Generates an Excel xlxs spreadsheet
+
+    In streaming mode, the workbook is written with xlsxwriter's
+    constant_memory option to a temporary file, which is then streamed in the
+    response. Rows are flushed to disk as soon as the next row is started, so
+    cells must be written in row order.
+    """
 
     def __init__(  # pylint: disable=too-many-arguments,too-many-positional-arguments
         self,
@@ -25,10 +59,12 @@ class ExcelReport:  # pragma: no cover
         descriptions: Optional[List] = None,
         meta: Optional[List] = None,
         user: Optional[User] = None,
+        streaming: bool = False,
     ) -> None:
         """Initalise worbook, sheet, formatters, meta, headers and description"""
         self.name = name
-        self.output_buffer = io.BytesIO()
+        self.streaming = streaming
+        self.output_buffer = tempfile.TemporaryFile() if streaming else io.BytesIO()
         self.row_tracker = 1  # Track the row we are currently at
 
         self.report = report
@@ -36,7 +72,9 @@ class ExcelReport:  # pragma: no cover
             self.report.run()
 
         # Setup Workbook and Sheet
-        self.workbook = xlsxwriter.Workbook(self.output_buffer)
+        self.workbook = xlsxwriter.Workbook(
+            self.output_buffer, {"constant_memory": streaming}
+        )
         self.worksheet = self.workbook.add_worksheet()
 
         # Setup Formatters
@@ -46,22 +84,22 @@ class ExcelReport:  # pragma: no cover
                 {"underline": True, "bold": True}
             ),
             "currency": self.workbook.add_format({"num_format": "£#,##0.00"}),
+            "pence": self.workbook.add_format({"num_format": "#,##0"}),
         }
+        self.column_widths: Dict[int, float] = {}
 
-        if not meta:
-            meta = []
+        meta = add_default_meta(meta, user)
 
-        # Add default meta
-        meta.append(["Generated At", datetime.now().strftime("%Y-%m-%d %H:%M")])
-        if user:
-            meta.append(["Generated By", str(user)])
+        # The header cells, keyed by their (zero indexed) row and column, so
+        # that they can be written in row order
+        header: Dict[Tuple[int, int], Tuple] = {}
 
         # Add Header
-        self.write_bold("A1", "UOB Theatre")
-        self.worksheet.set_column("A:A", 15)
-        self.worksheet.set_column("B:B", 20)
+        header[(0, 0)] = ("UOB Theatre", self.formats["bold"])
+        self.set_min_col_width(0, 15)
+        self.set_min_col_width(1, 20)
         if name:
-            self.write("B1", name)
+            header[(0, 1)] = (name,)
 
         self.increment_row_tracker(amount=2)
 
@@ -69,19 +107,22 @@ class ExcelReport:  # pragma: no cover
         if len(meta) > 0:
             for i, item in enumerate(meta):
                 if isinstance(item, List):
-                    self.write_bold("A%s" % self.row_tracker, item[0])
-                    self.write("B%s" % self.row_tracker, item[1])
+                    header[(self.row_tracker - 1, 0)] = (item[0], self.formats["bold"])
+                    header[(self.row_tracker - 1, 1)] = (item[1],)
                 self.increment_row_tracker()
 
         # Add description
         if descriptions and len(descriptions) > 0:
-            self.worksheet.set_column("D:D", 20)
-            self.write_bold("D1", "Description and Usage Notes:")
+            self.set_min_col_width(3, 20)
+            header[(0, 3)] = ("Description and Usage Notes:", self.formats["bold"])
             for i, item in enumerate(descriptions):
                 row_num = 2 + i
-                self.write("D%s" % row_num, item)
+                header[(row_num - 1, 3)] = (item,)
                 self.increment_row_tracker(current_row=row_num)
 
+        for (row, col), cell in sorted(header.items()):
+            self.write(row, col, *cell)
+
         self.increment_row_tracker(amount=2)  # Add gap
 
     def increment_row_tracker(self, current_row=None, amount=1) -> None:
@@ -139,11 +180,39 @@ class ExcelReport:  # pragma: no cover
             )  # Plus one due to excel non-zero first row
 
     def write_dataset(self, dataset: reports.DataSet, start: Tuple[int, int]):
-        self.write(start[0], start[1], dataset.name, self.formats["dataset_title"])
-        for i, header in enumerate(dataset.headings):
-            self.write_list(
-                (start[0] + 1, start[1] + i), [data[i] for data in dataset.data], header
+        """Writes a dataset, with its name and headings, a row at a time
+
+        The formats and widths of the columns are worked out once. Each row is
+        then written with a `write_row` for each run of columns sharing a
+        format, so that currency columns are written as numbers in pence
+        format without formatting every cell individually.
+        """
+        row, col = start
+        self.write(row, col, dataset.name, self.formats["dataset_title"])
+        self.worksheet.write_row(row + 1, col, dataset.headings, self.formats["bold"])
+
+        column_formats = []
+        for i, heading in enumerate(dataset.headings):
+            self.set_min_col_width(col + i, len(heading) + 2)
+            column_formats.append(
+                self.formats["pence"] if heading in dataset.currency_columns else None
             )
+        segments = [
+            (col + first, first, last, cell_format)
+            for first, last, cell_format in _runs(column_formats)
+        ]
+
+        write_row = self.worksheet.write_row
+        row += 1  # The headings row
+        if len(segments) == 1:
+            segment_col, _, _, cell_format = segments[0]
+            for row, row_data in enumerate(dataset.data, start=row + 1):
+                write_row(row, segment_col, row_data, cell_format)
+        else:
+            for row, row_data in enumerate(dataset.data, start=row + 1):
+                for segment_col, first, last, cell_format in segments:
+                    write_row(row, segment_col, row_data[first:last], cell_format)
+        self.increment_row_tracker(current_row=row)
 
     def write(self, *args, **kwargs) -> None:
         """Write to the spreadsheet"""
@@ -152,24 +221,44 @@ class ExcelReport:  # pragma: no cover
     def set_col_width(self, *args):
         self.worksheet.set_column(*args)
 
-    def get_response(self):
-        """Converts a list of datasets into a standard XLSX file and returns a Http response to download the result"""
+    def set_min_col_width(self, column: int, width: float) -> None:
+        """Widens the column to the given width, if it is narrower"""
+        if width > self.column_widths.get(column, 0):
+            self.column_widths[column] = width
+            self.worksheet.set_column(column, column, width)
+
+    def write_datasets(self) -> None:
+        """Writes all of the report's datasets, one below the other"""
         for dataset in self.report.datasets:
             self.write_dataset(dataset, (self.row_tracker, 0))
             self.increment_row_tracker()
 
-        response = HttpResponse(
-            self.get_output(),
-            content_type="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+    def get_file(self) -> File:
+        """Converts a list of datasets into a standard XLSX file"""
+        self.write_datasets()
+        return File(self.get_output(), get_attachment_filename(self.name, "xlsx"))
+
+    def get_response(self):
+        """Converts a list of datasets into a standard XLSX file and returns a Http response to download the result"""
+        self.write_datasets()
+
+        content_type = (
+            "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
         )
+        response: HttpResponseBase
+        if self.streaming:
+            response = StreamingHttpResponse(
+                FileWrapper(self.get_output(), STREAMING_CHUNK_SIZE),
+                content_type=content_type,
+            )
+        else:
+            response = HttpResponse(self.get_output(), content_type=content_type)
         response["Content-Disposition"] = (
-            "attachment; filename=%s"
-            % (self.name or "uobtheatre-export").lower().replace(" ", "_")
-            + ".xlsx"
+            "attachment; filename=%s" % get_attachment_filename(self.name, "xlsx")
         )
         return response
 
-    def get_output(self) -> io.BytesIO:
+    def get_output(self):
         """Gets the output buffer, starting at the start"""
         self.workbook.close()
 
@@ -177,6 +266,107 @@ class ExcelReport:  # pragma: no cover
         return self.output_buffer
 
 
+def get_report_exporter(
+    report: reports.Report, file_format: str = "XLSX", user: Optional[User] = None
+):
+    """Gets an exporter for the report, which streams the exported file
+
+    Args:
+        report (Report): The report to export. It is run if it hasn't been.
+        file_format (str): The format to export, either "XLSX" or "CSV"
+        user (User): The user generating the report
+
+    Returns:
+        ExcelReport|CsvReport: The exporter
+    """
+    if not report.datasets:
+        report.run()
+
+    args = (report, report.title, report.descriptions, report.get_export_meta(), user)
+    if file_format == "CSV":
+        return CsvReport(*args)
+    return ExcelReport(*args, streaming=True)
+
+
+def _runs(items: List) -> Iterator[Tuple[int, int, Any]]:
+    """Yields the start index, end index and value of each run of equal items"""
+    first = 0
+    for i in range(1, len(items) + 1):
+        if i == len(items) or items[i] != items[first]:
+            yield first, i, items[first]
+            first = i
+
+
+class CsvReport:
+    """Generates a CSV file, which is streamed as it is written"""
+
+    def __init__(  # pylint: disable=too-many-arguments,too-many-positional-arguments
+        self,
+        report: reports.Report,
+        name: Optional[str] = None,
+        descriptions: Optional[List] = None,
+        meta: Optional[List] = None,
+        user: Optional[User] = None,
+    ) -> None:
+        self.name = name
+        self.descriptions = descriptions or []
+        self.meta = add_default_meta(meta, user)
+
+        self.report = report
+        if not self.report.datasets:
+            self.report.run()
+
+    def get_rows(self) -> Iterator[List]:
+        """Yields the rows of the CSV file
+
+        The header, meta and descriptions come first, followed by each of the
+        datasets with their name and headings. Sections are separated by an
+        empty row.
+        """
+        yield ["UOB Theatre", self.name or ""]
+        yield from (item for item in self.meta if isinstance(item, List))
+        if self.descriptions:
+            yield []
+            yield ["Description and Usage Notes:"]
+            yield from ([description] for description in self.descriptions)
+
+        for dataset in self.report.datasets:
+            yield []
+            yield [dataset.name]
+            yield dataset.headings
+            yield from dataset.data
+
+    def get_output(self) -> Iterator[str]:
+        """Yields the lines of the CSV file"""
+        writer = csv.writer(_Echo())
+        return (writer.writerow(row) for row in self.get_rows())
+
+    def get_file(self) -> File:
+        """Writes the CSV file to a temporary file"""
+        output = tempfile.TemporaryFile()
+        for line in self.get_output():
+            output.write(line.encode())
+        output.seek(0)
+        return File(output, get_attachment_filename(self.name, "csv"))
+
+    def get_response(self):
+        """Returns a Http response which streams the CSV file"""
+        response = StreamingHttpResponse(self.get_output(), content_type="text/csv")
+        response["Content-Disposition"] = (
+            "attachment; filename=%s" % get_attachment_filename(self.name, "csv")
+        )
+        return response
+
+
+class _Echo:  # pylint: disable=too-few-public-methods
+    """A file-like object which returns what is written to it, rather than
+    storing it, so that the csv writer can be used to format single rows"""
+
+    @staticmethod
+    def write(value):
+        return value
+
+
 def generate_report_download_signature(
     user: User, report_name: str, options: Optional[List] = None
 ):
@@ -1,8 +1,16 @@
-from django.http.response import HttpResponse
+import os
+
+from django.http import Http404
+from django.http.response import FileResponse, HttpResponse
 from django.utils.decorators import decorator_from_middleware_with_args
 
 from uobtheatre.reports.exceptions import InvalidReportSignature
-from uobtheatre.reports.utils import ExcelReport, validate_report_download_signature
+from uobtheatre.reports.models import ReportJob
+from uobtheatre.reports.reports import get_option
+from uobtheatre.reports.utils import (
+    get_report_exporter,
+    validate_report_download_signature,
+)
 from uobtheatre.users.models import User
 
 from . import reports
@@ -41,6 +49,22 @@ class ValidSignatureMiddleware:
 valid_signature = decorator_from_middleware_with_args(ValidSignatureMiddleware)
 
 
+def export_report(request, report):
+    """Streams the report as a CSV file, if requested, or an Excel spreadsheet
+
+    Args:
+        request (HttpRequest): The HttpRequest. A "format" query parameter of
+            "csv" requests a CSV file.
+        report (Report): The report to export
+
+    Returns:
+        StreamingHttpResponse: The StreamingHttpResponse
+    """
+    return get_report_exporter(
+        report, request.GET.get("format", "xlsx").upper(), request.user
+    ).get_response()
+
+
 @valid_signature("PeriodTotals")
 def period_totals(request, start_time, end_time):
     """Generates excel for period totals report
@@ -68,24 +92,7 @@ def period_totals(request, start_time, end_time):
         ]
     )
 
-    excel = ExcelReport(
-        report,
-        "Period Totals Report",
-        [
-            "This report provides summaries and totals of payments taken and recorded.",
-            "Totals are calcualted by summing the payments (which are positive in the case of a charge, or negative for a refund).",
-            "Totals are the amount collected, without any costs and fees that are charged to the society or the payment deducted. Hence, these figures should not be used to calculate account transfers to societies.",
-            "All currency is PENCE (i.e. 100 = £1.00)",
-        ],
-        [
-            ["Period From", str(start_time)],
-            ["Period To", str(end_time)],
-        ]
-        + report.get_meta_array(),
-        request.user,
-    )
-
-    return excel.get_response()
+    return export_report(request, report)
 
 
 @valid_signature("OutstandingPayments")
@@ -93,21 +100,7 @@ def outstanding_society_payments(request):
     """Generates excel of society payments report"""
     report = reports.OutstandingSocietyPayments()
 
-    excel = ExcelReport(
-        report,
-        "Outstanding Society Payments",
-        [
-            "This report details the production income at the time the report is generated.",
-            "Once the payment has been made, this MUST be recorded on the system in order to remove the balance.",
-            "If the balance for a certain production shows negative, this is because this society owes the STA money. Please do not action negative balances.",
-            "The balance that should be transferred to a production's society is indicated in the 'Society Payment Due' column.",
-            "All currency is PENCE (i.e. 100 = £1.00)",
-        ],
-        report.get_meta_array(),
-        request.user,
-    )
-
-    return excel.get_response()
+    return export_report(request, report)
 
 
 @valid_signature("PerformanceBookings")
@@ -124,14 +117,29 @@ def performance_bookings(request):
     # Generate report
     report = reports.PerformanceBookings(request.report_options)
 
-    excel = ExcelReport(
-        report,
-        "Performance Bookings",
-        [
-            "This report provides details of the bookings for the specified performance",
-        ],
-        report.get_meta_array(),
-        request.user,
-    )
+    return export_report(request, report)
+
+
+@valid_signature("ReportJob")
+def report_job(request, job_id):
+    """Downloads the file generated by a report job
+
+    Args:
+        request (HttpRequest): The HttpRequest
+        job_id (UUID): The id of the report job
 
-    return excel.get_response()
+    Returns:
+        FileResponse: The FileResponse
+    """
+    if get_option(request.report_options, "id") != str(job_id):
+        return HttpResponse(content="Invalid signature for this job", status=403)
+
+    job = ReportJob.objects.filter(pk=job_id, status=ReportJob.Status.COMPLETE).first()
+    if not job:
+        raise Http404("Report job not found")
+
+    return FileResponse(
+        job.file.open("rb"),
+        as_attachment=True,
+        filename=os.path.basename(job.file.name),
+    )
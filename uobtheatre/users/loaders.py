@@ -0,0 +1,12 @@
+"""
+Batching loaders for the users schema
+"""
+
+from uobtheatre.users.models import User
+from uobtheatre.utils.loaders import ModelLoader
+
+
+class UserLoader(ModelLoader):
+    """Loads Users by id"""
+
+    model = User
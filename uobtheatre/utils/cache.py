@@ -0,0 +1,83 @@
+"""
+Caching for computed fields of models
+"""
+
+from typing import Any, Callable, Iterable
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from promise import Promise
+
+
+class ComputedFieldCache:
+    """A cache of the computed (and public) fields of a model's instances.
+
+    All of the cached fields of an instance are stored under a single key, so
+    that they can be invalidated together when the instance (or anything the
+    fields are computed from) changes. Entries also expire after
+    COMPUTED_FIELD_CACHE_TIMEOUT seconds.
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+
+    def key(self, pk: Any) -> str:
+        return f"computed_fields:{self.name}:{pk}"
+
+    def get_or_compute(self, pk: Any, field_name: str, compute: Callable[[], Any]):
+        """Get the value of a field, computing and caching it if it is not cached.
+
+        Args:
+            pk (Any): The primary key of the instance.
+            field_name (str): The name of the field.
+            compute (callable): Computes the value of the field.
+
+        Returns:
+            Any: The (possibly cached) value of the field.
+        """
+        fields = cache.get(self.key(pk)) or {}
+        if field_name not in fields:
+            return self.set(pk, field_name, compute())
+        return fields[field_name]
+
+    def get_or_load(self, pk: Any, field_name: str, load: Callable[[], Promise]):
+        """Get the value of a field, loading and caching it if it is not cached.
+
+        This is used with batching loaders, so that only the instances whose
+        fields are not cached are loaded.
+
+        Args:
+            pk (Any): The primary key of the instance.
+            field_name (str): The name of the field.
+            load (callable): Returns a Promise of the value of the field.
+
+        Returns:
+            Any: The cached value of the field, or a Promise of its value.
+        """
+        fields = cache.get(self.key(pk)) or {}
+        if field_name not in fields:
+            return load().then(lambda value: self.set(pk, field_name, value))
+        return fields[field_name]
+
+    def set(self, pk: Any, field_name: str, value: Any):
+        """Cache the value of a field of an instance, returning the value"""
+        fields = cache.get(self.key(pk)) or {}
+        fields[field_name] = value
+        cache.set(self.key(pk), fields, settings.COMPUTED_FIELD_CACHE_TIMEOUT)
+        return value
+
+    def invalidate(self, pks: Iterable[Any]):
+        """Remove the cached fields of the instances with the given primary keys
+
+        The fields are removed once the current transaction commits. Until
+        then, other requests would recompute (and cache) the fields from the
+        data as it was before the changes.
+        """
+        pks = list(pks)
+        if pks:
+            transaction.on_commit(lambda: self.delete(pks))
+
+    def delete(self, pks: Iterable[Any]):
+        """Remove the cached fields of the instances straight away"""
+        cache.delete_many([self.key(pk) for pk in pks])
@@ -0,0 +1,77 @@
+"""
+Batching loaders for GraphQL resolvers
+"""
+
+from typing import Any, Dict, List, Type
+
+from django.db import models
+from django.db.models.query import QuerySet
+from promise import Promise
+from promise.dataloader import DataLoader
+
+
+class Loader(DataLoader):
+    """A DataLoader which loads the values for a batch of keys at once.
+
+    Resolvers call `load` with a key and get back a Promise of its value. All
+    of the keys loaded while executing a level of a GraphQL query are
+    collected, and `load_batch` is then called once with all of them. This
+    means a list of N nodes requires one query per field, rather than N.
+
+    Loaders should be obtained with `for_info`, which returns a single
+    instance of the loader per GraphQL execution.
+    """
+
+    default: Any = None
+
+    def load_batch(self, keys: List[Any]) -> Dict[Any, Any]:
+        """Load the values for a batch of keys.
+
+        Args:
+            keys (list): The keys to load.
+
+        Returns:
+            dict: The value for each key. Keys which are missing from the dict
+                are resolved to the loader's default.
+        """
+        raise NotImplementedError
+
+    def batch_load_fn(self, keys):  # pylint: disable=method-hidden
+        values = self.load_batch(keys)
+        return Promise.resolve(
+            [values[key] if key in values else self.default for key in keys]
+        )
+
+    @classmethod
+    def for_info(cls, info) -> "Loader":
+        """Get the instance of the loader for the GraphQL execution.
+
+        The loaders are stored on the request (the execution's context). As a
+        request's context can be reused for multiple executions, the loaders
+        are recreated whenever a different operation is executed so that
+        values loaded before a mutation are not reused after it.
+
+        Returns:
+            Loader: The loader for the execution.
+        """
+        loaders: Dict[Type[Loader], Loader]
+        operation, loaders = getattr(info.context, "loaders", (None, {}))
+        if operation is not info.operation:
+            loaders = {}
+            info.context.loaders = (info.operation, loaders)
+
+        if cls not in loaders:
+            loaders[cls] = cls()
+        return loaders[cls]
+
+
+class ModelLoader(Loader):
+    """Loads model instances by their primary key"""
+
+    model: Type[models.Model]
+
+    def get_queryset(self) -> QuerySet:
+        return self.model.objects.all()  # type: ignore[attr-defined]
+
+    def load_batch(self, keys):
+        return self.get_queryset().in_bulk(keys)
@@ -3,11 +3,15 @@ Utils for uobtheatre modles
 """
 
 import abc
-from typing import Dict
+import copy
+from typing import Any, Dict, Iterable, List, Optional
 
 from django.contrib.auth.models import Permission
 from django.contrib.contenttypes.models import ContentType
 from django.db import models
+from django.db.models import F, Func, IntegerField, Subquery
+from django.db.models.functions import Coalesce
+from django.db.models.query import QuerySet
 from graphql_relay.node.node import to_global_id
 
 
@@ -19,7 +23,157 @@ class classproperty:  # pylint: disable=invalid-name
         return self.fget(owner)
 
 
-class BaseModel(models.Model):
+def count_subquery(queryset: QuerySet) -> Coalesce:
+    """Count the rows of a (correlated) queryset as a subquery expression.
+
+    The count is performed without a GROUP BY so that the subquery always
+    returns exactly one row, allowing it to be used as an annotation.
+
+    Args:
+        queryset (QuerySet): The queryset to count. This will usually contain
+            an OuterRef.
+
+    Returns:
+        Coalesce: An expression for the number of rows in the queryset.
+    """
+    return Coalesce(
+        Subquery(
+            queryset.order_by()
+            .annotate(row_count=Func(F("pk"), function="COUNT"))
+            .values("row_count"),
+            output_field=IntegerField(),
+        ),
+        0,
+    )
+
+
+class FieldTrackingMixin(models.Model):
+    """Tracks the values of a model's fields as they are in the database.
+
+    The values are snapshotted when the instance is loaded, and again once it
+    has been saved. The snapshot is taken after the save signals are sent, so
+    that their handlers can find the changes being saved without querying for
+    the old instance.
+    """
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance.snapshot_loaded_values()
+        return instance
+
+    def save_base(self, *args, **kwargs):  # pylint: disable=signature-differs
+        if self._state.adding or self.pk is None:
+            # Nothing has been loaded from the database for a new instance
+            self.__dict__["_loaded_values"] = None
+        super().save_base(*args, **kwargs)
+        self.snapshot_loaded_values(kwargs.get("update_fields"))
+
+    def refresh_from_db(self, *args, **kwargs):
+        super().refresh_from_db(*args, **kwargs)
+        self.snapshot_loaded_values(
+            kwargs.get("fields", args[1] if len(args) > 1 else None)
+        )
+
+    def _get_attname(self, field: str) -> str:
+        return self._meta.get_field(field).attname  # type: ignore[union-attr]
+
+    def snapshot_loaded_values(self, fields: Optional[Iterable[str]] = None):
+        """Snapshot the current values of the (loaded) fields, as they are in
+        the database
+
+        Args:
+            fields (list of str, optional): The fields to snapshot. Defaults
+                to all of the loaded fields.
+        """
+        attnames = (
+            [field.attname for field in self._meta.concrete_fields]
+            if fields is None
+            else [self._get_attname(field) for field in fields]
+        )
+        if not isinstance(self.__dict__.get("_loaded_values"), dict):
+            self.__dict__["_loaded_values"] = {}
+        # Mutable values (e.g. of JSON fields) are copied, so that changes
+        # made to them in place are still found
+        self.__dict__["_loaded_values"].update(
+            {
+                attname: (
+                    copy.deepcopy(self.__dict__[attname])
+                    if isinstance(self.__dict__[attname], (dict, list))
+                    else self.__dict__[attname]
+                )
+                for attname in attnames
+                if attname in self.__dict__
+            }
+        )
+
+    def get_loaded_values(self, *fields: str) -> Dict[str, Any]:
+        """Get the values of the fields as they are in the database
+
+        Values which aren't in the snapshot (e.g. for an instance which wasn't
+        loaded from the database) are fetched, so this should be called
+        before the instance is saved.
+
+        Args:
+            *fields (str): The fields to get the values of.
+
+        Returns:
+            dict: The value of each field. This is empty for an instance which
+                isn't in the database.
+        """
+        loaded_values = self.__dict__.get("_loaded_values", {})
+        if loaded_values is None or self._state.adding or self.pk is None:
+            return {}
+
+        attnames = {field: self._get_attname(field) for field in fields}
+        if missing := [
+            attname for attname in attnames.values() if attname not in loaded_values
+        ]:
+            loaded_values = self.__dict__.setdefault("_loaded_values", {})
+            loaded_values.update(
+                self.__class__._base_manager.using(self._state.db)
+                .filter(pk=self.pk)
+                .values(*missing)
+                .first()
+                or {}
+            )
+        return {
+            field: loaded_values[attname]
+            for field, attname in attnames.items()
+            if attname in loaded_values
+        }
+
+    def changed_fields(self, *fields: str) -> List[str]:
+        """The fields whose values differ from those in the database
+
+        Args:
+            *fields (str): The fields to check.
+
+        Returns:
+            list of str: The changed fields. For an instance which isn't in the
+                database, this is all of them.
+        """
+        # Deferred fields can't have been changed
+        fields = tuple(
+            field for field in fields if self._get_attname(field) in self.__dict__
+        )
+        loaded_values = self.get_loaded_values(*fields)
+        return [
+            field
+            for field in fields
+            if field not in loaded_values
+            or loaded_values[field] != self.__dict__[self._get_attname(field)]
+        ]
+
+    def has_changed(self, *fields: str) -> bool:
+        """Whether any of the fields' values differ from those in the database"""
+        return bool(self.changed_fields(*fields))
+
+    class Meta:
+        abstract = True
+
+
+class BaseModel(FieldTrackingMixin):
     """
     Base model for all UOB models. TODO actually use this
     """
@@ -0,0 +1,63 @@
+from unittest.mock import Mock
+
+import pytest
+from promise import Promise
+
+from uobtheatre.utils.cache import ComputedFieldCache
+
+
+def test_computed_field_cache_get_or_compute():
+    field_cache = ComputedFieldCache("test")
+    compute = Mock(return_value=10)
+
+    assert field_cache.get_or_compute(1, "field", compute) == 10
+    assert field_cache.get_or_compute(1, "field", compute) == 10
+    compute.assert_called_once()
+
+    # Other fields and instances are computed separately
+    assert field_cache.get_or_compute(1, "other_field", lambda: 20) == 20
+    assert field_cache.get_or_compute(2, "field", lambda: 30) == 30
+    assert field_cache.get_or_compute(1, "field", compute) == 10
+
+
+def test_computed_field_cache_caches_none():
+    field_cache = ComputedFieldCache("test")
+    compute = Mock(return_value=None)
+
+    assert field_cache.get_or_compute(1, "field", compute) is None
+    assert field_cache.get_or_compute(1, "field", compute) is None
+    compute.assert_called_once()
+
+
+@pytest.mark.django_db
+def test_computed_field_cache_invalidate(django_capture_on_commit_callbacks):
+    field_cache = ComputedFieldCache("test")
+    for pk in [1, 2, 3]:
+        field_cache.get_or_compute(pk, "field", lambda: "old")
+
+    with django_capture_on_commit_callbacks(execute=True):
+        field_cache.invalidate([1, 2])
+        # The fields are kept until the transaction commits
+        assert field_cache.get_or_compute(1, "field", lambda: "new") == "old"
+
+    assert field_cache.get_or_compute(1, "field", lambda: "new") == "new"
+    assert field_cache.get_or_compute(2, "field", lambda: "new") == "new"
+    assert field_cache.get_or_compute(3, "field", lambda: "new") == "old"
+
+
+@pytest.mark.django_db
+def test_computed_field_cache_invalidate_nothing(django_capture_on_commit_callbacks):
+    with django_capture_on_commit_callbacks() as callbacks:
+        ComputedFieldCache("test").invalidate(iter([]))
+
+    assert not callbacks
+
+
+def test_computed_field_cache_get_or_load():
+    field_cache = ComputedFieldCache("test")
+    load = Mock(return_value=Promise.resolve(10))
+
+    assert field_cache.get_or_load(1, "field", load).get() == 10
+    assert field_cache.get_or_load(1, "field", load) == 10
+    load.assert_called_once()
+    assert field_cache.get_or_compute(1, "field", lambda: 20) == 10
@@ -0,0 +1,66 @@
+from types import SimpleNamespace
+from unittest.mock import Mock
+
+import pytest
+from promise import Promise
+
+from uobtheatre.users.loaders import UserLoader
+from uobtheatre.users.test.factories import UserFactory
+from uobtheatre.utils.loaders import Loader
+
+
+class DoubleLoader(Loader):
+    """Loads double the value of positive keys, recording each batch"""
+
+    default = 0
+
+    def __init__(self):
+        super().__init__()
+        self.batches = []
+
+    def load_batch(self, keys):
+        self.batches.append(list(keys))
+        return {key: key * 2 for key in keys if key > 0}
+
+
+def test_loader_loads_batch():
+    loader = DoubleLoader()
+
+    values = (
+        Promise.resolve(None)
+        .then(lambda _: Promise.all([loader.load(key) for key in [1, 2, -1]]))
+        .get()
+    )
+
+    assert values == [2, 4, 0]
+    assert loader.batches == [[1, 2, -1]]
+
+
+def test_loader_load_batch_not_implemented():
+    with pytest.raises(NotImplementedError):
+        Loader().load_batch([1])
+
+
+def test_loader_for_info():
+    info = SimpleNamespace(context=SimpleNamespace(), operation=Mock())
+
+    loader = DoubleLoader.for_info(info)
+
+    assert isinstance(loader, DoubleLoader)
+    assert DoubleLoader.for_info(info) is loader
+    assert isinstance(UserLoader.for_info(info), UserLoader)
+
+    # A new operation gets new loaders
+    info.operation = Mock()
+    assert DoubleLoader.for_info(info) is not loader
+
+
+@pytest.mark.django_db
+def test_model_loader():
+    users = [UserFactory(), UserFactory()]
+    loader = UserLoader()
+
+    promises = [loader.load(user.pk) for user in users]
+    promises.append(loader.load(users[0].pk))
+
+    assert [promise.get() for promise in promises] == [users[0], users[1], users[0]]
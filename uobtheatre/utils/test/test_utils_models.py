@@ -1,8 +1,10 @@
 import pytest
+from django.utils import timezone
 
 from uobtheatre.bookings.models import Booking
 from uobtheatre.bookings.test.factories import BookingFactory
-from uobtheatre.payments.models import Transaction
+from uobtheatre.payments.models import SquareWebhookEvent, Transaction
+from uobtheatre.payments.test.factories import TransactionFactory
 from uobtheatre.productions.models import Performance, Production
 from uobtheatre.societies.models import Society
 from uobtheatre.users.models import User
@@ -58,3 +60,84 @@ def test_base_name(model_type, expected_name):
 def test_base_global_id():
     booking = BookingFactory(pk=1)
     assert booking.global_id == "Qm9va2luZ05vZGU6MQ=="
+
+
+@pytest.mark.django_db
+def test_field_tracking_of_loaded_instance(django_assert_num_queries):
+    transaction = Transaction.objects.get(pk=TransactionFactory(value=100).pk)
+
+    with django_assert_num_queries(0):
+        assert transaction.changed_fields("value", "status") == []
+        transaction.value = 200
+        assert transaction.changed_fields("value", "status") == ["value"]
+        assert transaction.has_changed("value")
+        assert transaction.get_loaded_values("value") == {"value": 100}
+
+    transaction.save()
+    assert not transaction.has_changed("value")
+    assert transaction.get_loaded_values("value") == {"value": 200}
+
+
+@pytest.mark.django_db
+def test_field_tracking_of_new_instance():
+    transaction = TransactionFactory.build(pay_object=BookingFactory())
+
+    assert transaction.changed_fields("value", "status") == ["value", "status"]
+    assert transaction.get_loaded_values("value") == {}
+
+    transaction.save()
+    assert transaction.changed_fields("value", "status") == []
+
+
+@pytest.mark.django_db
+def test_field_tracking_with_update_fields():
+    transaction = TransactionFactory(value=100, provider_fee=10)
+    transaction.value = 200
+    transaction.provider_fee = 20
+
+    transaction.save(update_fields=["provider_fee"])
+
+    assert transaction.changed_fields("value", "provider_fee") == ["value"]
+
+
+@pytest.mark.django_db
+def test_field_tracking_fetches_untracked_values(django_assert_num_queries):
+    (transaction,) = Transaction.objects.bulk_create(
+        [TransactionFactory.build(pay_object=BookingFactory(), value=100)]
+    )
+    transaction.value = 200
+
+    with django_assert_num_queries(1):
+        assert transaction.get_loaded_values("value", "status") == {
+            "value": 100,
+            "status": Transaction.Status.COMPLETED,
+        }
+        assert transaction.changed_fields("value", "status") == ["value"]
+
+
+@pytest.mark.django_db
+def test_field_tracking_of_deferred_and_refreshed_fields(django_assert_num_queries):
+    transaction = Transaction.objects.only("pk").get(pk=TransactionFactory().pk)
+
+    with django_assert_num_queries(0):
+        assert transaction.changed_fields("value") == []
+
+    Transaction.objects.filter(pk=transaction.pk).update(value=300)
+    transaction.refresh_from_db()
+    transaction.value = 300
+    assert not transaction.has_changed("value")
+
+
+@pytest.mark.django_db
+def test_field_tracking_of_mutable_values():
+    event = SquareWebhookEvent.objects.create(
+        event_id="abc",
+        type="payment.updated",
+        provider_transaction_id="def",
+        payload={"data": {}},
+        occurred_at=timezone.now(),
+    )
+
+    event.payload["data"]["id"] = "def"
+
+    assert event.has_changed("payload")
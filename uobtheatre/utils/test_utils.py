@@ -2,9 +2,12 @@
 Utils for the tests
 """
 
-from typing import Dict, Tuple
+import time
+from typing import Any, Callable, Dict, Tuple
 
 import pytest
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
 
 from uobtheatre.bookings.models import Ticket
 from uobtheatre.utils.utils import combinations
@@ -104,3 +107,30 @@ def ticket_dict_list_dict_gen(ticket_dict_list):
     """
     ticket_object_list = [Ticket(**ticketDict) for ticketDict in ticket_dict_list]
     return ticket_list_dict_gen(ticket_object_list)
+
+
+def run_benchmark(name: str, operation: Callable[[], Any], max_queries: int) -> Any:
+    """Run a benchmarked operation, checking it against its query budget.
+
+    The number of queries and the time taken are printed (run with
+    `pytest -m benchmark -s` to see them).
+
+    Args:
+        name (str): The name of the operation, used in the output.
+        operation (callable): The operation to benchmark.
+        max_queries (int): The number of queries the operation may make. The
+            test fails if this is exceeded.
+
+    Returns:
+        Any: The result of the operation.
+    """
+    with CaptureQueriesContext(connection) as queries:
+        start = time.perf_counter()
+        result = operation()
+        duration = time.perf_counter() - start
+
+    print(f"\n{name}: {len(queries)} queries, {duration * 1000:.1f}ms")
+    assert (
+        len(queries) <= max_queries
+    ), f"{name} made {len(queries)} queries, more than its budget of {max_queries}"
+    return result